@@ -0,0 +1,4 @@
+-- Migration: Add abandoned_carts.updatedAt index
+-- Description: Incremental cart sync for Abandoned Cart Bot (GET /admin/abandoned-carts?updatedSince=...)
+
+CREATE INDEX IF NOT EXISTS "abandoned_carts_updatedAt_idx" ON "abandoned_carts"("updatedAt");
@@ -0,0 +1,4 @@
+-- Migration: Add orders.updatedAt index
+-- Description: Incremental order sync for bots (GET /bots/orders?updatedSince=...)
+
+CREATE INDEX IF NOT EXISTS "orders_updatedAt_idx" ON "orders"("updatedAt");
@@ -1,4 +1,17 @@
-import { Controller, Get, Post, Put, Delete, Body, Param, Query, UseGuards, ParseIntPipe, Req } from '@nestjs/common';
+import {
+  Controller,
+  Get,
+  Post,
+  Put,
+  Delete,
+  Body,
+  Param,
+  Query,
+  UseGuards,
+  ParseIntPipe,
+  Req,
+  BadRequestException,
+} from '@nestjs/common';
 import { AdminService } from './admin.service';
 import { JwtAuthGuard } from '../auth/guards/jwt-auth.guard';
 import { AdminGuard } from '../auth/guards/admin.guard';
@@ -76,8 +89,30 @@ export class AdminController {
   }
 
   // Брошенные корзины
+  /**
+   * Брошенные корзины.
+   * updatedSince - инкрементальная синхронизация (Abandoned Cart Bot): массив корзин,
+   * изменённых с указанного момента (по updatedAt, включая восстановленные, до limit штук).
+   * afterId - продолжить строго после корзины (updatedSince, afterId): составной курсор
+   */
   @Get('abandoned-carts')
-  getAbandonedCarts() {
+  getAbandonedCarts(
+    @Query('updatedSince') updatedSince?: string,
+    @Query('limit') limit?: string,
+    @Query('afterId') afterId?: string,
+  ) {
+    if (updatedSince) {
+      const since = new Date(updatedSince);
+      if (isNaN(since.getTime())) {
+        throw new BadRequestException(`Invalid updatedSince: "${updatedSince}"`);
+      }
+      const take = limit ? Math.min(Math.max(parseInt(limit, 10) || 0, 1), 5000) : 1000;
+      const cursorId = afterId !== undefined ? parseInt(afterId, 10) : undefined;
+      if (cursorId !== undefined && isNaN(cursorId)) {
+        throw new BadRequestException(`Invalid afterId: "${afterId}"`);
+      }
+      return this.adminService.getAbandonedCartsUpdatedSince(since, take, cursorId);
+    }
     return this.adminService.getAbandonedCarts();
   }
 
@@ -91,6 +126,12 @@ export class AdminController {
     return this.adminService.sendAbandonedCartReminder(id);
   }
 
+  // Пачка отметок от abandoned-cart бота: { ids: [1, 2, 3] }
+  @Post('abandoned-carts/mark-reminder-sent')
+  markRemindersSent(@Body() body: { ids?: number[] }) {
+    return this.adminService.markRemindersSent(body?.ids || []);
+  }
+
   @Post('abandoned-carts/:id/mark-reminder-sent')
   markReminderSent(@Param('id', ParseIntPipe) id: number) {
     return this.adminService.markReminderSent(id);
@@ -389,6 +389,44 @@ export class AdminService {
     };
   }
 
+  /**
+   * Корзины, изменённые начиная с since (для синхронизации бота по курсору (updatedAt, id)).
+   * Только поля, нужные для напоминаний; восстановленные тоже отдаются - бот их снимает с расписания
+   */
+  async getAbandonedCartsUpdatedSince(since: Date, take = 1000, afterId?: number) {
+    // С afterId - строго после (since, afterId) в порядке сортировки, иначе все с updatedAt >= since
+    const where: any = afterId === undefined
+      ? { updatedAt: { gte: since } }
+      : { OR: [{ updatedAt: { gt: since } }, { updatedAt: since, id: { gt: afterId } }] };
+    const carts = await this.prisma.abandonedCart.findMany({
+      where,
+      select: {
+        id: true,
+        cartId: true,
+        itemsCount: true,
+        totalAmount: true,
+        reminderSent: true,
+        lastReminderAt: true,
+        createdAt: true,
+        updatedAt: true,
+        recovered: true,
+        user: {
+          select: {
+            telegramId: true,
+          },
+        },
+      },
+      orderBy: [{ updatedAt: 'asc' }, { id: 'asc' }],
+      take,
+    });
+
+    return carts.map(({ user, ...cart }) => ({
+      ...cart,
+      telegramId: String(user.telegramId),
+      totalAmount: Number(cart.totalAmount),
+    }));
+  }
+
   async sendAbandonedCartReminder(id: number) {
     const abandonedCart = await this.prisma.abandonedCart.findUnique({
       where: { id },
@@ -654,6 +692,22 @@ export class AdminService {
     });
   }
 
+  async markRemindersSent(ids: number[]) {
+    const cartIds = ids.map(Number).filter((id) => Number.isInteger(id));
+    if (cartIds.length === 0) {
+      return { updated: 0 };
+    }
+
+    const result = await this.prisma.abandonedCart.updateMany({
+      where: { id: { in: cartIds } },
+      data: {
+        reminderSent: { increment: 1 },
+        lastReminderAt: new Date(),
+      },
+    });
+    return { updated: result.count };
+  }
+
   private getDateRangeByPeriod(period: PeriodType): { start: Date; end: Date } {
     const end = new Date();
     const start = new Date();
@@ -1,5 +1,6 @@
 import { Injectable, Logger } from '@nestjs/common';
 import { PrismaService } from '../prisma/prisma.service';
+import { TelegramBotClientService } from '../telegram/telegram-bot-client.service';
 import { Cron, CronExpression } from '@nestjs/schedule';
 
 @Injectable()
@@ -7,7 +8,41 @@ export class CartAbandonedService {
   private readonly logger = new Logger(CartAbandonedService.name);
   private readonly ABANDONMENT_THRESHOLD_HOURS = 24; // 24 часа неактивности
 
-  constructor(private prisma: PrismaService) {}
+  constructor(
+    private prisma: PrismaService,
+    private telegramBotClient: TelegramBotClientService,
+  ) {}
+
+  /**
+   * Корзина в формате GET /admin/abandoned-carts (для событий Abandoned Cart Bot)
+   */
+  private toCartEvent(
+    abandonedCart: {
+      id: number;
+      cartId: number;
+      userId: number;
+      itemsCount: number;
+      totalAmount: unknown;
+      reminderSent: number;
+      lastReminderAt: Date | null;
+      createdAt: Date;
+      recovered: boolean;
+    },
+    telegramId?: string | null,
+  ) {
+    return {
+      id: abandonedCart.id,
+      cartId: abandonedCart.cartId,
+      userId: abandonedCart.userId,
+      telegramId: telegramId || null,
+      itemsCount: abandonedCart.itemsCount,
+      totalAmount: Number(abandonedCart.totalAmount),
+      reminderSent: abandonedCart.reminderSent,
+      lastReminderAt: abandonedCart.lastReminderAt,
+      createdAt: abandonedCart.createdAt,
+      recovered: abandonedCart.recovered,
+    };
+  }
 
   /**
    * Проверка и создание брошенных корзин
@@ -83,7 +118,7 @@ export class CartAbandonedService {
           where: { cartId: cart.id },
         });
 
-        await this.prisma.abandonedCart.upsert({
+        const abandonedCart = await this.prisma.abandonedCart.upsert({
           where: { cartId: cart.id },
           create: {
             userId: cart.userId,
@@ -106,6 +141,12 @@ export class CartAbandonedService {
         //   this.businessMetrics.recordCartAbandonment('timeout');
         // }
 
+        // Abandoned Cart Bot ставит напоминание в расписание сразу, не дожидаясь своей сверки
+        void this.telegramBotClient.notifyCartEvent(
+          'cart-abandoned',
+          this.toCartEvent(abandonedCart, cart.user?.telegramId),
+        );
+
         createdCount++;
       }
 
@@ -135,6 +176,11 @@ export class CartAbandonedService {
       });
 
       this.logger.log(`Cart ${cartId} marked as recovered`);
+
+      void this.telegramBotClient.notifyCartEvent('cart-recovered', {
+        id: abandonedCart.id,
+        cartId,
+      });
     }
   }
 
@@ -144,9 +190,14 @@ export class CartAbandonedService {
   async checkCartActivity(cartId: number) {
     const abandonedCart = await this.prisma.abandonedCart.findUnique({
       where: { cartId },
+      include: { user: { select: { telegramId: true } } },
     });
 
     if (abandonedCart && !abandonedCart.recovered) {
+      void this.telegramBotClient.notifyCartEvent(
+        'cart-updated',
+        this.toCartEvent(abandonedCart, abandonedCart.user?.telegramId),
+      );
       // Если корзина была активна, но была помечена как брошенная,
       // сбрасываем статус (но не удаляем запись для статистики)
       // Это будет обработано при следующей проверке по расписанию
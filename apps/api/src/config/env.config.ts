@@ -29,6 +29,7 @@ export interface EnvConfig {
   TELEGRAM_MANAGER_CHAT_ID?: string;
   CUSTOMER_BOT_API_URL?: string;
   ADMIN_BOT_API_URL?: string;
+  ABANDONED_CART_BOT_API_URL?: string;
   INIT_DATA_MAX_AGE_SEC: number;
 
   // URLs
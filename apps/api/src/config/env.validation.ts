@@ -113,6 +113,11 @@ export const envValidationSchema = Joi.object({
     .optional()
     .allow('')
     .description('Admin bot API URL (for local development)'),
+  ABANDONED_CART_BOT_API_URL: Joi.string()
+    .uri()
+    .optional()
+    .allow('')
+    .description('Abandoned cart bot API URL (cart events; empty - events disabled)'),
 
   INIT_DATA_MAX_AGE_SEC: Joi.number()
     .integer()
@@ -8,6 +8,7 @@ import {
   Headers,
   UnauthorizedException,
   NotFoundException,
+  BadRequestException,
 } from '@nestjs/common';
 import { OrdersService } from './orders.service';
 import { UpdateOrderStatusDto, OrderStatus } from './dto/update-order-status.dto';
@@ -42,6 +43,20 @@ export class BotsOrdersController {
     }
   }
 
+  /**
+   * Разбор даты из query-параметра (невалидная -> 400)
+   */
+  private parseDateParam(name: string, value?: string): Date | undefined {
+    if (!value) {
+      return undefined;
+    }
+    const date = new Date(value);
+    if (isNaN(date.getTime())) {
+      throw new BadRequestException(`Invalid ${name}: "${value}"`);
+    }
+    return date;
+  }
+
   /**
    * Получить заказ по номеру (для ботов)
    */
@@ -60,14 +75,42 @@ export class BotsOrdersController {
 
   /**
    * Получить список заказов по статусу (для ботов)
+   * limit/offset - постраничная выборка (без них - все заказы, как раньше)
+   * updatedSince - заказы, изменённые с указанного момента (по updatedAt, до limit штук)
+   * afterId - вместе с updatedSince: продолжить после заказа (updatedSince, afterId) - составной курсор
+   * createdFrom/createdTo - диапазон дат создания (ISO, включительно) - для выгрузок
    */
   @Get()
   async findAllOrders(
     @Query('status') status?: OrderStatus,
+    @Query('limit') limit?: string,
+    @Query('offset') offset?: string,
+    @Query('updatedSince') updatedSince?: string,
+    @Query('afterId') afterId?: string,
+    @Query('createdFrom') createdFrom?: string,
+    @Query('createdTo') createdTo?: string,
     @Headers('x-bot-api-key') apiKey?: string,
   ) {
     this.validateBotApiKey(apiKey);
-    return this.ordersService.findAllOrders(undefined, status); // undefined = все заказы (админский доступ)
+    if (updatedSince) {
+      const since = new Date(updatedSince);
+      if (isNaN(since.getTime())) {
+        throw new BadRequestException(`Invalid updatedSince: "${updatedSince}"`);
+      }
+      const syncTake = limit ? Math.min(Math.max(parseInt(limit, 10) || 0, 1), 1000) : 500;
+      const cursorId = afterId !== undefined ? parseInt(afterId, 10) : undefined;
+      if (cursorId !== undefined && isNaN(cursorId)) {
+        throw new BadRequestException(`Invalid afterId: "${afterId}"`);
+      }
+      return this.ordersService.findOrdersUpdatedSince(since, syncTake, cursorId);
+    }
+    const take = limit ? Math.min(Math.max(parseInt(limit, 10) || 0, 1), 100) : undefined;
+    const skip = offset ? Math.max(parseInt(offset, 10) || 0, 0) : undefined;
+    const created = {
+      from: this.parseDateParam('createdFrom', createdFrom),
+      to: this.parseDateParam('createdTo', createdTo),
+    };
+    return this.ordersService.findAllOrders(undefined, status, { take, skip }, created); // undefined = все заказы (админский доступ)
   }
 
   /**
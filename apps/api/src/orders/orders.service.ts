@@ -263,7 +263,12 @@ export class OrdersService {
     return obj;
   }
 
-  async findAllOrders(userId?: number, status?: OrderStatus) {
+  async findAllOrders(
+    userId?: number,
+    status?: OrderStatus,
+    pagination?: { take?: number; skip?: number },
+    created?: { from?: Date; to?: Date },
+  ) {
     const where: any = {};
     if (userId) {
       where.userId = userId;
@@ -271,6 +276,15 @@ export class OrdersService {
     if (status) {
       where.status = status;
     }
+    if (created?.from || created?.to) {
+      where.createdAt = {};
+      if (created.from) {
+        where.createdAt.gte = created.from;
+      }
+      if (created.to) {
+        where.createdAt.lte = created.to;
+      }
+    }
 
     try {
       const orders = await this.prisma.order.findMany({
@@ -290,7 +304,10 @@ export class OrdersService {
             },
           },
         },
-        orderBy: { createdAt: 'desc' },
+        // id - для стабильного порядка страниц при одинаковом createdAt
+        orderBy: [{ createdAt: 'desc' }, { id: 'desc' }],
+        take: pagination?.take,
+        skip: pagination?.skip,
       });
 
       // Преобразуем BigInt в строки перед возвратом
@@ -338,6 +355,40 @@ export class OrdersService {
     return this.transformBigInt(order);
   }
 
+  /**
+   * Заказы, изменённые начиная с since (инкрементальная синхронизация ботов).
+   * Порядок по (updatedAt, id): курсор для следующего запроса - updatedAt и id последнего заказа.
+   * С afterId - только заказы строго после (since, afterId), иначе все с updatedAt >= since
+   */
+  async findOrdersUpdatedSince(since: Date, take = 500, afterId?: number) {
+    const where: any = afterId === undefined
+      ? { updatedAt: { gte: since } }
+      : { OR: [{ updatedAt: { gt: since } }, { updatedAt: since, id: { gt: afterId } }] };
+    const orders = await this.prisma.order.findMany({
+      where,
+      include: {
+        user: {
+          select: {
+            id: true,
+            firstName: true,
+            lastName: true,
+            telegramId: true,
+          },
+        },
+        items: {
+          include: {
+            variant: true,
+          },
+        },
+      },
+      orderBy: [{ updatedAt: 'asc' }, { id: 'asc' }],
+      take,
+    });
+
+    // Преобразуем BigInt в строки перед возвратом
+    return this.transformBigInt(orders);
+  }
+
   async findOrderByNumber(orderNumber: string, userId?: number) {
     const where: any = { orderNumber };
     if (userId) {
@@ -27,9 +27,11 @@ export class TelegramBotClientService implements OnModuleInit {
   private readonly logger = new Logger(TelegramBotClientService.name);
   private readonly customerBotUrl: string;
   private readonly adminBotUrl: string;
+  private readonly cartBotUrl?: string;
   private readonly enabled: boolean;
   private customerBotClient: AxiosInstance;
   private adminBotClient: AxiosInstance;
+  private cartBotClient?: AxiosInstance;
   private readonly retryAttempts = 3;
   private readonly retryDelay = 1000; // 1 секунда
 
@@ -62,6 +64,18 @@ export class TelegramBotClientService implements OnModuleInit {
         'Content-Type': 'application/json',
       },
     });
+
+    // События брошенных корзин - только если Abandoned Cart Bot их принимает (URL задан явно)
+    this.cartBotUrl = this.configService.get<string>('ABANDONED_CART_BOT_API_URL') || undefined;
+    if (this.cartBotUrl) {
+      this.cartBotClient = axios.create({
+        baseURL: this.cartBotUrl,
+        timeout: 5000,
+        headers: {
+          'Content-Type': 'application/json',
+        },
+      });
+    }
   }
 
   async onModuleInit() {
@@ -439,6 +453,26 @@ export class TelegramBotClientService implements OnModuleInit {
     return results;
   }
 
+  /**
+   * Событие брошенной корзины для Abandoned Cart Bot (обновляет его расписание напоминаний)
+   */
+  async notifyCartEvent(
+    event: 'cart-abandoned' | 'cart-recovered' | 'cart-updated',
+    payload: Record<string, unknown>,
+  ): Promise<boolean> {
+    const client = this.cartBotClient;
+    if (!client) {
+      return false;
+    }
+    try {
+      const result = await this.retryRequest(() => client.post(`/events/${event}`, payload));
+      return !!result;
+    } catch (error: any) {
+      this.logger.warn(`Failed to send ${event} event to ${this.cartBotUrl}: ${error.message}`);
+      return false;
+    }
+  }
+
   /**
    * Проверка доступности ботов
    */
@@ -5,11 +5,11 @@ Abandoned Cart Bot v2.0 - Автоматические напоминания о
 """
 
 import os
+import time
 import logging
 import asyncio
-import aiohttp
 from datetime import datetime, timedelta
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Tuple, AsyncIterator
 from contextlib import asynccontextmanager
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
@@ -19,6 +19,10 @@ import uvicorn
 from pydantic import BaseModel
 from dotenv import load_dotenv
 
+from api_client import ApiClient, ApiStatusError, NotJsonArrayError
+from batch_buffer import BatchBuffer
+from reminder_schedule import ReminderSchedule, compact_cart, days_since_abandoned
+
 load_dotenv()
 
 logging.basicConfig(
@@ -30,22 +34,53 @@ logger = logging.getLogger(__name__)
 # Config
 API_URL = os.getenv('API_URL', 'http://localhost:3000/api')
 CUSTOMER_BOT_URL = os.getenv('CUSTOMER_BOT_API_URL', 'http://localhost:8001')
-CHECK_INTERVAL_MINUTES = int(os.getenv('CART_CHECK_INTERVAL_MINUTES', '60'))
+# API присылает события корзин (/events/*) - сверка нужна только как страховка, реже
+CART_EVENTS_ENABLED = os.getenv('CART_EVENTS_ENABLED', 'false').lower() == 'true'
+CHECK_INTERVAL_MINUTES = int(os.getenv('CART_CHECK_INTERVAL_MINUTES', '360' if CART_EVENTS_ENABLED else '60'))
 REMINDER_DELAY_HOURS = int(os.getenv('REMINDER_DELAY_HOURS', '2'))
 MAX_REMINDERS = int(os.getenv('MAX_REMINDERS', '3'))
 # Default intervals if API settings отсутствуют: 2h, 24h, 72h
 REMINDER_INTERVALS = [2, 24, 72]
 PORT = int(os.getenv('ABANDONED_CART_BOT_PORT', '8003'))
+# Рассылка: параллельных напоминаний и бюджет времени на один запуск (по умолчанию - 80% интервала)
+REMINDER_CONCURRENCY = int(os.getenv('REMINDER_CONCURRENCY', '10'))
+REMINDER_RUN_BUDGET_SECONDS = float(os.getenv('REMINDER_RUN_BUDGET_SECONDS', str(CHECK_INTERVAL_MINUTES * 60 * 0.8)))
+# Отметки "напоминание отправлено" копятся и уходят пачкой (по размеру или по времени)
+REMINDER_ACK_BATCH_SIZE = int(os.getenv('REMINDER_ACK_BATCH_SIZE', '50'))
+REMINDER_ACK_FLUSH_SECONDS = float(os.getenv('REMINDER_ACK_FLUSH_SECONDS', '5'))
+# Не удалось отправить напоминание - повтор через столько минут
+REMINDER_RETRY_MINUTES = float(os.getenv('REMINDER_RETRY_MINUTES', '15'))
+# Сверка догружает только корзины, изменённые после курсора (updatedAt, id), пачками по CART_SYNC_BATCH;
+# полная сверка (удалённые корзины, смена настроек API) - раз в CART_FULL_SYNC_HOURS
+CART_SYNC_BATCH = int(os.getenv('CART_SYNC_BATCH', '1000'))
+CART_FULL_SYNC_HOURS = float(os.getenv('CART_FULL_SYNC_HOURS', '24'))
+
+# Курсор первой (полной) сверки
+EPOCH = '1970-01-01T00:00:00.000Z'
+
+# Позиция в порядке API: (updatedAt, id) последней полученной корзины
+CartCursor = Tuple[str, Optional[int]]
 
 # Scheduler
 scheduler = AsyncIOScheduler()
 
+# Общий HTTP клиент (одна сессия на процесс: и к API, и к Customer Bot)
+api_client = ApiClient(API_URL)
+
 # Stats
 stats = {
     'last_check': None,
     'carts_found': 0,
     'reminders_sent': 0,
-    'errors': 0
+    'errors': 0,
+    'acks_failed': 0,
+    'events_received': 0,
+    'last_sync': None,
+    'last_sync_changed': 0,
+    'cart_cursor': None,
+    'last_run_seconds': None,
+    'last_run_due': 0,
+    'last_run_deferred': 0,
 }
 
 class CartReminder(BaseModel):
@@ -56,13 +91,30 @@ class CartReminder(BaseModel):
     hours_since_abandoned: int
     reminder_count: int
 
+class CartEvent(BaseModel):
+    """Брошенная корзина (формат GET /admin/abandoned-carts)"""
+    id: int
+    cartId: Optional[int] = None
+    userId: Optional[int] = None
+    telegramId: Optional[str] = None
+    itemsCount: int = 0
+    totalAmount: float = 0
+    reminderSent: int = 0
+    lastReminderAt: Optional[str] = None
+    createdAt: Optional[str] = None
+    abandonedAt: Optional[str] = None
+    recovered: bool = False
+
+class CartRecoveredEvent(BaseModel):
+    id: int
+    cartId: Optional[int] = None
+
 async def api_get(endpoint: str) -> Optional[Dict]:
     """GET запрос к API"""
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(f"{API_URL}{endpoint}", timeout=10) as resp:
-                if resp.status == 200:
-                    return await resp.json()
+        resp = await api_client.get(endpoint)
+        if resp.status == 200:
+            return resp.json()
     except Exception as e:
         logger.error(f"API GET error: {e}")
     return None
@@ -70,20 +122,53 @@ async def api_get(endpoint: str) -> Optional[Dict]:
 async def api_post(url: str, data: Dict) -> bool:
     """POST запрос"""
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=data, timeout=10) as resp:
-                return resp.status in [200, 201]
+        resp = await api_client.post(url, json=data)
+        return resp.status in [200, 201]
     except Exception as e:
         logger.error(f"API POST error: {e}")
     return False
 
 async def get_abandoned_carts() -> List[Dict]:
-    """Получить брошенные корзины из API"""
+    """Получить все незавершённые корзины из API (старый API без updatedSince)"""
     result = await api_get('/admin/abandoned-carts')
     if result and 'carts' in result:
-        return result['carts']
+        return [compact_cart(cart) for cart in result['carts'] if isinstance(cart, dict)]
     return []
 
+def cart_position(cart: Dict, cursor: CartCursor) -> CartCursor:
+    """Курсор после корзины (без updatedAt / id - прежний)"""
+    cart_id = cart.get('id')
+    return (cart.get('updatedAt') or cursor[0], cart_id if isinstance(cart_id, int) else cursor[1])
+
+async def iter_changed_carts(since: CartCursor) -> AsyncIterator[Dict]:
+    """
+    Корзины после курсора since (включая восстановленные), в порядке (updatedAt, id).
+    Следующая пачка начинается строго после последней корзины предыдущей -
+    даже если у всех корзин пачки одинаковый updatedAt.
+    Ответ разбирается потоково - в памяти только компактные записи
+    """
+    cursor = since
+    while True:
+        received = 0
+        batch_cursor = cursor
+        params = {'updatedSince': cursor[0], 'limit': CART_SYNC_BATCH}
+        if cursor[1] is not None:
+            params['afterId'] = cursor[1]
+        async for raw in api_client.iter_array('/admin/abandoned-carts', params=params):
+            if not isinstance(raw, dict) or raw.get('id') is None:
+                continue
+            received += 1
+            cart = compact_cart(raw)
+            batch_cursor = cart_position(cart, batch_cursor)
+            yield cart
+        if received < CART_SYNC_BATCH:
+            return
+        if batch_cursor == cursor:
+            # Пачка не сдвинула курсор (API без afterId) - не зацикливаемся
+            logger.warning(f"Cart sync: cursor did not advance at {cursor}")
+            return
+        cursor = batch_cursor
+
 async def get_settings() -> Dict:
     """Получить настройки напоминаний"""
     result = await api_get('/admin/abandoned-carts/settings')
@@ -109,7 +194,7 @@ async def send_reminder(telegram_id: str, cart: Dict) -> bool:
         'cartId': cart.get('id', 0),
         'items': items_text,
         'totalAmount': float(cart.get('totalAmount', 0)),
-        'daysSinceAbandoned': cart.get('daysSinceAbandoned', 0)
+        'daysSinceAbandoned': days_since_abandoned(cart)
     }
     
     return await api_post(f"{CUSTOMER_BOT_URL}/notify/abandoned-cart", data)
@@ -118,8 +203,160 @@ async def mark_reminder_sent(cart_id: int) -> bool:
     """Отметить напоминание как отправленное"""
     return await api_post(f"{API_URL}/admin/abandoned-carts/{cart_id}/mark-reminder-sent", {})
 
+# Bulk-эндпоинт отметок (старый API без него отвечает 404 - тогда отмечаем по одной)
+_bulk_ack_supported = True
+
+async def flush_reminder_acks(cart_ids: List[int]) -> None:
+    """Отметить пачку напоминаний: одним запросом, а без bulk-эндпоинта - параллельно по пулу соединений"""
+    global _bulk_ack_supported
+    if _bulk_ack_supported:
+        try:
+            resp = await api_client.post(
+                f"{API_URL}/admin/abandoned-carts/mark-reminder-sent", json={'ids': cart_ids}
+            )
+            if resp.status in [200, 201]:
+                updated = (resp.json() or {}).get('updated', len(cart_ids))
+                if updated < len(cart_ids):
+                    logger.warning(f"Marked {updated}/{len(cart_ids)} reminders (missing carts)")
+                return
+            if resp.status == 404:
+                logger.info("Bulk mark-reminder-sent not available, marking one by one")
+                _bulk_ack_supported = False
+            else:
+                logger.error(f"Bulk mark-reminder-sent failed: {resp.status} - {resp.text[:200]}")
+                stats['acks_failed'] += len(cart_ids)
+                return
+        except Exception as e:
+            # POST не повторяем: пачка могла быть применена
+            logger.error(f"Bulk mark-reminder-sent error: {e}")
+            stats['acks_failed'] += len(cart_ids)
+            return
+
+    semaphore = asyncio.Semaphore(REMINDER_CONCURRENCY)
+
+    async def mark(cart_id: int) -> bool:
+        async with semaphore:
+            return await mark_reminder_sent(cart_id)
+
+    results = await asyncio.gather(*(mark(cart_id) for cart_id in cart_ids))
+    stats['acks_failed'] += results.count(False)
+
+reminder_acks = BatchBuffer(
+    flush_reminder_acks,
+    max_size=REMINDER_ACK_BATCH_SIZE,
+    max_delay=REMINDER_ACK_FLUSH_SECONDS,
+    name='reminder-acks',
+)
+
+# Расписание напоминаний: min-heap по времени, сверяется с API раз в CHECK_INTERVAL_MINUTES
+schedule = ReminderSchedule()
+
+async def remind_cart(cart: Dict) -> bool:
+    """Отправить напоминание (отметка в API уходит пачкой через reminder_acks)"""
+    cart_id = cart.get('id')
+    ok = False
+    try:
+        ok = await send_reminder(cart['telegramId'], cart)
+    finally:
+        # Следующее напоминание по расписанию, при ошибке - повтор через REMINDER_RETRY_MINUTES
+        if ok:
+            schedule.sent(cart_id)
+        else:
+            schedule.retry(cart_id, time.time() + REMINDER_RETRY_MINUTES * 60)
+    if not ok:
+        return False
+    reminder_acks.add(cart_id)
+    logger.info(f"✅ Reminder sent for cart #{cart_id}")
+    return True
+
+async def dispatch_reminders(carts: List[Dict], concurrency: int, budget_seconds: float) -> Tuple[Dict[str, int], List[Dict]]:
+    """
+    Разослать напоминания пулом из concurrency воркеров.
+    По истечении budget_seconds новые корзины не берутся - возвращаются вторым элементом
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    for cart in carts:
+        queue.put_nowait(cart)
+    deadline = asyncio.get_running_loop().time() + budget_seconds
+    result = {'sent': 0, 'failed': 0}
+
+    async def worker():
+        while not queue.empty():
+            if asyncio.get_running_loop().time() >= deadline:
+                return
+            cart = queue.get_nowait()
+            try:
+                if await remind_cart(cart):
+                    result['sent'] += 1
+                else:
+                    result['failed'] += 1
+            except Exception as e:
+                logger.error(f"Error processing cart {cart.get('id')}: {e}")
+                result['failed'] += 1
+
+    await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, len(carts))))))
+    deferred = [queue.get_nowait() for _ in range(queue.qsize())]
+    return result, deferred
+
+async def send_due_reminders() -> None:
+    """Разослать напоминания, время которых наступило"""
+    started = asyncio.get_running_loop().time()
+    due = schedule.pop_due()
+    if not due:
+        return
+    result, deferred = await dispatch_reminders(due, REMINDER_CONCURRENCY, REMINDER_RUN_BUDGET_SECONDS)
+    for cart in deferred:
+        # Не успели в бюджет - остаются первыми в очереди
+        schedule.retry(cart.get('id'), time.time())
+    # Отметки - сразу после пачки: сверка должна видеть актуальный reminderSent
+    await reminder_acks.flush()
+    
+    stats['reminders_sent'] += result['sent']
+    stats['errors'] += result['failed']
+    stats['last_run_due'] = len(due)
+    stats['last_run_deferred'] = len(deferred)
+    stats['last_run_seconds'] = round(asyncio.get_running_loop().time() - started, 2)
+    logger.info(f"📤 Sent {result['sent']}/{len(due)} reminders in {stats['last_run_seconds']}s")
+    if deferred:
+        logger.warning(f"⏱️ Run budget ({REMINDER_RUN_BUDGET_SECONDS:.0f}s) exhausted, {len(deferred)} reminders deferred")
+
+async def reminder_loop():
+    """Спит до ближайшего напоминания (или до изменения расписания) и рассылает наступившие"""
+    while True:
+        schedule.changed.clear()
+        wait = schedule.seconds_until_next()
+        if wait is None or wait > 0:
+            try:
+                await asyncio.wait_for(schedule.changed.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        try:
+            await send_due_reminders()
+        except Exception as e:
+            logger.error(f"Reminder dispatch failed: {e}")
+            stats['errors'] += 1
+            await asyncio.sleep(5)
+
+# Сверки не пересекаются (планировщик + ручной /trigger)
+_run_lock = asyncio.Lock()
+
+# Курсор инкрементальной сверки ((updatedAt, id) последней полученной корзины); None - нужна полная
+cart_cursor: Optional[CartCursor] = None
+_last_full_sync = 0.0
+# Старый API не знает updatedSince (отвечает объектом) - тогда полный список до следующей
+# полной сверки, на которой инкрементальный режим пробуется снова
+_incremental_supported = True
+
 async def check_and_send_reminders():
-    """Основная задача проверки и отправки напоминаний"""
+    """Сверка расписания с API: новые корзины, восстановленные, изменённые настройки"""
+    if _run_lock.locked():
+        logger.info("Previous check is still running, skipping")
+        return
+    async with _run_lock:
+        await _reconcile_schedule()
+
+async def _reconcile_schedule():
     logger.info("🔍 Checking abandoned carts...")
     stats['last_check'] = datetime.now().isoformat()
     
@@ -128,112 +365,108 @@ async def check_and_send_reminders():
         settings = await get_settings()
         if not settings.get('autoRemindersEnabled', True):
             logger.info("Auto reminders disabled")
+            schedule.replace_all([], settings)
+            reset_cart_cursor()
             return
         
-        max_reminders = settings.get('maxReminders', MAX_REMINDERS)
-        reminder_intervals = settings.get('reminderIntervals') or REMINDER_INTERVALS
-        initial_delay = settings.get('initialDelayHours', REMINDER_DELAY_HOURS)
-        
         # Получаем корзины
-        carts = await get_abandoned_carts()
-        stats['carts_found'] = len(carts)
-        logger.info(f"Found {len(carts)} abandoned carts")
-        
-        sent_count = 0
-        
-        for cart in carts:
-            try:
-                # Пропускаем восстановленные
-                if cart.get('recovered'):
-                    continue
-                
-                # Проверяем telegram_id
-                telegram_id = cart.get('telegramId')
-                if not telegram_id:
-                    continue
-                
-                reminder_sent = cart.get('reminderSent', 0)
-
-                # Не превышаем общее число напоминаний
-                if reminder_sent >= max_reminders:
-                    continue
-
-                # Проверяем интервалы:
-                #  - первое напоминание — через initial_delay часов с момента abandon
-                #  - последующие — по reminder_intervals[reminder_sent] (если есть)
-                last_reminder = cart.get('lastReminderAt')
-                abandoned_at = cart.get('abandonedAt') or cart.get('createdAt')
-
-                # Если нет даты брошенной корзины — пропускаем
-                if not abandoned_at:
-                    continue
-
-                try:
-                    abandoned_dt = datetime.fromisoformat(abandoned_at.replace('Z', '+00:00'))
-                    now_dt = datetime.now(abandoned_dt.tzinfo)
-                except Exception:
-                    continue
-
-                # Определяем требуемый интервал для текущего напоминания
-                if reminder_sent == 0:
-                    required_hours = initial_delay
-                    reference_dt = abandoned_dt
-                else:
-                    # Если интервала нет в списке — прекращаем
-                    if reminder_sent - 1 >= len(reminder_intervals):
-                        continue
-                    required_hours = reminder_intervals[reminder_sent - 1]
-                    if last_reminder:
-                        try:
-                            reference_dt = datetime.fromisoformat(last_reminder.replace('Z', '+00:00'))
-                        except Exception:
-                            continue
-                    else:
-                        reference_dt = abandoned_dt
-
-                hours_since = (now_dt - reference_dt).total_seconds() / 3600
-                if hours_since < required_hours:
-                    continue
-                
-                # Отправляем напоминание
-                if await send_reminder(telegram_id, cart):
-                    if await mark_reminder_sent(cart.get('id')):
-                        sent_count += 1
-                        logger.info(f"✅ Reminder sent for cart #{cart.get('id')}")
-                    
-            except Exception as e:
-                logger.error(f"Error processing cart {cart.get('id')}: {e}")
-                stats['errors'] += 1
-        
-        stats['reminders_sent'] += sent_count
-        logger.info(f"📤 Sent {sent_count} reminders")
+        await sync_carts(settings)
+        stats['carts_found'] = len(schedule.carts)
+        logger.info(f"Tracking {len(schedule.carts)} abandoned carts, {len(schedule)} reminders scheduled")
         
     except Exception as e:
         logger.error(f"Check failed: {e}")
         stats['errors'] += 1
 
+def reset_cart_cursor():
+    """Следующая сверка - полная"""
+    global cart_cursor
+    cart_cursor = None
+    stats['cart_cursor'] = None
+
+async def _sync_carts_legacy(settings: Dict) -> None:
+    """Полный список корзин одним ответом (API без updatedSince)"""
+    carts = await get_abandoned_carts()
+    schedule.replace_all(carts, settings)
+    stats['last_sync'], stats['last_sync_changed'] = 'legacy', len(carts)
+
+async def sync_carts(settings: Dict) -> None:
+    """Применить к расписанию корзины, изменённые после курсора (или все - при полной сверке)"""
+    global cart_cursor, _last_full_sync, _incremental_supported
+    full_due = time.time() - _last_full_sync >= CART_FULL_SYNC_HOURS * 3600
+    if not _incremental_supported and not full_due:
+        await _sync_carts_legacy(settings)
+        return
+    full = cart_cursor is None or full_due
+    since = (EPOCH, None) if full else cart_cursor
+    cursor = since
+    changed = 0
+    active: List[Dict] = []
+    try:
+        async for cart in iter_changed_carts(since):
+            changed += 1
+            cursor = cart_position(cart, cursor)
+            if full:
+                # Восстановленные при полной сверке не нужны - не держим их в памяти
+                if not cart.get('recovered'):
+                    active.append(cart)
+            elif cart.get('recovered'):
+                schedule.remove(cart['id'])
+            else:
+                schedule.upsert(cart)
+    except (NotJsonArrayError, ApiStatusError) as e:
+        # API без updatedSince отдаёт обычный список {carts, stats} или отклоняет параметры (4xx);
+        # оборванный / битый ответ и 5xx - обычная ошибка сверки, режим не меняем
+        unsupported = isinstance(e, NotJsonArrayError) or e.status in (400, 422)
+        if changed or not unsupported:
+            raise
+        logger.warning(f"Incremental cart sync unavailable ({e}), falling back to full list")
+        _incremental_supported = False
+        # Следующая проба - через CART_FULL_SYNC_HOURS
+        _last_full_sync = time.time()
+        reset_cart_cursor()
+        await _sync_carts_legacy(settings)
+        return
+
+    if full:
+        schedule.replace_all(active, settings)
+        _last_full_sync = time.time()
+        _incremental_supported = True
+    else:
+        schedule.update_settings(settings)
+    # Курсор сдвигается только после успешной сверки
+    cart_cursor = cursor
+    stats['cart_cursor'] = list(cursor)
+    stats['last_sync'] = 'full' if full else 'incremental'
+    stats['last_sync_changed'] = changed
+    logger.info(f"🔄 Cart sync ({stats['last_sync']}): {changed} changed carts (cursor: {cursor})")
+
 def start_scheduler():
-    """Запустить планировщик"""
+    """Запустить планировщик (сверка) и цикл рассылки по расписанию"""
     scheduler.add_job(
         check_and_send_reminders,
         trigger=IntervalTrigger(minutes=CHECK_INTERVAL_MINUTES),
         id='check_carts',
         name='Check abandoned carts',
-        replace_existing=True
+        replace_existing=True,
+        # Первая сверка через 30 секунд после старта
+        next_run_time=datetime.now() + timedelta(seconds=30),
     )
     scheduler.start()
-    logger.info(f"⏰ Scheduler started (every {CHECK_INTERVAL_MINUTES} min)")
+    logger.info(f"⏰ Scheduler started (reconcile every {CHECK_INTERVAL_MINUTES} min)")
+    return asyncio.create_task(reminder_loop(), name='reminder-loop')
 
 # FastAPI
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("🚀 Starting Abandoned Cart Bot...")
-    start_scheduler()
-    # Первая проверка через 30 секунд
-    await asyncio.sleep(30)
-    asyncio.create_task(check_and_send_reminders())
+    loop_task = start_scheduler()
     yield
     scheduler.shutdown()
+    loop_task.cancel()
+    await asyncio.gather(loop_task, return_exceptions=True)
+    await reminder_acks.stop()
+    await api_client.close()
     logger.info("Abandoned Cart Bot stopped")
 
 api = FastAPI(title="Abandoned Cart Bot", version="2.0.0", lifespan=lifespan)
@@ -243,15 +476,41 @@ async def health():
     return {
         "status": "ok",
         "scheduler_running": scheduler.running,
+        "schedule": schedule.snapshot(),
         "stats": stats
     }
 
 @api.post("/trigger")
 async def trigger_check():
-    """Ручной запуск проверки"""
+    """Ручной запуск сверки (напоминания уйдут по расписанию)"""
     asyncio.create_task(check_and_send_reminders())
     return {"status": "triggered"}
 
+@api.post("/events/cart-abandoned")
+async def cart_abandoned(event: CartEvent):
+    """Новая брошенная корзина - в расписание сразу"""
+    stats['events_received'] += 1
+    if schedule.settings.get('autoRemindersEnabled', True):
+        schedule.upsert(event.model_dump())
+    return {"status": "scheduled"}
+
+@api.post("/events/cart-updated")
+async def cart_updated(event: CartEvent):
+    """Корзина изменилась - пересчитать время напоминания"""
+    stats['events_received'] += 1
+    if event.recovered:
+        schedule.remove(event.id)
+    elif schedule.settings.get('autoRemindersEnabled', True):
+        schedule.upsert(event.model_dump())
+    return {"status": "updated"}
+
+@api.post("/events/cart-recovered")
+async def cart_recovered(event: CartRecoveredEvent):
+    """Корзина восстановлена (оформлен заказ) - напоминания отменяются"""
+    stats['events_received'] += 1
+    schedule.remove(event.id)
+    return {"status": "cancelled"}
+
 @api.get("/stats")
 async def get_stats():
     return stats
@@ -5,23 +5,40 @@ Admin Bot v2.0 - Telegram бот для администраторов
 """
 
 import os
+import signal
 import logging
-import aiohttp
+import asyncio
 from datetime import datetime
 from typing import Optional
 from contextlib import asynccontextmanager
 
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, Bot
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes
+from telegram import (
+    Update, InlineKeyboardButton, InlineKeyboardMarkup, Bot,
+    InlineQueryResultArticle, InputTextMessageContent,
+)
+from telegram.ext import Application, CommandHandler, CallbackQueryHandler, InlineQueryHandler, ContextTypes
 from telegram.constants import ParseMode
 from telegram.error import TelegramError, Forbidden, BadRequest, TimedOut, NetworkError
 
 from fastapi import FastAPI, Request, HTTPException, BackgroundTasks
 from fastapi.responses import JSONResponse
 import uvicorn
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 from dotenv import load_dotenv
 
+from admin_registry import AdminRegistry, config_mtime, load_registry
+from api_client import ApiClient, ApiStatusError
+from cache import SWRCache, TTLCache
+from digest import DigestBuffer
+from message_map import MessageMap
+from order_export import ExportRequest, export_orders_csv, parse_export_args
+from order_mirror import OrderMirror
+from order_search import OrderSearchIndex
+from order_stats import OrderStats, load_snapshot, parse_status_change, save_snapshot
+from outbox import Outbox, STATUS_FAILED, STATUS_PENDING, STATUS_SENT, OUTBOX_RETRY_SECONDS, is_transient_error
+from status_queue import StatusChange, StatusPatchQueue
+from update_queue import UpdateQueue
+
 load_dotenv()
 
 logging.basicConfig(
@@ -33,51 +50,49 @@ logger = logging.getLogger(__name__)
 # Config
 # Admin Bot требует отдельный токен (ADMIN_BOT_TOKEN)
 BOT_TOKEN = os.getenv('ADMIN_BOT_TOKEN', '')
-ADMIN_CHAT_ID_RAW = os.getenv('ADMIN_CHAT_ID') or os.getenv('TELEGRAM_MANAGER_CHAT_ID', '')
-ADMIN_WHITELIST_RAW = os.getenv('ADMIN_WHITELIST', '')
 API_URL = os.getenv('API_URL', 'http://localhost:3000/api')
 PORT = int(os.getenv('ADMIN_BOT_PORT', '8002'))
 USE_WEBHOOK = os.getenv('USE_WEBHOOK', 'false').lower() == 'true'
 WEBHOOK_URL = os.getenv('ADMIN_BOT_WEBHOOK_URL', '')
-
-# Игнорируем дефолтные значения (123456789 - это placeholder)
-DEFAULT_PLACEHOLDER_IDS = ['123456789', '123456', '0', '']
-
-# Обработка ADMIN_CHAT_ID - игнорируем дефолтные значения
-ADMIN_CHAT_ID = None
-if ADMIN_CHAT_ID_RAW and ADMIN_CHAT_ID_RAW not in DEFAULT_PLACEHOLDER_IDS:
-    ADMIN_CHAT_ID = ADMIN_CHAT_ID_RAW
-
-# Обработка ADMIN_WHITELIST - парсим и фильтруем дефолтные значения
-ADMIN_WHITELIST = []
-if ADMIN_WHITELIST_RAW:
-    for admin_id in ADMIN_WHITELIST_RAW.split(','):
-        admin_id = admin_id.strip()
-        if admin_id and admin_id not in DEFAULT_PLACEHOLDER_IDS:
-            ADMIN_WHITELIST.append(admin_id)
+OUTBOX_PATH = os.getenv('ADMIN_OUTBOX_PATH', 'logs/admin_outbox.sqlite3')
+MESSAGES_PATH = os.getenv('ADMIN_MESSAGES_PATH', 'logs/admin_messages.sqlite3')
+# Статусы, о которых админам приходит отдельное сообщение (карточка заказа редактируется всегда)
+STATUS_NEW_MESSAGE_ON = {
+    s.strip().upper() for s in os.getenv('ADMIN_STATUS_NEW_MESSAGE_ON', 'CANCELLED').split(',') if s.strip()
+}
+STATS_SNAPSHOT_PATH = os.getenv('STATS_SNAPSHOT_PATH', 'logs/admin_stats.json')
+STATS_RECONCILE_MINUTES = float(os.getenv('STATS_RECONCILE_MINUTES', '15'))
+ORDERS_PAGE_SIZE = int(os.getenv('ORDERS_PAGE_SIZE', '10'))
+ORDERS_PAGE_CACHE_SECONDS = float(os.getenv('ORDERS_PAGE_CACHE_SECONDS', '30'))
+ORDER_CACHE_SIZE = int(os.getenv('ORDER_CACHE_SIZE', '500'))
+ORDER_CACHE_SECONDS = float(os.getenv('ORDER_CACHE_SECONDS', '600'))
+ADMIN_SEND_CONCURRENCY = int(os.getenv('ADMIN_SEND_CONCURRENCY', '10'))
+ADMIN_CHAT_CHECK_MINUTES = float(os.getenv('ADMIN_CHAT_CHECK_MINUTES', '5'))
+# Файл (формат .env) с ADMIN_WHITELIST / ADMIN_CHAT_ID - перечитывается по SIGHUP и при изменении
+ADMIN_CONFIG_FILE = os.getenv('ADMIN_CONFIG_FILE', '')
+ADMIN_CONFIG_POLL_SECONDS = float(os.getenv('ADMIN_CONFIG_POLL_SECONDS', '10'))
+# Дайджест новых заказов: при > DIGEST_THRESHOLD_PER_MINUTE заказов/мин (0 - выключен)
+DIGEST_THRESHOLD_PER_MINUTE = int(os.getenv('DIGEST_THRESHOLD_PER_MINUTE', '10'))
+DIGEST_WINDOW_SECONDS = float(os.getenv('DIGEST_WINDOW_SECONDS', '60'))
+DIGEST_MAX_ORDERS = int(os.getenv('DIGEST_MAX_ORDERS', '30'))
+# Локальное зеркало заказов: статистика, списки и карточки читаются из него
+ORDER_MIRROR_ENABLED = os.getenv('ORDER_MIRROR_ENABLED', 'false').lower() == 'true'
+ORDER_MIRROR_PATH = os.getenv('ORDER_MIRROR_PATH', 'logs/admin_orders.sqlite3')
+ORDER_MIRROR_SYNC_SECONDS = float(os.getenv('ORDER_MIRROR_SYNC_SECONDS', '60'))
+# Выгрузка заказов: как часто обновлять сообщение с прогрессом
+EXPORT_PROGRESS_SECONDS = float(os.getenv('EXPORT_PROGRESS_SECONDS', '2'))
+# Массовая смена статуса: максимум заказов за раз, время жизни выбора, строк в итоговом сообщении
+BULK_MAX_ORDERS = int(os.getenv('BULK_MAX_ORDERS', '100'))
+BULK_SELECTION_MINUTES = float(os.getenv('BULK_SELECTION_MINUTES', '30'))
+BULK_SUMMARY_LINES = 50
 
 if BOT_TOKEN:
     logger.info(f'✅ Admin Bot token loaded')
 else:
     logger.warning('⚠️ ADMIN_BOT_TOKEN not set - Admin Bot disabled')
 
-# Логирование настроек админов
-if ADMIN_CHAT_ID:
-    logger.info(f'✅ Admin chat ID: {ADMIN_CHAT_ID}')
-elif ADMIN_CHAT_ID_RAW:
-    if ADMIN_CHAT_ID_RAW in DEFAULT_PLACEHOLDER_IDS:
-        logger.info(f'ℹ️  ADMIN_CHAT_ID="{ADMIN_CHAT_ID_RAW}" is default placeholder - IGNORED')
-    else:
-        logger.warning(f'⚠️ ADMIN_CHAT_ID="{ADMIN_CHAT_ID_RAW}" is invalid')
-else:
-    logger.info('ℹ️  ADMIN_CHAT_ID not set (will use ADMIN_WHITELIST if available)')
-
-if ADMIN_WHITELIST:
-    logger.info(f'✅ Admin whitelist: {ADMIN_WHITELIST} (will be used for notifications)')
-else:
-    logger.warning('⚠️ ADMIN_WHITELIST not set or contains only default values')
-
-# Проверяем финальную конфигурацию (будет выполнена после определения get_admin_ids())
+# Реестр админов: собирается один раз, при перезагрузке заменяется целиком
+admin_registry: AdminRegistry = load_registry(ADMIN_CONFIG_FILE)
 
 # Models
 class OrderNotification(BaseModel):
@@ -117,78 +132,63 @@ def map_status_to_api(status: str) -> str:
     return status
 
 # Список ID админов для уведомлений (из ADMIN_WHITELIST или ADMIN_CHAT_ID)
-def get_admin_ids() -> list:
+def get_admin_ids() -> tuple:
     """Получить список ID админов для отправки уведомлений"""
-    admin_ids = []
-    
-    # ВАЖНО: ADMIN_WHITELIST имеет приоритет над ADMIN_CHAT_ID
-    # Если ADMIN_WHITELIST установлен, используем только его
-    
-    # Сначала добавляем из ADMIN_WHITELIST (приоритет)
-    if ADMIN_WHITELIST:
-        logger.info(f"📋 Using ADMIN_WHITELIST: {ADMIN_WHITELIST}")
-        for admin_id in ADMIN_WHITELIST:
-            try:
-                admin_id_int = int(admin_id)
-                # Проверяем, что это не дефолтное значение
-                if str(admin_id_int) not in DEFAULT_PLACEHOLDER_IDS:
-                    if admin_id_int not in admin_ids:
-                        admin_ids.append(admin_id_int)
-                        logger.debug(f"✅ Added admin ID from whitelist: {admin_id_int}")
-                else:
-                    logger.warning(f"⚠️ Skipping default placeholder ID from whitelist: {admin_id}")
-            except ValueError:
-                logger.warning(f"⚠️ Invalid admin ID in whitelist: {admin_id}")
-    
-    # Если ADMIN_WHITELIST пуст, используем ADMIN_CHAT_ID (только если не дефолтный)
-    if not admin_ids and ADMIN_CHAT_ID:
-        logger.info(f"📋 ADMIN_WHITELIST empty, using ADMIN_CHAT_ID: {ADMIN_CHAT_ID}")
-        try:
-            chat_id = int(ADMIN_CHAT_ID)
-            if str(chat_id) not in DEFAULT_PLACEHOLDER_IDS:
-                admin_ids.append(chat_id)
-                logger.debug(f"✅ Added admin ID from ADMIN_CHAT_ID: {chat_id}")
-            else:
-                logger.warning(f"⚠️ Skipping default placeholder ADMIN_CHAT_ID: {ADMIN_CHAT_ID}")
-        except ValueError:
-            logger.warning(f"⚠️ Invalid ADMIN_CHAT_ID: {ADMIN_CHAT_ID}")
-    
-    # Логируем финальный список с детальной информацией
-    if admin_ids:
-        logger.info(f"✅ Final admin IDs to notify: {admin_ids} (types: {[type(id).__name__ for id in admin_ids]})")
-        logger.info(f"   Total count: {len(admin_ids)}")
-        for idx, admin_id in enumerate(admin_ids, 1):
-            logger.info(f"   [{idx}] Admin ID: {admin_id} (type: {type(admin_id).__name__}, value: {repr(admin_id)})")
-    else:
-        logger.error("❌ No valid admin IDs found! Check ADMIN_WHITELIST or ADMIN_CHAT_ID")
-        logger.error(f"   ADMIN_WHITELIST_RAW: '{ADMIN_WHITELIST_RAW}'")
-        logger.error(f"   ADMIN_CHAT_ID_RAW: '{ADMIN_CHAT_ID_RAW}'")
-        logger.error(f"   ADMIN_CHAT_ID (after filter): {ADMIN_CHAT_ID}")
-        logger.error(f"   ADMIN_WHITELIST (after filter): {ADMIN_WHITELIST}")
-    
-    return admin_ids
-
-# Проверяем финальную конфигурацию (после определения get_admin_ids)
-final_admin_ids = get_admin_ids()
-if final_admin_ids:
-    logger.info(f'✅ Final configuration: {len(final_admin_ids)} admin(s) will receive notifications: {final_admin_ids}')
-    logger.info(f'   Types: {[type(id).__name__ for id in final_admin_ids]}')
-    logger.info(f'   Values: {[repr(id) for id in final_admin_ids]}')
-    for idx, admin_id in enumerate(final_admin_ids, 1):
-        logger.info(f'   [{idx}] Admin ID: {admin_id} (type: {type(admin_id).__name__}, value: {repr(admin_id)})')
-else:
-    logger.error('❌ CRITICAL: No valid admin IDs configured! Notifications will fail!')
-    logger.error(f'   ADMIN_WHITELIST_RAW: "{ADMIN_WHITELIST_RAW}"')
-    logger.error(f'   ADMIN_CHAT_ID_RAW: "{ADMIN_CHAT_ID_RAW}"')
-    logger.error(f'   ADMIN_CHAT_ID (after filter): {ADMIN_CHAT_ID}')
+    return admin_registry.notify_ids
+
+def reload_admin_registry() -> None:
+    """Перечитать список админов (SIGHUP / изменение ADMIN_CONFIG_FILE)"""
+    global admin_registry
+    try:
+        admin_registry = load_registry(ADMIN_CONFIG_FILE)
+    except Exception as e:
+        logger.error(f"❌ Failed to reload admin registry, keeping previous: {e}")
+
+async def admin_config_watch_loop():
+    """Перезагрузка реестра при изменении ADMIN_CONFIG_FILE (проверка mtime)"""
+    last_mtime = config_mtime(ADMIN_CONFIG_FILE)
+    while True:
+        await asyncio.sleep(ADMIN_CONFIG_POLL_SECONDS)
+        mtime = config_mtime(ADMIN_CONFIG_FILE)
+        if mtime != last_mtime:
+            last_mtime = mtime
+            logger.info(f"🔁 {ADMIN_CONFIG_FILE} changed, reloading admin registry")
+            reload_admin_registry()
 
 application: Optional[Application] = None
 
+# Персистентный outbox: уведомления переживают рестарт контейнера
+outbox = Outbox(OUTBOX_PATH)
+
+# Очередь webhook апдейтов (быстрый ответ Telegram, обработка в фоне)
+update_queue = UpdateQueue()
+
+# Общий HTTP клиент к API (одна сессия на процесс)
+api_client = ApiClient(API_URL)
+
+# Карточки заказов в чатах админов (для редактирования при смене статуса)
+message_map = MessageMap(MESSAGES_PATH)
+
+# Зеркало заказов (ORDER_MIRROR_ENABLED): пока первая синхронизация не прошла - читаем API
+order_mirror: Optional[OrderMirror] = OrderMirror(ORDER_MIRROR_PATH) if ORDER_MIRROR_ENABLED else None
+
+def mirror_ready() -> bool:
+    return order_mirror is not None and order_mirror.ready
+
+async def order_mirror_sync_loop():
+    """Инкрементальная синхронизация зеркала по курсору updatedAt"""
+    while True:
+        try:
+            await order_mirror.sync(api_client)
+        except Exception as e:
+            logger.error(f"Order mirror sync failed: {e}")
+        await asyncio.sleep(ORDER_MIRROR_SYNC_SECONDS)
+
 def get_bot() -> Bot:
     return application.bot if application else Bot(token=BOT_TOKEN)
 
 def is_admin(user_id: int) -> bool:
-    return str(user_id) == str(ADMIN_CHAT_ID) or str(user_id) in ADMIN_WHITELIST
+    return admin_registry.is_admin(user_id)
 
 def order_keyboard(order_num: str, status: str = 'NEW') -> InlineKeyboardMarkup:
     kb = []
@@ -213,24 +213,436 @@ def main_keyboard() -> InlineKeyboardMarkup:
          InlineKeyboardButton("🔄 В работе", callback_data="ord_PROCESSING")]
     ])
 
+# Поисковый индекс для inline-запросов: перестраивается при сверке, между сверками - события
+order_search = OrderSearchIndex()
+
+# Пока идёт сверка, события /notify/* копятся здесь ('stats' | 'search', apply) и повторяются
+# на новых счётчиках и индексе перед подменой - иначе они потерялись бы до следующей сверки
+_refresh_events: Optional[list] = None
+
+async def load_order_stats() -> OrderStats:
+    """
+    Сверка: по зеркалу (если включено), иначе заказы читаются из API потоком за один проход.
+    Тем же проходом перестраивается поисковый индекс
+    """
+    global order_search, _refresh_events
+    _refresh_events = []
+    try:
+        search_index = OrderSearchIndex()
+        if mirror_ready():
+            try:
+                await order_mirror.sync(api_client)
+            except Exception as e:
+                logger.warning(f"Order mirror sync before stats failed, using local data: {e}")
+            order_stats = await order_mirror.build_stats()
+            for row in await order_mirror.search_rows():
+                search_index.add(row)
+        else:
+            logger.info("Fetching all orders for statistics")
+            order_stats = OrderStats()
+            async for order in api_client.iter_array("/bots/orders"):
+                if isinstance(order, dict):
+                    order_stats.add(order)
+                    search_index.add(order)
+        await asyncio.to_thread(save_snapshot, order_stats, STATS_SNAPSHOT_PATH, datetime.now())
+        # Дальше без await: stats_cache.set() выполняется сразу после возврата, новые события
+        # пойдут уже в новые объекты
+        events = _refresh_events
+        for target, apply in events:
+            apply(order_stats if target == 'stats' else search_index)
+    finally:
+        _refresh_events = None
+    order_search = search_index
+    if events:
+        logger.info(f"Replayed {len(events)} order events received during reconcile")
+        _schedule_stats_snapshot()
+    return order_stats
+
+# Счётчики статистики: обновляются событиями /notify/*, периодически сверяются с API
+stats_cache = SWRCache(load_order_stats, ttl=STATS_RECONCILE_MINUTES * 60, name='stats')
+_stats_snapshot_task: Optional[asyncio.Task] = None
+
+def update_stats(apply) -> None:
+    """Применить событие к счётчикам (если они уже загружены) и отложенно сохранить снапшот"""
+    if _refresh_events is not None:
+        _refresh_events.append(('stats', apply))
+    order_stats = stats_cache.peek()
+    if order_stats is None or not apply(order_stats):
+        return
+    _schedule_stats_snapshot()
+
+def update_search(apply) -> None:
+    """Применить событие к поисковому индексу (и к строящемуся при сверке)"""
+    if _refresh_events is not None:
+        _refresh_events.append(('search', apply))
+    apply(order_search)
+
+def _schedule_stats_snapshot() -> None:
+    global _stats_snapshot_task
+    if _stats_snapshot_task is None or _stats_snapshot_task.done():
+        _stats_snapshot_task = asyncio.create_task(_save_stats_snapshot_later())
+
+async def _save_stats_snapshot_later(delay: float = 5.0):
+    """Копим события несколько секунд и пишем один снапшот"""
+    await asyncio.sleep(delay)
+    order_stats = stats_cache.peek()
+    if order_stats is not None:
+        await asyncio.to_thread(save_snapshot, order_stats, STATS_SNAPSHOT_PATH, datetime.now())
+
+async def stats_reconcile_loop():
+    """Периодическая сверка счётчиков с /bots/orders"""
+    while True:
+        try:
+            await stats_cache.refresh()
+        except Exception as e:
+            logger.error(f"Stats reconcile failed: {e}")
+        await asyncio.sleep(STATS_RECONCILE_MINUTES * 60)
+
+# Страницы списков заказов: (status, offset) -> (orders, has_next), короткий TTL
+orders_page_cache = TTLCache(maxsize=200, ttl=ORDERS_PAGE_CACHE_SECONDS, name='orders-pages')
+_orders_page_loads: dict = {}
+
+async def fetch_orders_page(api_status: str, offset: int) -> tuple:
+    """Одна страница заказов из API (+1 запись, чтобы понять, есть ли следующая)"""
+    logger.info(f"Fetching orders page: status={api_status}, offset={offset}")
+    resp = await api_client.get(
+        "/bots/orders",
+        params={"status": api_status, "limit": ORDERS_PAGE_SIZE + 1, "offset": offset}
+    )
+    if resp.status != 200:
+        raise ApiStatusError(resp.status, resp.text)
+    orders = resp.json() or []
+    if not isinstance(orders, list):
+        raise ValueError(f"Expected list, got {type(orders).__name__}")
+    return orders[:ORDERS_PAGE_SIZE], len(orders) > ORDERS_PAGE_SIZE
+
+def _load_orders_page(api_status: str, offset: int) -> asyncio.Task:
+    """Загрузка страницы в кэш; одновременные запросы одной страницы схлопываются"""
+    key = (api_status, offset)
+    task = _orders_page_loads.get(key)
+    if task is None:
+        task = asyncio.create_task(fetch_orders_page(api_status, offset), name=f"orders-page-{api_status}-{offset}")
+        _orders_page_loads[key] = task
+
+        def _done(t: asyncio.Task):
+            _orders_page_loads.pop(key, None)
+            if not t.cancelled() and t.exception() is None:
+                orders_page_cache.set(key, t.result())
+
+        task.add_done_callback(_done)
+    return task
+
+async def get_orders_page(api_status: str, offset: int) -> tuple:
+    """Страница заказов: из зеркала, кэша или API"""
+    if mirror_ready():
+        return await order_mirror.page(api_status, offset, ORDERS_PAGE_SIZE)
+    page = orders_page_cache.get((api_status, offset))
+    if page is not None:
+        return page
+    return await asyncio.shield(_load_orders_page(api_status, offset))
+
+def prefetch_orders_page(api_status: str, offset: int) -> None:
+    """Подгрузить страницу в фоне (пока админ читает текущую)"""
+    if not mirror_ready() and (api_status, offset) not in orders_page_cache:
+        _load_orders_page(api_status, offset)
+
+def invalidate_orders_pages(api_status: Optional[str] = None) -> None:
+    """Сбросить страницы статуса (или все) после изменения заказов"""
+    if api_status is None:
+        orders_page_cache.clear()
+    else:
+        orders_page_cache.invalidate_where(lambda key: key[0] == api_status)
+
+# Детали заказов: orderNumber -> заказ (обновляются событиями и сменой статуса из бота)
+order_details_cache = TTLCache(maxsize=ORDER_CACHE_SIZE, ttl=ORDER_CACHE_SECONDS, name='order-details')
+
+def update_cached_order(order_num: str, **fields) -> None:
+    """Обновить поля заказа в кэше (если он там есть)"""
+    order = order_details_cache.get(order_num)
+    if order is not None:
+        order.update(fields)
+
+def format_order_details(order: dict) -> str:
+    """Текст карточки заказа (HTML)"""
+    # Формируем список товаров с безопасным преобразованием типов
+    items_text = ""
+    for item in order.get('items') or []:
+        product_name = item.get('productName', 'N/A')
+        variant_name = item.get('variantName', '') or ''
+        quantity = item.get('quantity', 0)
+        
+        # Конвертируем price в float (может быть строкой из Decimal)
+        try:
+            price = float(item.get('price', 0))
+        except (ValueError, TypeError):
+            price = 0.0
+        
+        variant_str = f" ({variant_name})" if variant_name else ""
+        items_text += f"  • {product_name}{variant_str} - {quantity} шт. × {price:,.0f} ₽\n"
+    
+    if not items_text:
+        # Заказ из /notify/admin: товары уже отформатированы API
+        items_text = order.get('itemsText') or "  (нет товаров)"
+    
+    # Нормализуем статус для отображения (PENDING -> NEW для UI)
+    order_status = order.get('status', 'PENDING')
+    if order_status == 'PENDING':
+        status_emoji, status_text, _ = STATUSES.get('NEW', STATUSES['PENDING'])
+    else:
+        status_emoji, status_text, _ = STATUSES.get(order_status, ('📋', order_status, []))
+    
+    # Конвертируем total в float (может быть строкой из Decimal)
+    try:
+        total = float(order.get('total', 0))
+    except (ValueError, TypeError):
+        total = 0.0
+    
+    customer_email = order.get('customerEmail', '') or ''
+    customer_address = order.get('customerAddress', '') or ''
+    comment = order.get('comment', '') or ''
+    
+    return f"""📦 <b>Заказ #{order.get('orderNumber', 'N/A')}</b>
+
+👤 <b>Клиент:</b>
+{order.get('customerName', 'N/A')}
+📱 {order.get('customerPhone', 'N/A')}
+{f"📧 {customer_email}" if customer_email else ''}
+{f"📍 {customer_address}" if customer_address else ''}
+
+📦 <b>Товары:</b>
+{items_text.strip()}
+
+💰 <b>Сумма:</b> {total:,.0f} ₽
+
+📊 <b>Статус:</b> {status_emoji} {status_text}
+💳 <b>Оплата:</b> {'✅ Оплачен' if order.get('paymentStatus') == 'PAID' else '⏳ Не оплачен'}
+
+{f"💬 <b>Комментарий:</b> {comment}" if comment else ''}
+    """.strip()
+
 # Handlers
+async def inline_query_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Поиск заказа: @bot ORD-12 / фрагмент телефона / имя клиента"""
+    query = update.inline_query
+    if not is_admin(query.from_user.id):
+        await query.answer([], cache_time=60, is_personal=True)
+        return
+    
+    results = []
+    for doc in order_search.search(query.query, limit=20):
+        status = 'NEW' if doc.status == 'PENDING' else doc.status
+        emoji, text, _ = STATUSES.get(status, ('📋', status, []))
+        card = (
+            f"📦 <b>Заказ #{doc.orderNumber}</b>\n\n"
+            f"👤 {doc.customerName or 'N/A'}\n"
+            f"📱 {doc.customerPhone or 'N/A'}\n"
+            f"💰 <b>Сумма:</b> {doc.total:,.0f} ₽\n"
+            f"📊 <b>Статус:</b> {emoji} {text}"
+        )
+        results.append(InlineQueryResultArticle(
+            id=doc.orderNumber,
+            title=f"#{doc.orderNumber} - {doc.customerName or 'N/A'}",
+            description=f"{emoji} {text} · {doc.total:,.0f} ₽ · {doc.customerPhone}",
+            input_message_content=InputTextMessageContent(card, parse_mode=ParseMode.HTML),
+            reply_markup=order_keyboard(doc.orderNumber, status),
+        ))
+    await query.answer(results, cache_time=5, is_personal=True)
+
 async def start_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_admin(update.effective_user.id):
         await update.message.reply_text("⛔ Доступ запрещён")
         return
+    # Админ написал боту - чат снова доступен для уведомлений
+    admin_chat_reachable[update.effective_user.id] = True
     await update.message.reply_text(
         f"👋 <b>Админ-панель ОптМрамор</b>\n\nВыберите действие:",
         parse_mode=ParseMode.HTML, reply_markup=main_keyboard()
     )
 
+# Выгрузка: одновременно выполняется только одна (API и память не делим между выгрузками)
+_export_task: Optional[asyncio.Task] = None
+
+EXPORT_USAGE = (
+    "📤 <b>Выгрузка заказов в CSV</b>\n\n"
+    "<code>/export [с] [по] [статус]</code>\n"
+    "Даты - ДД.ММ.ГГГГ, статус - NEW, CONFIRMED, PROCESSING, SHIPPED, DELIVERED, CANCELLED\n"
+    "Без дат - последние 30 дней, без статуса - все заказы\n\n"
+    "Пример: <code>/export 01.09.2026 30.09.2026 DELIVERED</code>"
+)
+
+async def export_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    global _export_task
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("⛔ Доступ запрещён")
+        return
+    try:
+        request = parse_export_args(context.args or [], {key: map_status_to_api(key) for key in STATUSES})
+    except ValueError as e:
+        await update.message.reply_text(f"❌ {e}\n\n{EXPORT_USAGE}", parse_mode=ParseMode.HTML)
+        return
+    if _export_task and not _export_task.done():
+        await update.message.reply_text("⏳ Уже выполняется другая выгрузка, попробуйте позже")
+        return
+    
+    progress_msg = await update.message.reply_text(f"📤 Выгрузка заказов ({request.describe()})...")
+    # В фоне: обработка апдейтов этого чата не ждёт окончания выгрузки
+    _export_task = asyncio.create_task(run_export(update.effective_chat.id, progress_msg, request), name="orders-export")
+
+async def run_export(chat_id: int, progress_msg, request: ExportRequest) -> None:
+    """Выгрузить заказы, показывая прогресс, и отправить файл документом"""
+    status_labels = {map_status_to_api(key): text for key, (_, text, _) in STATUSES.items()}
+    last_edit = asyncio.get_running_loop().time()
+
+    async def progress(count: int) -> None:
+        nonlocal last_edit
+        now = asyncio.get_running_loop().time()
+        if now - last_edit < EXPORT_PROGRESS_SECONDS:
+            return
+        last_edit = now
+        try:
+            await progress_msg.edit_text(f"📤 Выгрузка заказов ({request.describe()}): {count}...")
+        except TelegramError as e:
+            logger.warning(f"Export progress update failed: {e}")
+
+    async def report(text: str) -> None:
+        """Итог выгрузки: в сообщение прогресса, а если его не отредактировать - новым сообщением"""
+        try:
+            await progress_msg.edit_text(text)
+            return
+        except TelegramError as e:
+            logger.warning(f"Export status update failed: {e}")
+        try:
+            await get_bot().send_message(chat_id, text)
+        except TelegramError as e:
+            logger.error(f"Export status not delivered to {chat_id}: {e}")
+
+    try:
+        file, count = await export_orders_csv(api_client, request, status_labels, progress)
+    except ApiStatusError as e:
+        logger.error(f"Export failed: API {e.status} - {e.text}")
+        await report(f"❌ Ошибка выгрузки: API {e.status}")
+        return
+    except Exception as e:
+        logger.exception(f"Export failed: {e}")
+        await report("❌ Ошибка выгрузки, попробуйте позже")
+        return
+
+    with file:
+        if not count:
+            await report(f"📭 Заказов не найдено ({request.describe()})")
+            return
+        try:
+            await progress_msg.edit_text(f"📤 Отправка файла: {count} заказов...")
+        except TelegramError as e:
+            logger.warning(f"Export progress update failed: {e}")
+        try:
+            await get_bot().send_document(
+                chat_id,
+                document=file,
+                filename=request.filename,
+                caption=f"📤 Заказы: {request.describe()} - {count} шт.",
+            )
+        except TelegramError as e:
+            logger.error(f"Export file not sent to {chat_id}: {e}")
+            await report(f"❌ Не удалось отправить файл выгрузки ({count} заказов): {e}")
+            return
+    await report(f"✅ Выгрузка готова: {count} заказов ({request.describe()})")
+
+# Режим выбора в списке заказов: (chat_id, message_id) -> {'status': статус списка, 'selected': номера}
+bulk_selections = TTLCache(maxsize=200, ttl=BULK_SELECTION_MINUTES * 60, name='bulk-selections')
+
+def format_bulk_page(selection: dict, offset: int, orders: list) -> str:
+    """Текст страницы в режиме выбора"""
+    status = selection['status']
+    emoji, text, _ = STATUSES.get(status, ('📋', status, []))
+    page_no = offset // ORDERS_PAGE_SIZE + 1
+    return (
+        f"☑️ <b>{emoji} {text}</b> (Стр. {page_no})\n\n"
+        f"Отметьте заказы и выберите новый статус.\n"
+        f"Выбрано: <b>{len(selection['selected'])}</b>"
+        + ("" if orders else "\n\nЗаказы не найдены")
+    )
+
+def bulk_keyboard(selection: dict, offset: int, orders: list, has_next: bool) -> InlineKeyboardMarkup:
+    """Чекбоксы заказов страницы, навигация и действия над выбранными"""
+    status = selection['status']
+    selected = selection['selected']
+    kb = []
+    for o in orders:
+        order_num = o.get('orderNumber', 'N/A')
+        mark = "✅" if order_num in selected else "⬜"
+        kb.append([InlineKeyboardButton(
+            f"{mark} #{order_num} - {(o.get('customerName') or 'N/A')[:20]}",
+            callback_data=f"tgl_{offset}_{order_num}"
+        )])
+    
+    nav = []
+    if offset > 0:
+        nav.append(InlineKeyboardButton("⬅️ Пред.", callback_data=f"sel_{status}_{max(offset - ORDERS_PAGE_SIZE, 0)}"))
+    if orders:
+        nav.append(InlineKeyboardButton("☑️ Вся страница", callback_data=f"tgp_{offset}"))
+    if has_next:
+        nav.append(InlineKeyboardButton("След. ➡️", callback_data=f"sel_{status}_{offset + ORDERS_PAGE_SIZE}"))
+    if nav:
+        kb.append(nav)
+    
+    if selected:
+        _, _, next_statuses = STATUSES.get(map_status_to_api(status), ('', '', []))
+        kb.append([
+            InlineKeyboardButton(f"{STATUSES[s][0]} {STATUSES[s][1]} ({len(selected)})", callback_data=f"bulk_{s}")
+            for s in next_statuses
+        ])
+    kb.append([InlineKeyboardButton("✖️ Отмена", callback_data=f"ord_{status}_{offset}")])
+    return InlineKeyboardMarkup(kb)
+
+async def apply_bulk_status(order_nums: list, source: str, target: str) -> list:
+    """
+    Сменить статус заказов через status_patches (параллельно с лимитом STATUS_PATCH_CONCURRENCY).
+    Возвращает [(номер, None | текст ошибки)]
+    """
+    results = []
+    changes = []
+    for order_num in order_nums:
+        # Заказ мог уйти из статуса списка (другой админ / сайт) - проверяем переход по известному статусу
+        doc = order_search.docs.get(order_num)
+        current = doc.status if doc else source
+        if target not in STATUSES.get(current, ('', '', []))[2]:
+            _, current_text, _ = STATUSES.get(current, ('📋', current, []))
+            results.append((order_num, f"уже «{current_text}»"))
+            continue
+        changes.append(status_patches.submit(order_num, target))
+    
+    errors = await asyncio.gather(*(asyncio.shield(change.done) for change in changes))
+    for change, error in zip(changes, errors):
+        if error is None:
+            results.append((change.order_number, None))
+        elif isinstance(error, ApiStatusError):
+            results.append((change.order_number, f"ошибка {error.status}"))
+        else:
+            results.append((change.order_number, str(error)[:100] or type(error).__name__))
+    logger.info(f"Bulk status {source} -> {target}: {sum(1 for _, e in results if e is None)}/{len(results)} ok")
+    return sorted(results, key=lambda r: (r[1] is None, r[0]))
+
+def format_bulk_results(results: list, target: str) -> str:
+    """Итог массовой смены статуса по каждому заказу (сначала ошибки)"""
+    emoji, text, _ = STATUSES.get(target, ('📋', target, []))
+    ok = sum(1 for _, error in results if error is None)
+    lines = [f"{emoji} <b>Статус «{text}»: {ok} из {len(results)}</b>\n"]
+    for order_num, error in results[:BULK_SUMMARY_LINES]:
+        lines.append(f"✅ #{order_num}" if error is None else f"❌ #{order_num}: {error}")
+    if len(results) > BULK_SUMMARY_LINES:
+        lines.append(f"... и ещё {len(results) - BULK_SUMMARY_LINES}")
+    return "\n".join(lines)
+
 async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     q = update.callback_query
     if not is_admin(q.from_user.id):
         await q.answer("⛔ Доступ запрещён", show_alert=True)
         return
     
-    await q.answer()  # Отвечаем на callback сразу
     data = q.data
+    if not data.startswith("st_"):
+        await q.answer()  # Отвечаем на callback сразу (смена статуса - после ответа API)
     
     try:
         if data == "main":
@@ -240,120 +652,30 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 reply_markup=main_keyboard()
             )
         elif data == "stats":
-            # Получить статистику
+            # Статистика из кэша (TTL + фоновое обновление, один запрос на всех админов)
             try:
-                async with aiohttp.ClientSession() as session:
-                    api_key = os.getenv('BOT_API_KEY') or os.getenv('JWT_SECRET', '')
-                    headers = {
-                        'X-Bot-API-Key': api_key,
-                        'Content-Type': 'application/json',
-                    }
-                    
-                    # Получаем все заказы для подсчета статистики
-                    url = f"{API_URL}/bots/orders"
-                    logger.info(f"Fetching all orders for statistics from {url}")
-                    
-                    async with session.get(url, headers=headers) as resp:
-                        if resp.status == 200:
-                            all_orders = await resp.json()
-                            if not isinstance(all_orders, list):
-                                all_orders = []
-                            
-                            # Подсчитываем статистику
-                            total_orders = len(all_orders)
-                            pending_count = sum(1 for o in all_orders if o.get('status') == 'PENDING')
-                            confirmed_count = sum(1 for o in all_orders if o.get('status') == 'CONFIRMED')
-                            processing_count = sum(1 for o in all_orders if o.get('status') == 'PROCESSING')
-                            shipped_count = sum(1 for o in all_orders if o.get('status') == 'SHIPPED')
-                            delivered_count = sum(1 for o in all_orders if o.get('status') == 'DELIVERED')
-                            cancelled_count = sum(1 for o in all_orders if o.get('status') == 'CANCELLED')
-                            
-                            # Подсчитываем выручку (только оплаченные заказы)
-                            total_revenue = 0.0
-                            paid_orders = 0
-                            for o in all_orders:
-                                if o.get('paymentStatus') == 'PAID':
-                                    try:
-                                        total_revenue += float(o.get('total', 0))
-                                        paid_orders += 1
-                                    except (ValueError, TypeError):
-                                        pass
-                            
-                            # Заказы за сегодня
-                            today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-                            today_orders = 0
-                            for o in all_orders:
-                                if o.get('createdAt'):
-                                    try:
-                                        # Парсим дату (может быть в разных форматах)
-                                        created_str = o.get('createdAt', '')
-                                        if 'T' in created_str:
-                                            # ISO format: 2025-11-28T19:52:00.222Z
-                                            if created_str.endswith('Z'):
-                                                created_str = created_str[:-1] + '+00:00'
-                                            order_date = datetime.fromisoformat(created_str).replace(tzinfo=None)
-                                        else:
-                                            # Другой формат, пропускаем
-                                            continue
-                                        
-                                        if order_date >= today_start:
-                                            today_orders += 1
-                                    except (ValueError, TypeError, AttributeError) as e:
-                                        logger.debug(f"Error parsing date {o.get('createdAt')}: {e}")
-                                        continue
-                            
-                            today_revenue = 0.0
-                            for o in all_orders:
-                                if o.get('paymentStatus') == 'PAID' and o.get('createdAt'):
-                                    try:
-                                        created_str = o.get('createdAt', '')
-                                        if 'T' in created_str:
-                                            if created_str.endswith('Z'):
-                                                created_str = created_str[:-1] + '+00:00'
-                                            order_date = datetime.fromisoformat(created_str).replace(tzinfo=None)
-                                        else:
-                                            continue
-                                        
-                                        if order_date >= today_start:
-                                            today_revenue += float(o.get('total', 0))
-                                    except (ValueError, TypeError, AttributeError):
-                                        pass
-                            
-                            stats_msg = f"""📊 <b>Статистика</b>
-
-📦 <b>Всего заказов:</b> {total_orders}
-💰 <b>Выручка (оплачено):</b> {total_revenue:,.0f} ₽
-💳 <b>Оплачено заказов:</b> {paid_orders}
-
-📅 <b>Сегодня:</b>
-  • Заказов: {today_orders}
-  • Выручка: {today_revenue:,.0f} ₽
-
-📊 <b>По статусам:</b>
-  🆕 Новые: {pending_count}
-  ✅ Подтверждённые: {confirmed_count}
-  🔄 В работе: {processing_count}
-  📦 Готов к выдаче: {shipped_count}
-  🎉 Выдан: {delivered_count}
-  ❌ Отменён: {cancelled_count}
-                            """.strip()
-                            
-                            await q.edit_message_text(
-                                stats_msg,
-                                parse_mode=ParseMode.HTML,
-                                reply_markup=InlineKeyboardMarkup([
-                                    [InlineKeyboardButton("🔄 Обновить", callback_data="stats")],
-                                    [InlineKeyboardButton("◀️ Назад", callback_data="main")]
-                                ])
-                            )
-                        else:
-                            error_text = await resp.text()
-                            logger.error(f"API error fetching stats: {resp.status} - {error_text}")
-                            await q.edit_message_text(
-                                f"❌ Ошибка загрузки статистики: {resp.status}",
-                                parse_mode=ParseMode.HTML,
-                                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Назад", callback_data="main")]])
-                            )
+                cached = await stats_cache.get()
+                stats_msg = cached.value.format_message()
+                if cached.stale or cached.error:
+                    stats_msg += f"\n\n🕒 Данные на {cached.fetched_at:%d.%m %H:%M:%S}"
+                    if cached.error:
+                        stats_msg += " (API недоступен)"
+                
+                await q.edit_message_text(
+                    stats_msg,
+                    parse_mode=ParseMode.HTML,
+                    reply_markup=InlineKeyboardMarkup([
+                        [InlineKeyboardButton("🔄 Обновить", callback_data="stats")],
+                        [InlineKeyboardButton("◀️ Назад", callback_data="main")]
+                    ])
+                )
+            except ApiStatusError as e:
+                logger.error(f"API error fetching stats: {e.status} - {e.text}")
+                await q.edit_message_text(
+                    f"❌ Ошибка загрузки статистики: {e.status}",
+                    parse_mode=ParseMode.HTML,
+                    reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Назад", callback_data="main")]])
+                )
             except Exception as e:
                 logger.exception(f"Error fetching statistics: {e}")
                 await q.edit_message_text(
@@ -374,104 +696,108 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 ])
             )
         elif data.startswith("ord_"):
-            # Показать заказы по статусу
-            status = data.replace("ord_", "")
+            # Показать заказы по статусу постранично
+            # Формат: ord_NEW или ord_NEW_20 (со смещением страницы)
+            parts = data.split("_")
+            status = parts[1]
+            offset = int(parts[2]) if len(parts) > 2 and parts[2].isdigit() else 0
             # Маппим NEW -> PENDING для API
             api_status = map_status_to_api(status)
             emoji, text, _ = STATUSES.get(status, STATUSES.get(api_status, ('📋', status, [])))
+            if q.message:
+                bulk_selections.pop((q.message.chat_id, q.message.message_id))
             
             try:
-                async with aiohttp.ClientSession() as session:
-                    # Используем JWT_SECRET как API ключ (fallback на BOT_API_KEY если есть)
-                    api_key = os.getenv('BOT_API_KEY') or os.getenv('JWT_SECRET', '')
-                    headers = {
-                        'X-Bot-API-Key': api_key,
-                        'Content-Type': 'application/json',
-                    }
-                    url = f"{API_URL}/bots/orders?status={api_status}"
-                    
-                    logger.info(f"Fetching orders with status={status} from {url}")
-                    logger.debug(f"API key: {api_key[:10]}...{api_key[-5:] if len(api_key) > 15 else '***'}")
+                orders, has_next = await get_orders_page(api_status, offset)
+                if has_next:
+                    prefetch_orders_page(api_status, offset + ORDERS_PAGE_SIZE)
+                
+                if orders:
+                    orders_buttons = []
+                    orders_text = ""
                     
-                    async with session.get(url, headers=headers) as resp:
-                        response_text = await resp.text()
-                        logger.info(f"API response status: {resp.status}, content-type: {resp.headers.get('content-type', 'unknown')}")
+                    for o in orders:
+                        order_num = o.get('orderNumber', 'N/A')
+                        customer_name = o.get('customerName', 'N/A')
+                        # Конвертируем total в float (может быть строкой из Decimal)
+                        try:
+                            total = float(o.get('total', 0))
+                        except (ValueError, TypeError):
+                            total = 0.0
                         
-                        if resp.status == 200:
-                            try:
-                                orders = await resp.json() if response_text else []
-                            except Exception as json_error:
-                                logger.error(f"Failed to parse JSON response: {json_error}, response: {response_text[:500]}")
-                                orders = []
-                            
-                            logger.info(f"Received {len(orders) if orders else 0} orders")
-                            
-                            # Проверяем, что orders - это массив
-                            if not isinstance(orders, list):
-                                logger.error(f"Expected list, got {type(orders)}: {orders}")
-                                orders = []
-                            
-                            if orders and len(orders) > 0:
-                                orders_buttons = []
-                                orders_text = ""
-                                
-                                for o in orders[:10]:  # Показываем первые 10
-                                    order_num = o.get('orderNumber', 'N/A')
-                                    customer_name = o.get('customerName', 'N/A')
-                                    # Конвертируем total в float (может быть строкой из Decimal)
-                                    try:
-                                        total = float(o.get('total', 0))
-                                    except (ValueError, TypeError):
-                                        total = 0.0
-                                    
-                                    orders_text += f"• #{order_num} - {customer_name} - {total:,.0f} ₽\n"
-                                    # Добавляем кнопку для каждого заказа
-                                    orders_buttons.append([
-                                        InlineKeyboardButton(
-                                            f"#{order_num} - {customer_name[:20]}",
-                                            callback_data=f"det_{order_num}_ord_{status}"
-                                        )
-                                    ])
-                                
-                                if len(orders) > 10:
-                                    orders_text += f"\n... и ещё {len(orders) - 10} заказов"
-                                
-                                msg = f"📦 <b>{emoji} {text}</b>\n\n{orders_text}"
-                                
-                                # Добавляем кнопку "Назад"
-                                orders_buttons.append([InlineKeyboardButton("◀️ Назад", callback_data="orders")])
-                                
-                                await q.edit_message_text(
-                                    msg,
-                                    parse_mode=ParseMode.HTML,
-                                    reply_markup=InlineKeyboardMarkup(orders_buttons)
-                                )
-                            else:
-                                await q.edit_message_text(
-                                    f"📦 <b>{emoji} {text}</b>\n\nЗаказы не найдены",
-                                    parse_mode=ParseMode.HTML,
-                                    reply_markup=InlineKeyboardMarkup([
-                                        [InlineKeyboardButton("◀️ Назад", callback_data="orders")]
-                                    ])
-                                )
-                        else:
-                            logger.error(f"API error: {resp.status} - {response_text[:500]}")
-                            
-                            # Формируем понятное сообщение об ошибке
-                            if resp.status == 401:
-                                error_msg = "❌ Ошибка авторизации API. Проверьте BOT_API_KEY или JWT_SECRET."
-                            elif resp.status == 500:
-                                error_msg = f"❌ Ошибка сервера (500). Проверьте логи API.\n\n{response_text[:150]}"
-                            else:
-                                error_msg = f"❌ Ошибка {resp.status}: {response_text[:150]}"
-                            
-                            await q.edit_message_text(
-                                error_msg,
-                                parse_mode=ParseMode.HTML,
-                                reply_markup=InlineKeyboardMarkup([
-                                    [InlineKeyboardButton("◀️ Назад", callback_data="orders")]
-                                ])
+                        orders_text += f"• #{order_num} - {customer_name} - {total:,.0f} ₽\n"
+                        # Добавляем кнопку для каждого заказа (с возвратом на эту страницу)
+                        orders_buttons.append([
+                            InlineKeyboardButton(
+                                f"#{order_num} - {customer_name[:20]}",
+                                callback_data=f"det_{order_num}_ord_{status}_{offset}"
                             )
+                        ])
+                    
+                    # Номер страницы (всего страниц - по счётчикам статистики, если они загружены)
+                    page_no = offset // ORDERS_PAGE_SIZE + 1
+                    page_info = f"Стр. {page_no}"
+                    order_stats = stats_cache.peek()
+                    if order_stats is not None and order_stats.by_status.get(api_status):
+                        pages = -(-order_stats.by_status[api_status] // ORDERS_PAGE_SIZE)
+                        if pages >= page_no:
+                            page_info += f" из {pages}"
+                    
+                    msg = f"📦 <b>{emoji} {text}</b> ({page_info})\n\n{orders_text}"
+                    
+                    # Навигация по страницам
+                    nav = []
+                    if offset > 0:
+                        nav.append(InlineKeyboardButton(
+                            "⬅️ Пред.", callback_data=f"ord_{status}_{max(offset - ORDERS_PAGE_SIZE, 0)}"
+                        ))
+                    if has_next:
+                        nav.append(InlineKeyboardButton(
+                            "След. ➡️", callback_data=f"ord_{status}_{offset + ORDERS_PAGE_SIZE}"
+                        ))
+                    if nav:
+                        orders_buttons.append(nav)
+                    
+                    # Массовая смена статуса (если из этого статуса есть переходы)
+                    if STATUSES.get(api_status, ('', '', []))[2]:
+                        orders_buttons.append([InlineKeyboardButton(
+                            "☑️ Выбрать несколько", callback_data=f"sel_{status}_{offset}"
+                        )])
+                    
+                    # Добавляем кнопку "Назад"
+                    orders_buttons.append([InlineKeyboardButton("◀️ Назад", callback_data="orders")])
+                    
+                    await q.edit_message_text(
+                        msg,
+                        parse_mode=ParseMode.HTML,
+                        reply_markup=InlineKeyboardMarkup(orders_buttons)
+                    )
+                else:
+                    await q.edit_message_text(
+                        f"📦 <b>{emoji} {text}</b>\n\nЗаказы не найдены",
+                        parse_mode=ParseMode.HTML,
+                        reply_markup=InlineKeyboardMarkup([
+                            [InlineKeyboardButton("◀️ Назад", callback_data="orders")]
+                        ])
+                    )
+            except ApiStatusError as e:
+                logger.error(f"API error: {e.status} - {e.text[:500]}")
+                
+                # Формируем понятное сообщение об ошибке
+                if e.status == 401:
+                    error_msg = "❌ Ошибка авторизации API. Проверьте BOT_API_KEY или JWT_SECRET."
+                elif e.status == 500:
+                    error_msg = f"❌ Ошибка сервера (500). Проверьте логи API.\n\n{e.text[:150]}"
+                else:
+                    error_msg = f"❌ Ошибка {e.status}: {e.text[:150]}"
+                
+                await q.edit_message_text(
+                    error_msg,
+                    parse_mode=ParseMode.HTML,
+                    reply_markup=InlineKeyboardMarkup([
+                        [InlineKeyboardButton("◀️ Назад", callback_data="orders")]
+                    ])
+                )
             except Exception as e:
                 logger.exception(f"Error fetching orders: {e}")
                 await q.edit_message_text(
@@ -480,156 +806,158 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Назад", callback_data="orders")]])
                 )
         elif data.startswith("st_"):
-            # Обновление статуса заказа
+            # Обновление статуса заказа: клавиатура меняется сразу, PATCH - в фоне (status_patches)
             parts = data.split("_")
             if len(parts) >= 3:
                 order_num, new_status = parts[1], parts[2]
                 # Маппим NEW -> PENDING для API
                 api_status = map_status_to_api(new_status)
-                emoji, text, _ = STATUSES.get(new_status, STATUSES.get(api_status, ('📋', new_status, [])))
+                rollback = q.message.reply_markup if q.message else None
                 
+                # Обновляем клавиатуру с новым статусом (используем оригинальный статус для UI)
+                new_keyboard = order_keyboard(order_num, new_status if new_status != 'PENDING' else 'NEW')
                 try:
-                    async with aiohttp.ClientSession() as session:
-                        api_key = os.getenv('BOT_API_KEY') or os.getenv('JWT_SECRET', '')
-                        headers = {
-                            'X-Bot-API-Key': api_key,
-                            'Content-Type': 'application/json',
-                        }
-                        url = f"{API_URL}/bots/orders/number/{order_num}/status"
-                        payload = {"status": api_status}
-                        
-                        async with session.patch(url, json=payload, headers=headers) as resp:
-                            if resp.status == 200:
-                                order_data = await resp.json()
-                                await q.answer(f"✅ Статус изменён на: {text}", show_alert=True)
-                                
-                                # Обновляем клавиатуру с новым статусом (используем оригинальный статус для UI)
-                                new_keyboard = order_keyboard(order_num, new_status if new_status != 'PENDING' else 'NEW')
-                                await q.edit_message_reply_markup(reply_markup=new_keyboard)
-                            else:
-                                error_text = await resp.text()
-                                logger.error(f"API error updating status: {resp.status} - {error_text}")
-                                await q.answer(f"❌ Ошибка: {resp.status}", show_alert=True)
-                except Exception as e:
-                    logger.exception(f"Error updating order status: {e}")
-                    await q.answer(f"❌ Ошибка: {str(e)}", show_alert=True)
+                    await q.edit_message_reply_markup(reply_markup=new_keyboard)
+                except BadRequest as e:
+                    if "not modified" not in str(e).lower():
+                        logger.warning(f"Optimistic keyboard update failed for {order_num}: {e}")
+                # На нажатие ответим, когда API подтвердит (или отклонит) изменение
+                status_patches.submit(order_num, api_status, waiter=q, rollback=rollback)
+        elif data.startswith(("sel_", "tgl_", "tgp_")):
+            # Режим выбора: sel_<STATUS>_<offset> - вход / страница, tgl_<offset>_<num> - заказ,
+            # tgp_<offset> - все заказы страницы
+            key = (q.message.chat_id, q.message.message_id)
+            parts = data.split("_", 2)
+            if parts[0] == "sel":
+                status = parts[1]
+                offset = int(parts[2]) if len(parts) > 2 and parts[2].isdigit() else 0
+                selection = bulk_selections.get(key)
+                if selection is None or selection['status'] != status:
+                    selection = {'status': status, 'selected': set()}
+                    bulk_selections.set(key, selection)
+            else:
+                selection = bulk_selections.get(key)
+                if selection is None:
+                    await q.edit_message_text(
+                        "⌛ Выбор устарел, откройте список заново",
+                        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Назад", callback_data="orders")]])
+                    )
+                    return
+                offset = int(parts[1]) if parts[1].isdigit() else 0
+                if parts[0] == "tgl" and len(parts) > 2:
+                    selection['selected'] ^= {parts[2]}
+            try:
+                orders, has_next = await get_orders_page(map_status_to_api(selection['status']), offset)
+            except Exception as e:
+                logger.exception(f"Error fetching orders for selection: {e}")
+                await q.edit_message_text(
+                    f"❌ Ошибка: {str(e)}",
+                    reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Назад", callback_data="orders")]])
+                )
+                return
+            if parts[0] == "tgp":
+                page_numbers = {o.get('orderNumber') for o in orders if o.get('orderNumber')}
+                if page_numbers <= selection['selected']:
+                    selection['selected'] -= page_numbers
+                else:
+                    selection['selected'] |= page_numbers
+            page_text = ""
+            if len(selection['selected']) > BULK_MAX_ORDERS:
+                selection['selected'] = set(sorted(selection['selected'])[:BULK_MAX_ORDERS])
+                page_text = f"\n\n⚠️ Не больше {BULK_MAX_ORDERS} заказов за раз"
+            page_text = format_bulk_page(selection, offset, orders) + page_text
+            await q.edit_message_text(
+                page_text,
+                parse_mode=ParseMode.HTML,
+                reply_markup=bulk_keyboard(selection, offset, orders, has_next)
+            )
+        elif data.startswith("bulk_"):
+            # Применить статус к выбранным заказам: bulk_<STATUS>
+            key = (q.message.chat_id, q.message.message_id)
+            selection = bulk_selections.pop(key)
+            target = map_status_to_api(data.split("_", 1)[1])
+            if not selection or not selection['selected']:
+                await q.edit_message_text(
+                    "⌛ Выбор устарел, откройте список заново",
+                    reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Назад", callback_data="orders")]])
+                )
+                return
+            source = map_status_to_api(selection['status'])
+            if target not in STATUSES.get(source, ('', '', []))[2]:
+                await q.edit_message_text(
+                    "❌ Недопустимый переход статуса",
+                    reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Назад", callback_data="orders")]])
+                )
+                return
+            
+            _, target_text, _ = STATUSES[target]
+            await q.edit_message_text(f"⏳ Меняю статус {len(selection['selected'])} заказов на «{target_text}»...")
+            results = await apply_bulk_status(sorted(selection['selected']), source, target)
+            await q.edit_message_text(
+                format_bulk_results(results, target),
+                parse_mode=ParseMode.HTML,
+                reply_markup=InlineKeyboardMarkup([
+                    [InlineKeyboardButton(f"{STATUSES[source][0]} {STATUSES[source][1]}", callback_data=f"ord_{selection['status']}"),
+                     InlineKeyboardButton(f"{STATUSES[target][0]} {target_text}", callback_data=f"ord_{target}")],
+                    [InlineKeyboardButton("◀️ Назад", callback_data="orders")]
+                ])
+            )
         elif data.startswith("det_"):
             # Показать детали заказа
-            # Формат: det_ORD-123 или det_ORD-123_ord_NEW (с контекстом возврата)
+            # Формат: det_ORD-123 или det_ORD-123_ord_NEW_20 (с контекстом возврата на страницу)
             parts = data.split("_")
             order_num = parts[1] if len(parts) > 1 else data.replace("det_", "")
             return_context = None
             
-            # Проверяем, есть ли контекст возврата (det_ORD-123_ord_NEW)
+            # Проверяем, есть ли контекст возврата (det_ORD-123_ord_NEW_20)
             if len(parts) >= 4 and parts[2] == "ord":
-                return_context = f"ord_{parts[3]}"
+                return_context = "_".join(parts[2:])
             
+            back_callback = return_context if return_context else "orders"
             try:
-                async with aiohttp.ClientSession() as session:
-                    api_key = os.getenv('BOT_API_KEY') or os.getenv('JWT_SECRET', '')
-                    headers = {
-                        'X-Bot-API-Key': api_key,
-                        'Content-Type': 'application/json',
-                    }
-                    url = f"{API_URL}/bots/orders/number/{order_num}"
-                    
+                order = order_details_cache.get(order_num)
+                if order is None and mirror_ready():
+                    order = await order_mirror.get(order_num)
+                    if order is not None:
+                        order_details_cache.set(order_num, order)
+                if order is None:
                     logger.info(f"Fetching order details for {order_num}")
-                    logger.debug(f"API key: {api_key[:10]}...{api_key[-5:] if len(api_key) > 15 else '***'}")
+                    resp = await api_client.get(f"/bots/orders/number/{order_num}")
+                    response_text = resp.text
+                    logger.info(f"API response status: {resp.status}")
                     
-                    async with session.get(url, headers=headers) as resp:
-                        response_text = await resp.text()
-                        logger.info(f"API response status: {resp.status}")
+                    if resp.status != 200:
+                        logger.error(f"API error: {resp.status} - {response_text[:500]}")
                         
-                        if resp.status == 200:
-                            order = await resp.json()
-                            
-                            # Формируем список товаров с безопасным преобразованием типов
-                            items_text = ""
-                            for item in order.get('items', []):
-                                product_name = item.get('productName', 'N/A')
-                                variant_name = item.get('variantName', '') or ''
-                                quantity = item.get('quantity', 0)
-                                
-                                # Конвертируем price в float (может быть строкой из Decimal)
-                                try:
-                                    price = float(item.get('price', 0))
-                                except (ValueError, TypeError):
-                                    price = 0.0
-                                
-                                variant_str = f" ({variant_name})" if variant_name else ""
-                                items_text += f"  • {product_name}{variant_str} - {quantity} шт. × {price:,.0f} ₽\n"
-                            
-                            if not items_text:
-                                items_text = "  (нет товаров)"
-                            
-                            # Нормализуем статус для отображения (PENDING -> NEW для UI)
-                            order_status = order.get('status', 'PENDING')
-                            if order_status == 'PENDING':
-                                status_emoji, status_text, _ = STATUSES.get('NEW', STATUSES['PENDING'])
-                            else:
-                                status_emoji, status_text, _ = STATUSES.get(order_status, ('📋', order_status, []))
-                            
-                            # Конвертируем total в float (может быть строкой из Decimal)
-                            try:
-                                total = float(order.get('total', 0))
-                            except (ValueError, TypeError):
-                                total = 0.0
-                            
-                            customer_email = order.get('customerEmail', '') or ''
-                            customer_address = order.get('customerAddress', '') or ''
-                            comment = order.get('comment', '') or ''
-                            
-                            msg = f"""📦 <b>Заказ #{order.get('orderNumber', 'N/A')}</b>
-
-👤 <b>Клиент:</b>
-{order.get('customerName', 'N/A')}
-📱 {order.get('customerPhone', 'N/A')}
-{f"📧 {customer_email}" if customer_email else ''}
-{f"📍 {customer_address}" if customer_address else ''}
-
-📦 <b>Товары:</b>
-{items_text.strip()}
-
-💰 <b>Сумма:</b> {total:,.0f} ₽
-
-📊 <b>Статус:</b> {status_emoji} {status_text}
-💳 <b>Оплата:</b> {'✅ Оплачен' if order.get('paymentStatus') == 'PAID' else '⏳ Не оплачен'}
-
-{f"💬 <b>Комментарий:</b> {comment}" if comment else ''}
-                            """.strip()
-                            
-                            # Определяем callback для кнопки "Назад"
-                            back_callback = return_context if return_context else "orders"
-                            
-                            await q.edit_message_text(
-                                msg,
-                                parse_mode=ParseMode.HTML,
-                                reply_markup=InlineKeyboardMarkup([
-                                    [InlineKeyboardButton("◀️ Назад", callback_data=back_callback)]
-                                ])
-                            )
+                        # Формируем понятное сообщение об ошибке
+                        if resp.status == 401:
+                            error_msg = "❌ Ошибка авторизации API. Проверьте BOT_API_KEY или JWT_SECRET."
+                        elif resp.status == 404:
+                            error_msg = f"❌ Заказ #{order_num} не найден."
+                        elif resp.status == 500:
+                            error_msg = f"❌ Ошибка сервера (500). Проверьте логи API.\n\n{response_text[:150]}"
                         else:
-                            logger.error(f"API error: {resp.status} - {response_text[:500]}")
-                            
-                            # Формируем понятное сообщение об ошибке
-                            if resp.status == 401:
-                                error_msg = "❌ Ошибка авторизации API. Проверьте BOT_API_KEY или JWT_SECRET."
-                            elif resp.status == 404:
-                                error_msg = f"❌ Заказ #{order_num} не найден."
-                            elif resp.status == 500:
-                                error_msg = f"❌ Ошибка сервера (500). Проверьте логи API.\n\n{response_text[:150]}"
-                            else:
-                                error_msg = f"❌ Ошибка {resp.status}: {response_text[:150]}"
-                            
-                            back_callback = return_context if return_context else "orders"
-                            await q.edit_message_text(
-                                error_msg,
-                                parse_mode=ParseMode.HTML,
-                                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Назад", callback_data=back_callback)]])
-                            )
+                            error_msg = f"❌ Ошибка {resp.status}: {response_text[:150]}"
+                        
+                        await q.edit_message_text(
+                            error_msg,
+                            parse_mode=ParseMode.HTML,
+                            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Назад", callback_data=back_callback)]])
+                        )
+                        return
+                    
+                    order = resp.json()
+                    order_details_cache.set(order_num, order)
+                
+                await q.edit_message_text(
+                    format_order_details(order),
+                    parse_mode=ParseMode.HTML,
+                    reply_markup=InlineKeyboardMarkup([
+                        [InlineKeyboardButton("◀️ Назад", callback_data=back_callback)]
+                    ])
+                )
             except Exception as e:
                 logger.exception(f"Error fetching order details: {e}")
-                back_callback = return_context if return_context else "orders"
                 await q.edit_message_text(
                     f"❌ Ошибка: {str(e)}",
                     parse_mode=ParseMode.HTML,
@@ -641,23 +969,144 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.exception(f"Error in callback handler: {e}")
         await q.answer(f"❌ Ошибка: {str(e)}", show_alert=True)
 
+async def send_status_patch(order_num: str, api_status: str) -> Optional[dict]:
+    """PATCH статуса заказа в API (не 200 -> ApiStatusError)"""
+    resp = await api_client.patch(f"/bots/orders/number/{order_num}/status", json={"status": api_status})
+    if resp.status != 200:
+        raise ApiStatusError(resp.status, resp.text)
+    order_data = resp.json()
+    return order_data if isinstance(order_data, dict) and order_data.get('orderNumber') == order_num else None
+
+async def _answer_status_tap(q, text: str, alert: bool) -> None:
+    """Ответ на нажатие; если callback уже устарел - ошибку пишем сообщением"""
+    try:
+        await q.answer(text, show_alert=alert)
+    except TelegramError as e:
+        logger.warning(f"Callback answer failed: {e}")
+        if alert and q.message:
+            await q.message.reply_text(text)
+
+async def finish_status_change(change: StatusChange, order_data: Optional[dict], error: Optional[Exception]) -> None:
+    """Результат фонового PATCH: обновить кэши или откатить клавиатуру"""
+    order_num = change.order_number
+    if error is None:
+        invalidate_orders_pages()
+        if order_data is not None:
+            order_details_cache.set(order_num, order_data)
+            if order_mirror:
+                await order_mirror.upsert(order_data)
+        else:
+            update_cached_order(order_num, status=change.status)
+        update_search(lambda index: index.update_status(order_num, change.status))
+        _, text, _ = STATUSES.get(change.status, ('📋', change.status, []))
+        for q in change.waiters:
+            await _answer_status_tap(q, f"✅ Статус изменён на: {text}", alert=False)
+        return
+
+    if isinstance(error, ApiStatusError):
+        logger.error(f"API error updating status of {order_num}: {error.status} - {error.text}")
+        error_text = f"❌ Статус #{order_num} не изменён: ошибка {error.status}"
+    else:
+        logger.error(f"Error updating status of {order_num}: {error}")
+        error_text = f"❌ Статус #{order_num} не изменён: {error}"
+    if change.waiters:
+        q = change.waiters[0]
+        rollback = change.rollback
+        if rollback is None:
+            # Inline-сообщение: прежней клавиатуры нет, восстанавливаем по последнему известному статусу
+            doc = order_search.docs.get(order_num)
+            rollback = order_keyboard(order_num, doc.status) if doc else None
+        if rollback is not None:
+            try:
+                await q.edit_message_reply_markup(reply_markup=rollback)
+            except TelegramError as e:
+                logger.warning(f"Keyboard rollback failed for {order_num}: {e}")
+    for q in change.waiters:
+        await _answer_status_tap(q, error_text, alert=True)
+
+# Смена статусов из бота: отправка в фоне, повторные нажатия по заказу схлопываются
+status_patches = StatusPatchQueue(send_status_patch, finish_status_change, name='status-patch')
+
+# Доступность чатов админов: chat_id -> True/False (нет записи - ещё не проверяли)
+# Недоступным (бот заблокирован / чат не найден) уведомления не шлём до успешной перепроверки
+admin_chat_reachable: dict = {}
+_admin_chat_checks: dict = {}
+
+async def check_admin_chat(chat_id: int) -> None:
+    """Проверить, может ли бот писать админу (get_chat)"""
+    try:
+        await get_bot().get_chat(chat_id=chat_id)
+        if admin_chat_reachable.get(chat_id) is False:
+            logger.info(f"✅ Admin {chat_id} is reachable again")
+        admin_chat_reachable[chat_id] = True
+    except (Forbidden, BadRequest) as e:
+        if admin_chat_reachable.get(chat_id) is not False:
+            logger.error(f"❌ Admin {chat_id} unreachable: {e}. User MUST send /start to the bot first!")
+        admin_chat_reachable[chat_id] = False
+    except TelegramError as e:
+        # Сетевая ошибка - состояние не меняем
+        logger.warning(f"⚠️ Chat check for admin {chat_id} failed: {e}")
+
+def invalidate_admin_chat(chat_id: int) -> None:
+    """Отправка вернула Forbidden/BadRequest: исключаем чат до перепроверки в фоне"""
+    admin_chat_reachable[chat_id] = False
+    task = _admin_chat_checks.get(chat_id)
+    if task is None or task.done():
+        _admin_chat_checks[chat_id] = asyncio.create_task(check_admin_chat(chat_id))
+
+async def admin_chat_check_loop():
+    """Периодическая перепроверка чатов всех админов"""
+    while True:
+        admin_ids = get_admin_ids()
+        semaphore = asyncio.Semaphore(ADMIN_SEND_CONCURRENCY)
+
+        async def _check(chat_id: int):
+            async with semaphore:
+                await check_admin_chat(chat_id)
+
+        await asyncio.gather(*(_check(chat_id) for chat_id in admin_ids), return_exceptions=True)
+        await asyncio.sleep(ADMIN_CHAT_CHECK_MINUTES * 60)
+
+async def send_to_admins(admin_ids: list, send) -> tuple:
+    """
+    Параллельная рассылка админам (не больше ADMIN_SEND_CONCURRENCY одновременно).
+    send(chat_id) - корутина отправки. Возвращает (sent, failed, skipped);
+    если никому не отправлено из-за сети / таймаута - NetworkError (outbox повторит)
+    """
+    semaphore = asyncio.Semaphore(ADMIN_SEND_CONCURRENCY)
+
+    async def _send(admin_id: int):
+        if admin_chat_reachable.get(admin_id) is False:
+            return None
+        async with semaphore:
+            try:
+                await send(admin_id)
+                admin_chat_reachable[admin_id] = True
+                return True
+            except (Forbidden, BadRequest) as e:
+                logger.error(f"❌ Admin {admin_id}: {e}")
+                invalidate_admin_chat(admin_id)
+            except TelegramError as e:
+                logger.error(f"❌ Admin {admin_id}: Telegram error: {e}")
+                if is_transient_error(e):
+                    return e
+            except Exception as e:
+                logger.exception(f"❌ Admin {admin_id}: Unexpected error: {e}")
+            return False
+
+    results = await asyncio.gather(*(_send(admin_id) for admin_id in admin_ids))
+    transient = [r for r in results if isinstance(r, Exception)]
+    sent = results.count(True)
+    if transient and not sent:
+        raise transient[0]
+    return sent, results.count(False) + len(transient), results.count(None)
+
 # Notifications
 async def send_order_notification(data: OrderNotification) -> bool:
     """Отправить уведомление о новом заказе ВСЕМ админам из ADMIN_WHITELIST"""
-    logger.info("=" * 60)
-    logger.info(f"🔄 Processing order notification for #{data.orderNumber}")
-    logger.info(f"   Order ID: {data.orderId}")
-    logger.info(f"   Customer: {data.customerName} ({data.customerPhone})")
-    logger.info(f"   Total: {data.total:,.0f} ₽")
-    
-    # Получаем список админов (с логированием внутри функции)
-    logger.info("📋 Getting admin IDs from get_admin_ids()...")
+    logger.info(f"🔄 Processing order notification for #{data.orderNumber} ({data.total:,.0f} ₽)")
     admin_ids = get_admin_ids()
     
-    logger.info(f"📋 Admin IDs to notify (final): {admin_ids} (count: {len(admin_ids)})")
-    logger.info(f"   Types: {[type(id).__name__ for id in admin_ids]}")
-    logger.info(f"   Values: {[repr(id) for id in admin_ids]}")
-    
     if not admin_ids:
         logger.error("❌ No admin IDs configured - cannot send notification")
         logger.error("   Set ADMIN_WHITELIST or ADMIN_CHAT_ID in environment")
@@ -667,15 +1116,8 @@ async def send_order_notification(data: OrderNotification) -> bool:
         logger.error("❌ BOT_TOKEN not set - cannot send notification")
         return False
     
-    logger.info(f"🔑 BOT_TOKEN: {BOT_TOKEN[:10]}...{BOT_TOKEN[-5:]} (length: {len(BOT_TOKEN)})")
-    
     try:
         bot = get_bot()
-        if not bot:
-            logger.error("❌ Bot not initialized")
-            return False
-        
-        logger.info(f"🤖 Bot initialized: {bot.username if hasattr(bot, 'username') else 'N/A'} (ID: {bot.id if hasattr(bot, 'id') else 'N/A'})")
         
         msg = f"""
 🆕 <b>НОВЫЙ ЗАКАЗ!</b>
@@ -695,86 +1137,39 @@ async def send_order_notification(data: OrderNotification) -> bool:
 
 ⚡️ Требуется обработка!
         """.strip()
+        # NEW для UI, маппится в PENDING в API
+        keyboard = order_keyboard(data.orderNumber, 'NEW')
         
-        # Отправляем уведомление КАЖДОМУ админу
-        success_count = 0
-        failed_count = 0
+        async def _send(admin_id: int):
+            sent = await bot.send_message(
+                chat_id=admin_id, text=msg, parse_mode=ParseMode.HTML, reply_markup=keyboard
+            )
+            await message_map.put(admin_id, data.orderNumber, sent.message_id, msg)
         
-        for admin_id in admin_ids:
-            try:
-                # Убеждаемся, что admin_id - это int (не строка)
-                if isinstance(admin_id, str):
-                    try:
-                        admin_id = int(admin_id)
-                        logger.warning(f"⚠️ Converted admin_id from string to int: {admin_id}")
-                    except ValueError:
-                        logger.error(f"❌ Admin ID '{admin_id}' is not a valid integer!")
-                        failed_count += 1
-                        continue
-                
-                logger.info(f"📤 Attempting to send notification to admin {admin_id} (type: {type(admin_id).__name__}, value: {repr(admin_id)})")
-                
-                # Проверяем, может ли бот писать пользователю (получаем информацию о чате)
-                try:
-                    chat = await bot.get_chat(chat_id=admin_id)
-                    logger.info(f"✅ Chat info retrieved for {admin_id}: type={chat.type if hasattr(chat, 'type') else 'user'}, id={chat.id if hasattr(chat, 'id') else 'N/A'}")
-                except Forbidden as e:
-                    logger.error(f"❌ Admin {admin_id}: Bot is blocked or user hasn't started the bot. Error: {e}")
-                    logger.error(f"   💡 User {admin_id} MUST send /start to the bot first!")
-                    failed_count += 1
-                    continue
-                except BadRequest as e:
-                    error_msg = str(e)
-                    logger.error(f"❌ Admin {admin_id}: BadRequest error: {error_msg}")
-                    if "chat not found" in error_msg.lower():
-                        logger.error(f"   💡 Chat not found - user {admin_id} may not have started the bot or ID is incorrect")
-                        logger.error(f"   💡 Try: User should send /start to the bot first")
-                    failed_count += 1
-                    continue
-                
-                # Отправляем сообщение (используем 'NEW' для UI, но API будет использовать PENDING)
-                logger.info(f"📨 Sending message to chat_id={admin_id} (type: {type(admin_id).__name__})")
-                await bot.send_message(
-                    chat_id=admin_id, 
-                    text=msg, 
-                    parse_mode=ParseMode.HTML,
-                    reply_markup=order_keyboard(data.orderNumber, 'NEW')  # NEW для UI, маппится в PENDING в API
-                )
-                logger.info(f"✅ Notification sent successfully to admin {admin_id}")
-                success_count += 1
-                
-            except Forbidden as e:
-                logger.error(f"❌ Admin {admin_id}: Bot blocked or user hasn't started the bot. Error: {e}")
-                logger.error(f"   💡 User {admin_id} MUST send /start to the bot first!")
-                failed_count += 1
-            except BadRequest as e:
-                error_msg = str(e)
-                if "chat not found" in error_msg.lower():
-                    logger.error(f"❌ Admin {admin_id}: Chat not found - user hasn't started the bot!")
-                    logger.error(f"   💡 User {admin_id} MUST send /start to the bot first!")
-                else:
-                    logger.error(f"❌ Admin {admin_id}: Bad request: {e}")
-                failed_count += 1
-            except TelegramError as e:
-                logger.error(f"❌ Admin {admin_id}: Telegram error: {e}")
-                failed_count += 1
-            except Exception as e:
-                logger.exception(f"❌ Admin {admin_id}: Unexpected error: {e}")
-                failed_count += 1
+        # Отправляем уведомление всем админам параллельно
+        success_count, failed_count, skipped_count = await send_to_admins(admin_ids, _send)
         
-        logger.info(f"📊 Notification results for #{data.orderNumber}: {success_count} sent, {failed_count} failed out of {len(admin_ids)} total")
+        logger.info(
+            f"📊 Notification results for #{data.orderNumber}: {success_count} sent, {failed_count} failed, "
+            f"{skipped_count} skipped (unreachable) out of {len(admin_ids)} total"
+        )
         
-        if failed_count > 0:
-            logger.warning(f"⚠️  {failed_count} admin(s) didn't receive notification. They must send /start to the bot first!")
+        if failed_count or skipped_count:
+            logger.warning(f"⚠️  {failed_count + skipped_count} admin(s) didn't receive notification. They must send /start to the bot first!")
         
         return success_count > 0
         
     except Exception as e:
+        if is_transient_error(e):
+            raise
         logger.exception(f"❌ Unexpected error sending notifications: {e}")
         return False
 
 async def send_status_notification(data: StatusNotification) -> bool:
-    """Отправить уведомление об изменении статуса заказа ВСЕМ админам"""
+    """
+    Изменение статуса заказа: карточка заказа у КАЖДОГО админа редактируется,
+    отдельное сообщение - только для статусов из ADMIN_STATUS_NEW_MESSAGE_ON и оплаты
+    """
     admin_ids = get_admin_ids()
     
     if not admin_ids:
@@ -787,30 +1182,153 @@ async def send_status_notification(data: StatusNotification) -> bool:
     
     try:
         bot = get_bot()
-        if not bot:
-            logger.error("❌ Bot not initialized")
-            return False
         
-        e1, t1, _ = STATUSES.get(data.oldStatus.upper() if data.oldStatus else 'NEW', ('📋', '?', []))
-        e2, t2, _ = STATUSES.get(data.status.upper(), ('📋', data.status, []))
-        msg = f"🔄 <b>Статус изменён</b>\n\n#{data.orderNumber}\n{e1} {t1} → {e2} {t2}"
+        field_name, old_value, new_value = parse_status_change(data.status, data.oldStatus)
+        if field_name == 'paymentStatus':
+            change = f"💳 Оплата: {old_value or '?'} → {new_value}"
+            important = True
+        else:
+            e1, t1, _ = STATUSES.get(old_value or 'NEW', ('📋', '?', []))
+            e2, t2, _ = STATUSES.get(new_value, ('📋', new_value, []))
+            change = f"{e1} {t1} → {e2} {t2}"
+            important = new_value in STATUS_NEW_MESSAGE_ON
+        msg = f"🔄 <b>Статус изменён</b>\n\n#{data.orderNumber}\n{change}"
         
-        success_count = 0
-        for admin_id in admin_ids:
-            try:
+        async def _notify(admin_id: int):
+            ref = await message_map.get(admin_id, data.orderNumber) if field_name == 'status' else None
+            if ref:
+                try:
+                    await bot.edit_message_text(
+                        chat_id=admin_id,
+                        message_id=ref.message_id,
+                        text=f"{ref.text}\n\n📊 <b>Статус:</b> {e2} {t2}",
+                        parse_mode=ParseMode.HTML,
+                        reply_markup=order_keyboard(data.orderNumber, new_value)
+                    )
+                except BadRequest as e:
+                    if 'not modified' not in str(e).lower():
+                        # Карточка удалена / недоступна - сообщаем отдельным сообщением
+                        logger.info(f"Cannot edit order card #{data.orderNumber} for admin {admin_id}: {e}")
+                        ref = None
+            if important or not ref:
                 await bot.send_message(chat_id=admin_id, text=msg, parse_mode=ParseMode.HTML)
-                logger.info(f"✅ Status notification sent to admin {admin_id}")
-                success_count += 1
-            except (Forbidden, BadRequest) as e:
-                logger.error(f"❌ Admin {admin_id}: Cannot send status notification - {e}")
-            except TelegramError as e:
-                logger.error(f"❌ Admin {admin_id}: Telegram error: {e}")
+        
+        success_count, _, _ = await send_to_admins(admin_ids, _notify)
+        logger.info(f"✅ Status change for #{data.orderNumber} delivered to {success_count}/{len(admin_ids)} admins")
         
         return success_count > 0
     except Exception as e:
+        if is_transient_error(e):
+            raise
         logger.exception(f"❌ Unexpected error sending status notification: {e}")
         return False
 
+async def send_order_digest(orders: list) -> bool:
+    """Одно сводное сообщение о нескольких новых заказах ВСЕМ админам"""
+    admin_ids = get_admin_ids()
+    if not admin_ids or not BOT_TOKEN:
+        logger.error("❌ No admin IDs or BOT_TOKEN - cannot send order digest")
+        return False
+    
+    bot = get_bot()
+    total_sum = sum(o.total for o in orders)
+    lines = [f"• <b>#{o.orderNumber}</b> - {o.customerName[:30]} - {o.total:,.0f} ₽" for o in orders]
+    msg = (
+        f"🆕 <b>НОВЫЕ ЗАКАЗЫ: {len(orders)}</b>\n\n"
+        + "\n".join(lines)
+        + f"\n\n💰 <b>Сумма:</b> {total_sum:,.0f} ₽\n\n⚡️ Требуется обработка!"
+    )
+    # Кнопка "Детали" для каждого заказа, по две в ряд
+    btns = [InlineKeyboardButton(f"📋 #{o.orderNumber}", callback_data=f"det_{o.orderNumber}") for o in orders]
+    keyboard = InlineKeyboardMarkup([btns[i:i+2] for i in range(0, len(btns), 2)])
+    
+    success_count, failed_count, skipped_count = await send_to_admins(
+        admin_ids,
+        lambda admin_id: bot.send_message(
+            chat_id=admin_id, text=msg, parse_mode=ParseMode.HTML, reply_markup=keyboard
+        )
+    )
+    logger.info(
+        f"📚 Order digest ({len(orders)} orders): {success_count} sent, {failed_count} failed, "
+        f"{skipped_count} skipped out of {len(admin_ids)} admins"
+    )
+    return success_count > 0
+
+async def flush_order_digest(items: list) -> None:
+    """Отправить накопленный дайджест и отметить записи outbox"""
+    status = STATUS_FAILED
+    try:
+        ok = await send_order_digest([data for _, data in items])
+        status = STATUS_SENT if ok else STATUS_FAILED
+    except Exception as e:
+        if is_transient_error(e):
+            # Сеть - записи остаются pending, повтор по таймеру outbox
+            status = STATUS_PENDING
+        raise
+    finally:
+        for outbox_id, _ in items:
+            outbox.mark(outbox_id, status)
+
+# Всплески заказов (акции): вместо сообщения на каждый заказ - сводка раз в окно
+order_digest = DigestBuffer(
+    flush_order_digest,
+    threshold_per_minute=DIGEST_THRESHOLD_PER_MINUTE,
+    window_seconds=DIGEST_WINDOW_SECONDS,
+    max_items=DIGEST_MAX_ORDERS,
+    name='orders',
+)
+
+async def notify_new_order(outbox_id: Optional[int], data: OrderNotification) -> None:
+    """Новый заказ: отдельное сообщение, а при всплеске - в дайджест"""
+    if order_digest.offer((outbox_id, data)):
+        return
+    await deliver_notification(outbox_id, send_order_notification, data)
+
+async def deliver_notification(outbox_id: Optional[int], send_func, data) -> None:
+    """Отправка из фоновой задачи: результат уже отмечен в outbox (pending - будет повтор)"""
+    try:
+        await outbox.deliver(outbox_id, send_func, data)
+    except Exception as e:
+        logger.warning(f"Notification (outbox {outbox_id}) not delivered: {e}")
+
+# Типы уведомлений в outbox: модель payload и функция отправки
+NOTIFICATION_HANDLERS = {
+    'admin': (OrderNotification, send_order_notification),
+    'status': (StatusNotification, send_status_notification),
+}
+
+async def replay_outbox():
+    """Переотправить уведомления, не подтверждённые до рестарта (at-least-once)"""
+    entries = await outbox.pending()
+    if not entries:
+        return
+    logger.info(f"🔁 Replaying {len(entries)} pending notifications from outbox")
+    for entry in entries:
+        handler = NOTIFICATION_HANDLERS.get(entry.kind)
+        if not handler:
+            logger.warning(f"Unknown outbox entry kind '{entry.kind}' (id={entry.id})")
+            continue
+        model, send_func = handler
+        try:
+            data = model(**entry.payload)
+        except ValidationError as e:
+            logger.error(f"Invalid outbox entry {entry.id}: {e}")
+            outbox.mark(entry.id, STATUS_FAILED)
+            continue
+        if entry.kind == 'admin':
+            await notify_new_order(entry.id, data)
+        else:
+            await deliver_notification(entry.id, send_func, data)
+
+async def outbox_retry_loop():
+    """Повтор уведомлений, оставшихся pending после сетевых ошибок"""
+    while True:
+        await asyncio.sleep(OUTBOX_RETRY_SECONDS)
+        try:
+            await replay_outbox()
+        except Exception as e:
+            logger.error(f"Outbox retry failed: {e}")
+
 # Error Handler
 async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Глобальный обработчик ошибок"""
@@ -829,29 +1347,81 @@ async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> N
 async def lifespan(app: FastAPI):
     global application
     logger.info("🚀 Starting Admin Bot...")
+    await outbox.open()
+    message_map.open()
+    if order_mirror:
+        order_mirror.open()
+    snapshot = load_snapshot(STATS_SNAPSHOT_PATH)
+    if snapshot:
+        # Снапшот отдаём сразу (как устаревшие данные), сверка запустится в фоне
+        stats_cache.set(*snapshot)
+        stats_cache.invalidate()
     if BOT_TOKEN:
         application = Application.builder().token(BOT_TOKEN).build()
         application.add_handler(CommandHandler("start", start_cmd))
+        application.add_handler(CommandHandler("export", export_cmd))
         application.add_handler(CallbackQueryHandler(callback_handler))
+        application.add_handler(InlineQueryHandler(inline_query_handler))
         application.add_error_handler(error_handler)
         await application.initialize()
         await application.start()
+        await update_queue.start(application)
         if USE_WEBHOOK and WEBHOOK_URL:
             await application.bot.set_webhook(f"{WEBHOOK_URL}/webhook")
         else:
             await application.updater.start_polling(drop_pending_updates=True)
+    replay_task = asyncio.create_task(replay_outbox())
+    loop_tasks = [asyncio.create_task(stats_reconcile_loop()), asyncio.create_task(outbox_retry_loop())]
+    if BOT_TOKEN:
+        loop_tasks.append(asyncio.create_task(admin_chat_check_loop()))
+    if ADMIN_CONFIG_FILE:
+        loop_tasks.append(asyncio.create_task(admin_config_watch_loop()))
+    if order_mirror:
+        loop_tasks.append(asyncio.create_task(order_mirror_sync_loop()))
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, reload_admin_registry)
+    except (NotImplementedError, AttributeError, RuntimeError):
+        pass  # Windows / не главный поток: SIGHUP недоступен
     yield
+    if _export_task and not _export_task.done():
+        loop_tasks.append(_export_task)
+    for task in loop_tasks:
+        task.cancel()
+    await asyncio.gather(replay_task, *loop_tasks, return_exceptions=True)
+    await order_digest.stop()
     if application:
         if not USE_WEBHOOK:
             await application.updater.stop()
+        # Сначала дорабатывают апдейты (нажатия ставят PATCH в очередь), затем - сами PATCH
+        await update_queue.stop()
+    await status_patches.stop()
+    if application:
         await application.stop()
         await application.shutdown()
+    await api_client.close()
+    await outbox.close()
+    message_map.close()
+    if order_mirror:
+        order_mirror.close()
 
 api = FastAPI(title="Admin Bot API", version="2.0.0", lifespan=lifespan)
 
 @api.get("/health")
 async def health():
-    return {"status": "ok", "bot": application is not None}
+    return {
+        "status": "ok",
+        "bot": application is not None,
+        "update_queue": update_queue.snapshot(),
+        "status_patches": status_patches.snapshot(),
+    }
+
+@api.get("/admins")
+async def admins():
+    """Диагностика: текущий реестр админов и доступность их чатов"""
+    return {
+        **admin_registry.snapshot(),
+        "reachable": {str(admin_id): admin_chat_reachable.get(admin_id) for admin_id in admin_registry.notify_ids},
+    }
 
 @api.post("/webhook")
 async def webhook(request: Request):
@@ -859,7 +1429,7 @@ async def webhook(request: Request):
         raise HTTPException(503, "Bot not ready")
     data = await request.json()
     update = Update.de_json(data, application.bot)
-    await application.process_update(update)
+    await update_queue.submit(update)
     return {"ok": True}
 
 @api.post("/notify/admin")
@@ -871,17 +1441,43 @@ async def notify_admin(data: OrderNotification, bg: BackgroundTasks):
     if not admin_ids:
         error_msg = "No valid admin IDs configured. Set ADMIN_WHITELIST or valid ADMIN_CHAT_ID"
         logger.error(f"❌ {error_msg}")
-        logger.error(f"   ADMIN_WHITELIST_RAW: '{ADMIN_WHITELIST_RAW}'")
-        logger.error(f"   ADMIN_CHAT_ID_RAW: '{ADMIN_CHAT_ID_RAW}'")
         raise HTTPException(status_code=500, detail=error_msg)
     
-    logger.info(f"📤 Queuing notification to {len(admin_ids)} admin(s): {admin_ids}")
-    bg.add_task(send_order_notification, data)
+    logger.info(f"📤 Queuing notification to {len(admin_ids)} admin(s)")
+    update_stats(lambda st: st.apply_new_order(data.orderNumber, data.total, data.createdAt))
+    invalidate_orders_pages('PENDING')
+    prefill = {
+        'orderNumber': data.orderNumber,
+        'customerName': data.customerName,
+        'customerPhone': data.customerPhone,
+        'customerEmail': data.customerEmail,
+        'customerAddress': data.customerAddress,
+        'comment': data.comment,
+        'itemsText': data.items,
+        'total': data.total,
+        'status': 'PENDING',
+        'createdAt': data.createdAt,
+    }
+    order_details_cache.set(data.orderNumber, prefill)
+    update_search(lambda index: index.add(prefill))
+    if order_mirror:
+        await order_mirror.add_new(dict(prefill))
+    outbox_id = await outbox.add('admin', data.model_dump())
+    bg.add_task(notify_new_order, outbox_id, data)
     return {"status": "queued", "orderNumber": data.orderNumber, "adminIds": admin_ids, "adminCount": len(admin_ids)}
 
 @api.post("/notify/status")
 async def notify_status(data: StatusNotification, bg: BackgroundTasks):
-    bg.add_task(send_status_notification, data)
+    update_stats(lambda st: st.apply_status_change(data.orderNumber, data.status, data.oldStatus))
+    invalidate_orders_pages()
+    field_name, _, new_value = parse_status_change(data.status, data.oldStatus)
+    update_cached_order(data.orderNumber, **{field_name: new_value})
+    if field_name == 'status':
+        update_search(lambda index: index.update_status(data.orderNumber, new_value))
+    if order_mirror:
+        await order_mirror.apply_change(data.orderNumber, field_name, new_value)
+    outbox_id = await outbox.add('status', data.model_dump())
+    bg.add_task(deliver_notification, outbox_id, send_status_notification, data)
     return {"status": "queued"}
 
 if __name__ == '__main__':
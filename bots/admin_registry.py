@@ -0,0 +1,108 @@
+"""
+Admin Registry - неизменяемый список админов для Admin Bot
+Функции:
+- Список разбирается и валидируется один раз (а не на каждое уведомление)
+- frozenset для проверки is_admin за O(1)
+- Перезагрузка из файла конфигурации (SIGHUP / изменение файла) атомарной заменой
+"""
+
+import os
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import FrozenSet, Optional, Tuple
+
+from dotenv import dotenv_values
+
+logger = logging.getLogger(__name__)
+
+# Игнорируем дефолтные значения (123456789 - это placeholder)
+DEFAULT_PLACEHOLDER_IDS = ['123456789', '123456', '0', '']
+
+
+@dataclass(frozen=True)
+class AdminRegistry:
+    # Кому слать уведомления: ADMIN_WHITELIST, а если он пуст - ADMIN_CHAT_ID
+    notify_ids: Tuple[int, ...]
+    # Кому разрешён доступ к боту: ADMIN_WHITELIST + ADMIN_CHAT_ID
+    members: FrozenSet[int]
+    source: str = 'env'
+    ignored: Tuple[str, ...] = ()
+    loaded_at: datetime = field(default_factory=datetime.now)
+
+    def is_admin(self, user_id: int) -> bool:
+        return user_id in self.members
+
+    def snapshot(self) -> dict:
+        """Состояние для /admins"""
+        return {
+            'notifyIds': list(self.notify_ids),
+            'members': sorted(self.members),
+            'source': self.source,
+            'ignored': list(self.ignored),
+            'loadedAt': self.loaded_at.isoformat(),
+        }
+
+
+def _parse_id(raw: str, ignored: list) -> Optional[int]:
+    raw = raw.strip()
+    if raw in DEFAULT_PLACEHOLDER_IDS:
+        if raw:
+            ignored.append(raw)
+        return None
+    try:
+        return int(raw)
+    except ValueError:
+        ignored.append(raw)
+        return None
+
+
+def build_registry(whitelist_raw: str, chat_id_raw: str, source: str = 'env') -> AdminRegistry:
+    """Разобрать ADMIN_WHITELIST / ADMIN_CHAT_ID (placeholder и невалидные id отбрасываются)"""
+    ignored: list = []
+    whitelist = []
+    for raw in (whitelist_raw or '').split(','):
+        admin_id = _parse_id(raw, ignored)
+        if admin_id is not None and admin_id not in whitelist:
+            whitelist.append(admin_id)
+    chat_id = _parse_id(chat_id_raw or '', ignored)
+
+    # ВАЖНО: ADMIN_WHITELIST имеет приоритет над ADMIN_CHAT_ID
+    notify_ids = tuple(whitelist) if whitelist else ((chat_id,) if chat_id is not None else ())
+    members = frozenset(whitelist + ([chat_id] if chat_id is not None else []))
+    return AdminRegistry(notify_ids=notify_ids, members=members, source=source, ignored=tuple(ignored))
+
+
+def load_registry(config_file: str = '') -> AdminRegistry:
+    """
+    Собрать реестр из окружения; значения из config_file (формат .env),
+    если он задан и существует, имеют приоритет
+    """
+    values = {
+        'ADMIN_WHITELIST': os.getenv('ADMIN_WHITELIST', ''),
+        'ADMIN_CHAT_ID': os.getenv('ADMIN_CHAT_ID') or os.getenv('TELEGRAM_MANAGER_CHAT_ID', ''),
+    }
+    source = 'env'
+    if config_file and os.path.exists(config_file):
+        file_values = dotenv_values(config_file)
+        for key in values:
+            if file_values.get(key) is not None:
+                values[key] = file_values[key]
+        source = config_file
+    registry = build_registry(values['ADMIN_WHITELIST'], values['ADMIN_CHAT_ID'], source)
+
+    if registry.notify_ids:
+        logger.info(f"✅ Admin registry ({source}): {len(registry.notify_ids)} admin(s) will receive notifications: {list(registry.notify_ids)}")
+    else:
+        logger.error(f"❌ CRITICAL: No valid admin IDs configured ({source})! Set ADMIN_WHITELIST or ADMIN_CHAT_ID")
+    if registry.ignored:
+        logger.warning(f"⚠️ Ignored admin IDs (placeholder or invalid): {list(registry.ignored)}")
+    return registry
+
+
+def config_mtime(config_file: str) -> Optional[float]:
+    """mtime файла конфигурации (None - файла нет)"""
+    try:
+        return os.stat(config_file).st_mtime if config_file else None
+    except OSError:
+        return None
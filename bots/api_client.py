@@ -0,0 +1,288 @@
+"""
+API Client - общий HTTP клиент ботов к бэкенд API
+Функции:
+- Одна aiohttp сессия на процесс (keep-alive пул соединений, DNS кэш)
+- Заголовки авторизации (X-Bot-API-Key) собираются один раз
+- Таймауты по эндпоинтам
+- Повторы с экспоненциальной задержкой и джиттером
+- Ограничение размера ответа
+"""
+
+import os
+import json
+import codecs
+import random
+import logging
+import asyncio
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# ============================================
+# Конфигурация
+# ============================================
+API_URL = os.getenv('API_URL', 'http://localhost:3000/api')
+API_POOL_SIZE = int(os.getenv('API_POOL_SIZE', '20'))
+API_TIMEOUT_SECONDS = float(os.getenv('API_TIMEOUT_SECONDS', '10'))
+API_MAX_RETRIES = int(os.getenv('API_MAX_RETRIES', '2'))
+API_MAX_RESPONSE_MB = float(os.getenv('API_MAX_RESPONSE_MB', '20'))
+
+# Таймауты (сек) по префиксу пути - тяжёлые выборки получают больше времени
+ENDPOINT_TIMEOUTS = {
+    '/bots/orders/number/': 10,
+    '/bots/orders': 30,
+    '/admin/abandoned-carts': 30,
+}
+
+# Статусы, при которых запрос имеет смысл повторить
+RETRY_STATUSES = {429, 502, 503, 504}
+
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 8
+
+
+class ResponseTooLarge(Exception):
+    """Ответ API превышает допустимый размер"""
+
+
+class ApiStatusError(Exception):
+    """API ответил не-2xx статусом (для потоковых запросов)"""
+
+    def __init__(self, status: int, text: str = ''):
+        super().__init__(f"API error {status}: {text[:200]}")
+        self.status = status
+        self.text = text
+
+
+class NotJsonArrayError(ValueError):
+    """Ответ - валидный JSON, но не массив (например, объект {...} от старой версии API)"""
+
+
+class JsonArrayDecoder:
+    """
+    Инкрементальный разбор JSON массива верхнего уровня: feed() отдаёт
+    элементы по мере получения, не дожидаясь конца ответа.
+    Последний вызов (final=True) проверяет, что массив закрыт - оборванный ответ -> ValueError.
+    """
+
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._buf = ''
+        self._started = False
+        self.finished = False
+
+    def feed(self, text: str, final: bool = False) -> List[Any]:
+        self._buf += text
+        items = []
+        buf = self._buf
+        pos = 0
+        length = len(buf)
+        while pos < length and not self.finished:
+            ch = buf[pos]
+            if ch.isspace() or (self._started and ch == ','):
+                pos += 1
+                continue
+            if not self._started:
+                if ch != '[':
+                    raise NotJsonArrayError(f"Expected JSON array, got '{ch}'")
+                self._started = True
+                pos += 1
+                continue
+            if ch == ']':
+                self.finished = True
+                pos += 1
+                break
+            try:
+                item, end = self._decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if final:
+                    raise
+                break  # элемент пришёл не полностью - ждём следующий чанк
+            if not final and (end == length or (
+                isinstance(item, (int, float)) and buf[end] not in ' \t\r\n,]'
+            )):
+                break  # число на границе чанка может быть не дочитано ("1" из "1.5")
+            items.append(item)
+            pos = end
+        self._buf = buf[pos:]
+        if final:
+            # Ответ оборвался (пустое тело, обрыв между элементами) или после ']' есть мусор
+            if not self._started:
+                raise ValueError("Truncated JSON array: empty response")
+            if not self.finished:
+                raise ValueError("Truncated JSON array: missing ']'")
+            if self._buf.strip():
+                raise ValueError(f"Unexpected data after JSON array: '{self._buf.strip()[:20]}'")
+        return items
+
+
+@dataclass
+class ApiResponse:
+    status: int
+    text: str
+    content_type: str = ''
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status < 300
+
+    def json(self) -> Any:
+        """Разобрать тело как JSON (пустое тело -> None)"""
+        return json.loads(self.text) if self.text else None
+
+
+class ApiClient:
+    """HTTP клиент с пулом соединений, ретраями и лимитами"""
+
+    def __init__(
+        self,
+        base_url: str = API_URL,
+        api_key: Optional[str] = None,
+        pool_size: int = API_POOL_SIZE,
+        timeout: float = API_TIMEOUT_SECONDS,
+        max_retries: int = API_MAX_RETRIES,
+        max_response_bytes: int = int(API_MAX_RESPONSE_MB * 1024 * 1024),
+    ):
+        self.base_url = base_url.rstrip('/')
+        if api_key is None:
+            api_key = os.getenv('BOT_API_KEY') or os.getenv('JWT_SECRET', '')
+        self.headers = {
+            'X-Bot-API-Key': api_key,
+            'Content-Type': 'application/json',
+        }
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.max_response_bytes = max_response_bytes
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    # ----------------------------------------
+    # Lifecycle
+    # ----------------------------------------
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """Сессия создаётся лениво (нужен запущенный event loop)"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                ttl_dns_cache=300,
+                keepalive_timeout=30,
+            )
+            self._session = aiohttp.ClientSession(connector=connector, headers=self.headers)
+        return self._session
+
+    async def close(self) -> None:
+        """Закрыть сессию (вызывается из lifespan)"""
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    # ----------------------------------------
+    # Public API
+    # ----------------------------------------
+    async def get(self, path: str, **kwargs) -> ApiResponse:
+        return await self.request('GET', path, **kwargs)
+
+    async def post(self, path: str, **kwargs) -> ApiResponse:
+        # POST не идемпотентен - по умолчанию без повторов
+        kwargs.setdefault('retries', 0)
+        return await self.request('POST', path, **kwargs)
+
+    async def patch(self, path: str, **kwargs) -> ApiResponse:
+        return await self.request('PATCH', path, **kwargs)
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        *,
+        json: Any = None,
+        params: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None,
+        retries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+    ) -> ApiResponse:
+        """
+        Выполнить запрос. path - путь относительно API_URL или абсолютный URL.
+        Сетевые ошибки после всех попыток пробрасываются (aiohttp.ClientError / asyncio.TimeoutError).
+        """
+        url = path if path.startswith(('http://', 'https://')) else f"{self.base_url}{path}"
+        retries = self.max_retries if retries is None else retries
+        client_timeout = aiohttp.ClientTimeout(total=timeout or self._timeout_for(path))
+        limit = max_bytes or self.max_response_bytes
+
+        attempt = 0
+        while True:
+            try:
+                async with self.session.request(
+                    method, url, json=json, params=params, timeout=client_timeout
+                ) as resp:
+                    response = ApiResponse(
+                        status=resp.status,
+                        text=await self._read_limited(resp, limit),
+                        content_type=resp.headers.get('content-type', ''),
+                    )
+                if response.status not in RETRY_STATUSES or attempt >= retries:
+                    return response
+                logger.warning(f"API {method} {path}: {response.status}, retrying ({attempt + 1}/{retries})")
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt >= retries:
+                    raise
+                logger.warning(f"API {method} {path}: {type(e).__name__}, retrying ({attempt + 1}/{retries})")
+            await asyncio.sleep(self._backoff(attempt))
+            attempt += 1
+
+    async def iter_array(
+        self,
+        path: str,
+        *,
+        params: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None,
+    ) -> AsyncIterator[Any]:
+        """
+        Потоковый GET для ответов-массивов: элементы отдаются по мере чтения,
+        весь ответ в памяти не держим. Без повторов (поток нельзя переиграть).
+        Не-2xx статус -> ApiStatusError.
+        """
+        url = path if path.startswith(('http://', 'https://')) else f"{self.base_url}{path}"
+        client_timeout = aiohttp.ClientTimeout(total=timeout or self._timeout_for(path))
+        async with self.session.get(url, params=params, timeout=client_timeout) as resp:
+            if not 200 <= resp.status < 300:
+                raise ApiStatusError(resp.status, await self._read_limited(resp, 64 * 1024))
+            text_decoder = codecs.getincrementaldecoder(resp.charset or 'utf-8')(errors='replace')
+            array_decoder = JsonArrayDecoder()
+            async for chunk in resp.content.iter_chunked(64 * 1024):
+                for item in array_decoder.feed(text_decoder.decode(chunk)):
+                    yield item
+            for item in array_decoder.feed(text_decoder.decode(b'', final=True), final=True):
+                yield item
+
+    # ----------------------------------------
+    # Internals
+    # ----------------------------------------
+    def _timeout_for(self, path: str) -> float:
+        for prefix, seconds in ENDPOINT_TIMEOUTS.items():
+            if path.startswith(prefix):
+                return seconds
+        return self.timeout
+
+    @staticmethod
+    def _backoff(attempt: int) -> float:
+        """Экспоненциальная задержка с полным джиттером"""
+        return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt)))
+
+    @staticmethod
+    async def _read_limited(resp: aiohttp.ClientResponse, limit: int) -> str:
+        if resp.content_length is not None and resp.content_length > limit:
+            raise ResponseTooLarge(f"Response too large: {resp.content_length} bytes (limit {limit})")
+        chunks = []
+        size = 0
+        async for chunk in resp.content.iter_chunked(64 * 1024):
+            size += len(chunk)
+            if size > limit:
+                raise ResponseTooLarge(f"Response exceeds {limit} bytes")
+            chunks.append(chunk)
+        return b''.join(chunks).decode(resp.charset or 'utf-8', errors='replace')
@@ -0,0 +1,90 @@
+"""
+Batch Buffer - накопление мелких запросов в пачки
+Функции:
+- add() кладёт элемент в буфер и сразу возвращает управление
+- Пачка отправляется при max_size элементах или через max_delay секунд после первого
+- flush() / stop() досылают всё накопленное (конец прохода, остановка сервиса)
+"""
+
+import logging
+import asyncio
+from typing import Awaitable, Callable, Generic, List, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+
+class BatchBuffer(Generic[T]):
+    """Буфер с отправкой по размеру или по времени"""
+
+    def __init__(
+        self,
+        flush: Callable[[List[T]], Awaitable[None]],
+        max_size: int = 50,
+        max_delay: float = 5.0,
+        name: str = 'batch',
+    ):
+        self.flush_batch = flush
+        self.max_size = max(1, max_size)
+        self.max_delay = max_delay
+        self.name = name
+
+        self._items: List[T] = []
+        self._timer: Optional[asyncio.Task] = None
+        self._flushes: set = set()
+
+    def add(self, item: T) -> None:
+        self._items.append(item)
+        if len(self._items) >= self.max_size:
+            self._cancel_timer()
+            self._spawn_flush(self._take())
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later(), name=f"{self.name}-batch")
+
+    @property
+    def pending(self) -> int:
+        return len(self._items)
+
+    async def flush(self) -> None:
+        """Отправить накопленное и дождаться уже начатых отправок"""
+        self._cancel_timer()
+        await self._flush_items(self._take())
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+    async def stop(self) -> None:
+        await self.flush()
+
+    # ----------------------------------------
+    # Internals
+    # ----------------------------------------
+    def _cancel_timer(self) -> None:
+        if self._timer and not self._timer.done():
+            self._timer.cancel()
+        self._timer = None
+
+    def _take(self) -> List[T]:
+        items, self._items = self._items, []
+        return items
+
+    def _spawn_flush(self, items: List[T]) -> None:
+        if not items:
+            return
+        task = asyncio.create_task(self._flush_items(items))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.max_delay)
+        self._timer = None
+        # Отправка - отдельной задачей в _flushes: stop() её дождётся (таймер же только отменяет)
+        self._spawn_flush(self._take())
+
+    async def _flush_items(self, items: List[T]) -> None:
+        if not items:
+            return
+        try:
+            await self.flush_batch(items)
+        except Exception as e:
+            logger.exception(f"{self.name}: batch flush failed ({len(items)} items): {e}")
@@ -0,0 +1,213 @@
+"""
+Broadcast Jobs - фоновые рассылки с чекпоинтами
+Функции:
+- Рассылка выполняется в фоне, endpoint сразу возвращает job id
+- Ограниченная параллельность (пачки), лимиты Telegram соблюдает SendQueue
+- Чекпоинт после каждой пачки - рассылка продолжается после рестарта
+- Статус: sent/failed/remaining и текущая скорость отправки
+"""
+
+import os
+import json
+import time
+import uuid
+import logging
+import asyncio
+from collections import deque
+from dataclasses import dataclass, field, asdict
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# ============================================
+# Конфигурация
+# ============================================
+BROADCAST_STATE_DIR = os.getenv('BROADCAST_STATE_DIR', 'logs/broadcasts')
+BROADCAST_CONCURRENCY = int(os.getenv('BROADCAST_CONCURRENCY', '50'))
+
+# Окно (сек) для расчёта текущей скорости отправки
+RATE_WINDOW_SECONDS = 10
+
+SendFunc = Callable[[str, str], Awaitable[bool]]
+
+
+@dataclass
+class BroadcastJob:
+    """Состояние рассылки (список получателей хранится отдельно от чекпоинта)"""
+    id: str
+    message: str
+    user_ids: List[str] = field(default_factory=list, repr=False)
+    total: int = 0
+    cursor: int = 0
+    sent: int = 0
+    failed: int = 0
+    status: str = 'pending'  # pending | running | done | failed
+    created_at: str = field(default_factory=lambda: datetime.now().isoformat())
+    finished_at: Optional[str] = None
+    error: Optional[str] = None
+
+    @property
+    def remaining(self) -> int:
+        return self.total - self.cursor
+
+
+class BroadcastManager:
+    """Создаёт, выполняет и восстанавливает рассылки"""
+
+    def __init__(
+        self,
+        send: SendFunc,
+        state_dir: str = BROADCAST_STATE_DIR,
+        concurrency: int = BROADCAST_CONCURRENCY,
+    ):
+        self.send = send
+        self.state_dir = state_dir
+        self.concurrency = max(1, concurrency)
+        self.jobs: Dict[str, BroadcastJob] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._completions: Dict[str, deque] = {}
+
+    # ----------------------------------------
+    # Public API
+    # ----------------------------------------
+    def create(self, user_ids: List, message: str) -> BroadcastJob:
+        """Создать рассылку и запустить её в фоне"""
+        job = BroadcastJob(
+            id=uuid.uuid4().hex[:12],
+            user_ids=[str(u) for u in user_ids],
+            message=message,
+            total=len(user_ids),
+        )
+        self.jobs[job.id] = job
+        self._write_json(self._path(job.id, 'users'), job.user_ids)
+        self._save(job)
+        self._launch(job)
+        logger.info(f"📣 Broadcast {job.id} created for {job.total} users")
+        return job
+
+    def status(self, job_id: str) -> Optional[dict]:
+        """Статус рассылки для API"""
+        job = self.jobs.get(job_id)
+        if not job:
+            return None
+        return {
+            'jobId': job.id,
+            'status': job.status,
+            'total': job.total,
+            'sent': job.sent,
+            'failed': job.failed,
+            'remaining': job.remaining,
+            'rate': round(self._rate(job.id), 2),
+            'createdAt': job.created_at,
+            'finishedAt': job.finished_at,
+            'error': job.error,
+        }
+
+    async def resume(self) -> None:
+        """Подхватить незавершённые рассылки после рестарта"""
+        if not os.path.isdir(self.state_dir):
+            return
+        for name in os.listdir(self.state_dir):
+            if not name.endswith('.state.json'):
+                continue
+            path = os.path.join(self.state_dir, name)
+            try:
+                with open(path, encoding='utf-8') as f:
+                    job = BroadcastJob(**json.load(f))
+                if job.status in ('pending', 'running'):
+                    with open(self._path(job.id, 'users'), encoding='utf-8') as f:
+                        job.user_ids = json.load(f)
+            except Exception as e:
+                logger.error(f"Failed to load broadcast checkpoint {path}: {e}")
+                continue
+            self.jobs[job.id] = job
+            if job.status in ('pending', 'running'):
+                logger.info(f"📣 Resuming broadcast {job.id} at {job.cursor}/{job.total}")
+                self._launch(job)
+
+    async def stop(self) -> None:
+        """Остановить рассылки (прогресс уже в чекпоинтах)"""
+        for task in self._tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        self._tasks.clear()
+
+    # ----------------------------------------
+    # Internals
+    # ----------------------------------------
+    def _launch(self, job: BroadcastJob) -> None:
+        self._completions[job.id] = deque(maxlen=10000)
+        self._tasks[job.id] = asyncio.create_task(self._run(job), name=f"broadcast-{job.id}")
+
+    async def _send_one(self, job: BroadcastJob, user_id: str) -> bool:
+        try:
+            ok = await self.send(user_id, job.message)
+        except Exception as e:
+            logger.error(f"Broadcast {job.id}: send to {user_id} failed: {e}")
+            ok = False
+        self._completions[job.id].append(time.monotonic())
+        return ok is True
+
+    async def _run(self, job: BroadcastJob) -> None:
+        job.status = 'running'
+        try:
+            # Пачками по concurrency: после каждой пачки сохраняем курсор.
+            # При падении посреди пачки она будет отправлена повторно (at-least-once).
+            while job.cursor < job.total:
+                batch = job.user_ids[job.cursor:job.cursor + self.concurrency]
+                results = await asyncio.gather(*(self._send_one(job, uid) for uid in batch))
+                sent = sum(1 for ok in results if ok)
+                job.sent += sent
+                job.failed += len(results) - sent
+                job.cursor += len(batch)
+                self._save(job)
+            job.status = 'done'
+            logger.info(f"📣 Broadcast {job.id} finished: {job.sent} sent, {job.failed} failed")
+        except asyncio.CancelledError:
+            self._save(job)
+            raise
+        except Exception as e:
+            logger.exception(f"Broadcast {job.id} failed: {e}")
+            job.status = 'failed'
+            job.error = str(e)
+        job.finished_at = datetime.now().isoformat()
+        self._save(job)
+        self._tasks.pop(job.id, None)
+
+    def _rate(self, job_id: str) -> float:
+        """Сообщений в секунду за последние RATE_WINDOW_SECONDS"""
+        completions = self._completions.get(job_id)
+        if not completions:
+            return 0.0
+        cutoff = time.monotonic() - RATE_WINDOW_SECONDS
+        while completions and completions[0] < cutoff:
+            completions.popleft()
+        return len(completions) / RATE_WINDOW_SECONDS
+
+    def _path(self, job_id: str, kind: str) -> str:
+        return os.path.join(self.state_dir, f"{job_id}.{kind}.json")
+
+    def _save(self, job: BroadcastJob) -> None:
+        """Записать чекпоинт (без списка получателей - он пишется один раз)"""
+        state = asdict(job)
+        state.pop('user_ids')
+        self._write_json(self._path(job.id, 'state'), state)
+        if job.status in ('done', 'failed'):
+            # Получатели больше не нужны - освобождаем память и диск
+            job.user_ids = []
+            try:
+                os.remove(self._path(job.id, 'users'))
+            except OSError:
+                pass
+
+    def _write_json(self, path: str, payload) -> None:
+        """Атомарная запись JSON (tmp + rename)"""
+        try:
+            os.makedirs(self.state_dir, exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(payload, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error(f"Failed to write broadcast checkpoint {path}: {e}")
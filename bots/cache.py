@@ -0,0 +1,157 @@
+"""
+Cache - кэши для Admin Bot
+Функции:
+- SWRCache: TTL + stale-while-revalidate + single-flight обновление
+- TTLCache: ограниченный LRU словарь с TTL на запись
+"""
+
+import time
+import logging
+import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Awaitable, Callable, Generic, Hashable, Optional, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+
+@dataclass
+class Cached(Generic[T]):
+    value: T
+    fetched_at: datetime
+    stale: bool = False
+    error: Optional[str] = None
+
+
+class SWRCache(Generic[T]):
+    """
+    Одно значение с TTL:
+    - свежее значение отдаётся из памяти
+    - устаревшее отдаётся сразу, обновление идёт в фоне
+    - одновременные обновления схлопываются в один запрос (single-flight)
+    - если API недоступен - отдаём последнее известное значение с ошибкой
+    """
+
+    def __init__(self, loader: Callable[[], Awaitable[T]], ttl: float, name: str = 'cache'):
+        self.loader = loader
+        self.ttl = ttl
+        self.name = name
+        self._value: Optional[T] = None
+        self._fetched_at: Optional[datetime] = None
+        self._loaded_at = 0.0  # monotonic
+        self._error: Optional[str] = None
+        self._exception: Optional[BaseException] = None
+        self._refresh: Optional[asyncio.Task] = None
+
+    async def get(self) -> Cached[T]:
+        """Получить значение (первый вызов ждёт загрузку)"""
+        if self._fetched_at is None:
+            await self._refresh_once()
+            if self._fetched_at is None:
+                # Загрузка не удалась и отдать нечего - пробрасываем ошибку загрузчика
+                raise self._exception or RuntimeError(f"{self.name}: load failed")
+            return self._snapshot(stale=False)
+
+        if time.monotonic() - self._loaded_at < self.ttl:
+            return self._snapshot(stale=False)
+
+        # Устарело: обновляем в фоне, отдаём что есть
+        self._start_refresh()
+        return self._snapshot(stale=True)
+
+    def peek(self) -> Optional[T]:
+        """Текущее значение без обновления (None если ещё не загружено)"""
+        return self._value
+
+    async def refresh(self) -> None:
+        """Обновить сейчас (присоединяется к уже идущему обновлению)"""
+        await self._refresh_once()
+
+    def invalidate(self) -> None:
+        """Считать значение устаревшим (следующий get() запустит обновление)"""
+        self._loaded_at = 0.0
+
+    def set(self, value: T, fetched_at: Optional[datetime] = None) -> None:
+        """Положить значение напрямую (например, из снапшота)"""
+        self._value = value
+        self._fetched_at = fetched_at or datetime.now()
+        self._loaded_at = time.monotonic()
+        self._error = None
+        self._exception = None
+
+    def _snapshot(self, stale: bool) -> Cached[T]:
+        return Cached(value=self._value, fetched_at=self._fetched_at, stale=stale, error=self._error)
+
+    def _start_refresh(self) -> asyncio.Task:
+        if self._refresh is None or self._refresh.done():
+            self._refresh = asyncio.create_task(self._load(), name=f"{self.name}-refresh")
+        return self._refresh
+
+    async def _refresh_once(self) -> None:
+        # shield: отмена одного ожидающего не отменяет общую загрузку
+        await asyncio.shield(self._start_refresh())
+
+    async def _load(self) -> None:
+        try:
+            value = await self.loader()
+        except Exception as e:
+            self._exception = e
+            self._error = str(e) or type(e).__name__
+            logger.warning(f"{self.name}: refresh failed: {self._error}")
+            return
+        self.set(value)
+
+
+class TTLCache(Generic[T]):
+    """
+    Словарь с TTL и LRU вытеснением:
+    - запись живёт ttl секунд
+    - при переполнении удаляется самая давно использованная
+    """
+
+    def __init__(self, maxsize: int, ttl: float, name: str = 'cache'):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self._data: 'OrderedDict[Hashable, Tuple[float, T]]' = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[T]:
+        """Значение или None (нет / истекло)"""
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: T) -> None:
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> Optional[T]:
+        item = self._data.pop(key, None)
+        return item[1] if item else None
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Удалить записи, ключи которых подходят под условие"""
+        keys = [key for key in self._data if predicate(key)]
+        for key in keys:
+            del self._data[key]
+        return len(keys)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key) is not None
+
+    def __len__(self) -> int:
+        return len(self._data)
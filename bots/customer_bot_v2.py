@@ -13,7 +13,7 @@ import os
 import logging
 import asyncio
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from contextlib import asynccontextmanager
 
 from telegram import (
@@ -32,14 +32,20 @@ from telegram.ext import (
     filters
 )
 from telegram.constants import ParseMode
-from telegram.error import TelegramError, Forbidden, BadRequest, TimedOut, NetworkError
+from telegram.error import TelegramError, Forbidden, BadRequest, TimedOut, NetworkError, RetryAfter
 
-from fastapi import FastAPI, Request, HTTPException, BackgroundTasks
+from fastapi import FastAPI, Request, HTTPException
 from fastapi.responses import JSONResponse
 import uvicorn
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 from dotenv import load_dotenv
 
+from send_queue import SendQueue
+from broadcast import BroadcastManager
+from message_map import MessageMap
+from outbox import Outbox, STATUS_FAILED, OUTBOX_RETRY_SECONDS, is_transient_error
+from update_queue import UpdateQueue
+
 # Загрузка переменных окружения
 load_dotenv()
 
@@ -66,6 +72,12 @@ API_URL = os.getenv('API_URL', 'http://localhost:3000/api')
 WEBHOOK_URL = os.getenv('CUSTOMER_BOT_WEBHOOK_URL', '')
 PORT = int(os.getenv('CUSTOMER_BOT_PORT', '8001'))
 USE_WEBHOOK = os.getenv('USE_WEBHOOK', 'false').lower() == 'true'
+OUTBOX_PATH = os.getenv('CUSTOMER_OUTBOX_PATH', 'logs/customer_outbox.sqlite3')
+MESSAGES_PATH = os.getenv('CUSTOMER_MESSAGES_PATH', 'logs/customer_messages.sqlite3')
+# Статусы, о которых шлём новое сообщение; остальные редактируют сообщение заказа
+STATUS_NEW_MESSAGE_ON = {
+    s.strip().upper() for s in os.getenv('CUSTOMER_STATUS_NEW_MESSAGE_ON', 'SHIPPED,CANCELLED').split(',') if s.strip()
+}
 
 if not BOT_TOKEN:
     logger.error('❌ BOT TOKEN not set! Set CUSTOMER_BOT_TOKEN or BOT_TOKEN')
@@ -104,11 +116,35 @@ class CustomNotification(BaseModel):
     message: str
     buttons: Optional[list] = None
 
+class BroadcastRequest(BaseModel):
+    userIds: list
+    message: str
+
+class BatchItem(BaseModel):
+    # Неизвестный тип - ошибка только этого элемента, а не всей пачки
+    type: str
+    data: Dict[str, Any]
+
+class BatchNotification(BaseModel):
+    notifications: List[BatchItem]
+
 # ============================================
 # Telegram Bot Application
 # ============================================
 application: Optional[Application] = None
 
+# Очередь исходящих уведомлений (лимиты Telegram: глобальный и на чат)
+send_queue = SendQueue(name='customer')
+
+# Персистентный outbox: уведомления переживают рестарт контейнера
+outbox = Outbox(OUTBOX_PATH)
+
+# Очередь webhook апдейтов (быстрый ответ Telegram, обработка в фоне)
+update_queue = UpdateQueue()
+
+# Сообщения о заказах в чатах клиентов (для редактирования при смене статуса)
+message_map = MessageMap(MESSAGES_PATH)
+
 def get_bot() -> Bot:
     """Получить экземпляр бота"""
     if application and application.bot:
@@ -465,57 +501,89 @@ async def send_order_notification(data: OrderNotification) -> bool:
 🔔 Уведомления о статусе будут приходить сюда.
         """.strip()
 
-        await bot.send_message(
+        sent = await bot.send_message(
             chat_id=data.telegramId,
             text=message,
             parse_mode=ParseMode.HTML,
             reply_markup=get_order_keyboard(data.orderNumber)
         )
+        await message_map.put(data.telegramId, data.orderNumber, sent.message_id, message)
         
         logger.info(f"Order notification sent to {data.telegramId} for order #{data.orderNumber}")
         return True
         
+    except RetryAfter:
+        # Flood control - очередь отправки повторит попытку позже
+        raise
     except TelegramError as e:
         logger.error(f"Failed to send order notification: {e}")
+        if is_transient_error(e):
+            # Сеть / таймаут - outbox оставит запись pending и повторит
+            raise
         return False
 
+def format_status_block(status: str, status_text: Optional[str] = None) -> str:
+    """Блок статуса, который дописывается к сообщению о заказе"""
+    block = f"📋 Статус: {get_status_emoji(status)} <b>{status_text or get_status_text(status)}</b>"
+    # Дополнительный текст в зависимости от статуса
+    if status.upper() == 'SHIPPED':
+        block += "\n\n🚚 Ваш заказ в пути! Ожидайте доставку."
+    elif status.upper() == 'DELIVERED':
+        block += "\n\n🎉 Спасибо за покупку! Будем рады видеть вас снова."
+    elif status.upper() == 'CANCELLED':
+        block += "\n\n❓ Если у вас есть вопросы, свяжитесь с нами."
+    return block
+
 async def send_status_notification(data: StatusNotification) -> bool:
-    """Отправить уведомление об изменении статуса"""
+    """
+    Уведомление об изменении статуса: редактируем сообщение о заказе,
+    новое сообщение - только для статусов из CUSTOMER_STATUS_NEW_MESSAGE_ON
+    """
     try:
         bot = get_bot()
+        block = format_status_block(data.status, data.statusText)
         
-        emoji = get_status_emoji(data.status)
-        status_text = data.statusText or get_status_text(data.status)
+        ref = None
+        if data.status.upper() not in STATUS_NEW_MESSAGE_ON:
+            ref = await message_map.get(data.telegramId, data.orderNumber)
+        if ref:
+            try:
+                await bot.edit_message_text(
+                    chat_id=data.telegramId,
+                    message_id=ref.message_id,
+                    text=f"{ref.text}\n\n{block}",
+                    parse_mode=ParseMode.HTML,
+                    reply_markup=get_order_keyboard(data.orderNumber)
+                )
+                logger.info(f"Status message edited for {data.telegramId}, order #{data.orderNumber}")
+                return True
+            except BadRequest as e:
+                if 'not modified' in str(e).lower():
+                    return True
+                # Сообщение удалено или недоступно для редактирования - отправляем новое
+                logger.info(f"Cannot edit status message for order #{data.orderNumber}: {e}")
         
-        message = f"""
-{emoji} <b>Обновление заказа</b>
-
-📦 Заказ: <b>#{data.orderNumber}</b>
-📋 Статус: <b>{status_text}</b>
-
-Следите за обновлениями здесь!
-        """.strip()
-
-        # Дополнительный текст в зависимости от статуса
-        if data.status.upper() == 'SHIPPED':
-            message += "\n\n🚚 Ваш заказ в пути! Ожидайте доставку."
-        elif data.status.upper() == 'DELIVERED':
-            message += "\n\n🎉 Спасибо за покупку! Будем рады видеть вас снова."
-        elif data.status.upper() == 'CANCELLED':
-            message += "\n\n❓ Если у вас есть вопросы, свяжитесь с нами."
-
-        await bot.send_message(
+        header = f"🔄 <b>Обновление заказа</b>\n\n📦 Заказ: <b>#{data.orderNumber}</b>"
+        sent = await bot.send_message(
             chat_id=data.telegramId,
-            text=message,
+            text=f"{header}\n\n{block}",
             parse_mode=ParseMode.HTML,
             reply_markup=get_order_keyboard(data.orderNumber)
         )
+        # Следующие статусы будут редактировать это (последнее) сообщение
+        await message_map.put(data.telegramId, data.orderNumber, sent.message_id, header)
         
         logger.info(f"Status notification sent to {data.telegramId} for order #{data.orderNumber}")
         return True
         
+    except RetryAfter:
+        # Flood control - очередь отправки повторит попытку позже
+        raise
     except TelegramError as e:
         logger.error(f"Failed to send status notification: {e}")
+        if is_transient_error(e):
+            # Сеть / таймаут - outbox оставит запись pending и повторит
+            raise
         return False
 
 async def send_cart_reminder(data: AbandonedCartNotification) -> bool:
@@ -548,8 +616,14 @@ async def send_cart_reminder(data: AbandonedCartNotification) -> bool:
         logger.info(f"Cart reminder sent to {data.telegramId} for cart #{data.cartId}")
         return True
         
+    except RetryAfter:
+        # Flood control - очередь отправки повторит попытку позже
+        raise
     except TelegramError as e:
         logger.error(f"Failed to send cart reminder: {e}")
+        if is_transient_error(e):
+            # Сеть / таймаут - outbox оставит запись pending и повторит
+            raise
         return False
 
 async def send_custom_notification(data: CustomNotification) -> bool:
@@ -582,10 +656,76 @@ async def send_custom_notification(data: CustomNotification) -> bool:
         logger.info(f"Custom notification sent to {data.telegramId}")
         return True
         
+    except RetryAfter:
+        # Flood control - очередь отправки повторит попытку позже
+        raise
     except TelegramError as e:
         logger.error(f"Failed to send custom notification: {e}")
+        if is_transient_error(e):
+            # Сеть / таймаут - outbox оставит запись pending и повторит
+            raise
         return False
 
+# Типы уведомлений: модель payload и функция отправки
+NOTIFICATION_HANDLERS = {
+    'customer': (OrderNotification, send_order_notification),
+    'status': (StatusNotification, send_status_notification),
+    'abandoned-cart': (AbandonedCartNotification, send_cart_reminder),
+    'custom': (CustomNotification, send_custom_notification),
+}
+
+async def enqueue_notifications(items: List[tuple]) -> None:
+    """Сохранить уведомления в outbox (одним коммитом) и поставить в очередь отправки"""
+    outbox_ids = await outbox.add_many([(kind, data.model_dump()) for kind, data in items])
+    for (kind, data), outbox_id in zip(items, outbox_ids):
+        _, send_func = NOTIFICATION_HANDLERS[kind]
+        await send_queue.submit(data.telegramId, outbox.deliver, outbox_id, send_func, data)
+
+async def enqueue_notification(kind: str, data: BaseModel) -> None:
+    """Сохранить уведомление в outbox и поставить в очередь отправки"""
+    await enqueue_notifications([(kind, data)])
+
+async def replay_outbox() -> None:
+    """Переотправить уведомления, не подтверждённые до рестарта (at-least-once)"""
+    entries = await outbox.pending()
+    if not entries:
+        return
+    logger.info(f"🔁 Replaying {len(entries)} pending notifications from outbox")
+    for entry in entries:
+        handler = NOTIFICATION_HANDLERS.get(entry.kind)
+        if not handler:
+            logger.warning(f"Unknown outbox entry kind '{entry.kind}' (id={entry.id})")
+            continue
+        model, send_func = handler
+        try:
+            data = model(**entry.payload)
+        except ValidationError as e:
+            logger.error(f"Invalid outbox entry {entry.id}: {e}")
+            outbox.mark(entry.id, STATUS_FAILED)
+            continue
+        await send_queue.submit(data.telegramId, outbox.deliver, entry.id, send_func, data)
+
+async def outbox_retry_loop() -> None:
+    """Повтор уведомлений, оставшихся pending после сетевых ошибок"""
+    while True:
+        await asyncio.sleep(OUTBOX_RETRY_SECONDS)
+        try:
+            await replay_outbox()
+        except Exception as e:
+            logger.error(f"Outbox retry failed: {e}")
+
+async def send_broadcast_message(user_id: str, message: str) -> bool:
+    """Отправить одно сообщение рассылки (через очередь отправки)"""
+    future = await send_queue.submit(
+        user_id,
+        send_custom_notification,
+        CustomNotification(telegramId=user_id, message=message)
+    )
+    return await future
+
+# Фоновые рассылки с чекпоинтами
+broadcasts = BroadcastManager(send=send_broadcast_message)
+
 # ============================================
 # FastAPI Application
 # ============================================
@@ -647,6 +787,7 @@ async def lifespan(app: FastAPI):
         # Инициализируем приложение
         await application.initialize()
         await application.start()
+        await update_queue.start(application)
         
         if USE_WEBHOOK and WEBHOOK_URL:
             # Webhook режим
@@ -657,14 +798,29 @@ async def lifespan(app: FastAPI):
             await application.updater.start_polling(drop_pending_updates=True)
             logger.info("Polling started")
     
+    await outbox.open()
+    message_map.open()
+    await send_queue.start()
+    await replay_outbox()
+    retry_task = asyncio.create_task(outbox_retry_loop(), name='outbox-retry')
+    await broadcasts.resume()
+    
     yield
     
     # Shutdown
+    retry_task.cancel()
+    await asyncio.gather(retry_task, return_exceptions=True)
+    await broadcasts.stop()
+    await send_queue.stop()
+    await outbox.close()
+    message_map.close()
+    
     if application:
         if USE_WEBHOOK:
             await application.bot.delete_webhook()
         else:
             await application.updater.stop()
+        await update_queue.stop()
         await application.stop()
         await application.shutdown()
     
@@ -687,72 +843,92 @@ async def health():
         "status": "ok",
         "bot_initialized": application is not None,
         "version": "2.0.0",
-        "mode": "webhook" if USE_WEBHOOK else "polling"
+        "mode": "webhook" if USE_WEBHOOK else "polling",
+        "send_queue": send_queue.snapshot(),
+        "update_queue": update_queue.snapshot()
     }
 
 @api.post("/webhook")
 async def webhook(request: Request):
-    """Webhook endpoint для Telegram"""
+    """Webhook endpoint для Telegram (апдейт обрабатывается в фоне)"""
     if not application:
         raise HTTPException(status_code=503, detail="Bot not initialized")
     
     try:
         data = await request.json()
         update = Update.de_json(data, application.bot)
-        await application.process_update(update)
+        await update_queue.submit(update)
         return JSONResponse({"ok": True})
     except Exception as e:
         logger.error(f"Webhook error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @api.post("/notify/customer")
-async def notify_customer(data: OrderNotification, background_tasks: BackgroundTasks):
+async def notify_customer(data: OrderNotification):
     """Отправить уведомление клиенту о новом заказе"""
-    background_tasks.add_task(send_order_notification, data)
+    await enqueue_notification('customer', data)
     return {"status": "queued", "message": "Notification will be sent"}
 
 @api.post("/notify/status")
-async def notify_status(data: StatusNotification, background_tasks: BackgroundTasks):
+async def notify_status(data: StatusNotification):
     """Отправить уведомление об изменении статуса"""
-    background_tasks.add_task(send_status_notification, data)
+    await enqueue_notification('status', data)
     return {"status": "queued", "message": "Status notification will be sent"}
 
 @api.post("/notify/abandoned-cart")
-async def notify_abandoned_cart(data: AbandonedCartNotification, background_tasks: BackgroundTasks):
+async def notify_abandoned_cart(data: AbandonedCartNotification):
     """Отправить напоминание о брошенной корзине"""
-    background_tasks.add_task(send_cart_reminder, data)
+    await enqueue_notification('abandoned-cart', data)
     return {"status": "queued", "message": "Cart reminder will be sent"}
 
 @api.post("/notify/custom")
-async def notify_custom(data: CustomNotification, background_tasks: BackgroundTasks):
+async def notify_custom(data: CustomNotification):
     """Отправить кастомное уведомление"""
-    background_tasks.add_task(send_custom_notification, data)
+    await enqueue_notification('custom', data)
     return {"status": "queued", "message": "Custom notification will be sent"}
 
+@api.post("/notify/batch")
+async def notify_batch(batch: BatchNotification):
+    """Пакетная постановка уведомлений в очередь (статус для каждого элемента)"""
+    results = []
+    valid = []
+    for index, item in enumerate(batch.notifications):
+        handler = NOTIFICATION_HANDLERS.get(item.type)
+        if handler is None:
+            results.append({"index": index, "status": "invalid", "error": f"Unknown notification type: {item.type}"})
+            continue
+        model, _ = handler
+        try:
+            data = model(**item.data)
+        except ValidationError as e:
+            results.append({"index": index, "status": "invalid", "error": e.errors(include_url=False, include_input=False)})
+            continue
+        valid.append((item.type, data))
+        results.append({"index": index, "status": "queued"})
+    
+    await enqueue_notifications(valid)
+    
+    queued = sum(1 for r in results if r["status"] == "queued")
+    logger.info(f"Batch: {queued} of {len(results)} notifications queued")
+    return {"queued": queued, "invalid": len(results) - queued, "results": results}
+
 @api.post("/broadcast")
-async def broadcast(request: Request):
-    """Рассылка сообщений (для админов)"""
+async def broadcast(data: BroadcastRequest):
+    """Рассылка сообщений (для админов) - запускается фоновой задачей"""
     # TODO: Добавить авторизацию
-    data = await request.json()
-    user_ids = data.get('userIds', [])
-    message = data.get('message', '')
-    
-    if not user_ids or not message:
+    if not data.userIds or not data.message:
         raise HTTPException(status_code=400, detail="userIds and message required")
     
-    results = {"sent": 0, "failed": 0}
-    
-    for user_id in user_ids:
-        try:
-            await send_custom_notification(CustomNotification(
-                telegramId=str(user_id),
-                message=message
-            ))
-            results["sent"] += 1
-        except Exception:
-            results["failed"] += 1
-    
-    return results
+    job = broadcasts.create(data.userIds, data.message)
+    return {"status": "queued", "jobId": job.id, "total": job.total}
+
+@api.get("/broadcast/{job_id}")
+async def broadcast_status(job_id: str):
+    """Статус рассылки: sent/failed/remaining и текущая скорость"""
+    status = broadcasts.status(job_id)
+    if not status:
+        raise HTTPException(status_code=404, detail="Broadcast job not found")
+    return status
 
 # ============================================
 # Main
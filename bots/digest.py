@@ -0,0 +1,67 @@
+"""
+Digest - адаптивная группировка уведомлений
+Функции:
+- Пока поток событий ниже порога - каждое отправляется сразу
+- При всплеске (больше threshold событий в минуту) события копятся
+  окно window_seconds и отдаются одной пачкой
+- Пачка ограничена max_items (переполнение - досрочная отправка)
+- Накопление и отправка пачек - BatchBuffer (окно = max_delay, max_items = max_size)
+"""
+
+import time
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Deque, Generic, List, TypeVar
+
+from batch_buffer import BatchBuffer
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+RATE_WINDOW_SECONDS = 60
+
+
+class DigestBuffer(Generic[T]):
+    """Буфер дайджеста: offer() решает - отправлять сразу или копить"""
+
+    def __init__(
+        self,
+        flush: Callable[[List[T]], Awaitable[None]],
+        threshold_per_minute: int,
+        window_seconds: float,
+        max_items: int = 30,
+        name: str = 'digest',
+    ):
+        self.threshold = threshold_per_minute
+        self.name = name
+
+        self._arrivals: Deque[float] = deque()
+        self._batch: BatchBuffer[T] = BatchBuffer(
+            flush, max_size=max_items, max_delay=window_seconds, name=f"{name}-digest"
+        )
+
+    def offer(self, item: T) -> bool:
+        """True - событие добавлено в дайджест, False - отправлять отдельно"""
+        if self.threshold <= 0:
+            return False
+        now = time.monotonic()
+        self._arrivals.append(now)
+        while self._arrivals and now - self._arrivals[0] > RATE_WINDOW_SECONDS:
+            self._arrivals.popleft()
+
+        if not self._batch.pending:
+            if len(self._arrivals) <= self.threshold:
+                return False
+            logger.info(f"📚 {self.name}: {len(self._arrivals)} events/min, switching to digest mode")
+        # Окно считается от первого события пачки, заполненная пачка уходит досрочно
+        self._batch.add(item)
+        return True
+
+    @property
+    def pending(self) -> int:
+        return self._batch.pending
+
+    async def stop(self) -> None:
+        """Отправить накопленное и дождаться начатых отправок (вызывается при остановке)"""
+        await self._batch.stop()
@@ -0,0 +1,129 @@
+"""
+Message Map - какие сообщения ботов относятся к каким заказам (SQLite)
+Функции:
+- (chat_id, order_number) -> message_id исходного уведомления и его текст
+- Смена статуса редактирует это сообщение вместо отправки нового
+- Размер ограничен: старые записи вытесняются
+"""
+
+import os
+import time
+import logging
+import sqlite3
+import asyncio
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# ============================================
+# Конфигурация
+# ============================================
+MESSAGE_MAP_MAX_ENTRIES = int(os.getenv('MESSAGE_MAP_MAX_ENTRIES', '20000'))
+
+# Вытеснение старых записей - раз в столько вставок
+PRUNE_EVERY = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    chat_id TEXT NOT NULL,
+    order_number TEXT NOT NULL,
+    message_id INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (chat_id, order_number)
+);
+CREATE INDEX IF NOT EXISTS idx_messages_updated ON messages (updated_at);
+"""
+
+
+@dataclass
+class MessageRef:
+    message_id: int
+    # Текст сообщения без блока статуса (к нему дописывается актуальный статус)
+    text: str
+
+
+class MessageMap:
+    """Ограниченное персистентное отображение (чат, заказ) -> сообщение"""
+
+    def __init__(self, path: str, max_entries: int = MESSAGE_MAP_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._puts = 0
+
+    # ----------------------------------------
+    # Lifecycle
+    # ----------------------------------------
+    def open(self) -> None:
+        if self._conn:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        if self._conn:
+            self._conn.close()
+            self._conn = None
+
+    # ----------------------------------------
+    # Public API
+    # ----------------------------------------
+    async def get(self, chat_id, order_number: str) -> Optional[MessageRef]:
+        if not self._conn:
+            return None
+        row = await asyncio.to_thread(
+            self._execute,
+            'SELECT message_id, text FROM messages WHERE chat_id = ? AND order_number = ?',
+            (str(chat_id), order_number),
+            True
+        )
+        return MessageRef(message_id=row[0], text=row[1]) if row else None
+
+    async def put(self, chat_id, order_number: str, message_id: int, text: str) -> None:
+        if not self._conn:
+            return
+        await asyncio.to_thread(
+            self._execute,
+            'INSERT OR REPLACE INTO messages (chat_id, order_number, message_id, text, updated_at) VALUES (?, ?, ?, ?, ?)',
+            (str(chat_id), order_number, message_id, text, time.time())
+        )
+        self._puts += 1
+        if self._puts % PRUNE_EVERY == 0:
+            await asyncio.to_thread(self._prune)
+
+    # ----------------------------------------
+    # Internals
+    # ----------------------------------------
+    def _execute(self, sql: str, params: tuple, fetch: bool = False):
+        try:
+            with self._lock:
+                cur = self._conn.execute(sql, params)
+                return cur.fetchone() if fetch else None
+        except sqlite3.Error as e:
+            # Карта сообщений - оптимизация: при ошибке просто отправим новое сообщение
+            logger.error(f"Message map error ({self.path}): {e}")
+            return None
+
+    def _prune(self) -> None:
+        removed = 0
+        try:
+            with self._lock:
+                cur = self._conn.execute(
+                    'DELETE FROM messages WHERE updated_at < ('
+                    'SELECT updated_at FROM messages ORDER BY updated_at DESC LIMIT 1 OFFSET ?)',
+                    (self.max_entries - 1,)
+                )
+                removed = cur.rowcount
+        except sqlite3.Error as e:
+            logger.error(f"Message map prune failed ({self.path}): {e}")
+        if removed > 0:
+            logger.info(f"🗂️ Message map pruned: {removed} old entries")
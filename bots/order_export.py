@@ -0,0 +1,224 @@
+"""
+Order Export - выгрузка заказов в CSV для Admin Bot
+Функции:
+- Заказы читаются из API постранично (GET /bots/orders?createdFrom=&createdTo=&limit=&offset=)
+- CSV пишется по мере чтения во временный файл (в памяти до EXPORT_SPOOL_MB, дальше - на диск)
+- Формат для Excel: UTF-8 с BOM, разделитель ';', десятичная запятая
+- Текст клиента экранируется от формул (CSV injection): '=', '+', '-', '@' в начале ячейки
+"""
+
+import io
+import os
+import re
+import csv
+import logging
+import tempfile
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, IO, List, Optional, Tuple
+
+from api_client import ApiClient, ApiStatusError
+
+logger = logging.getLogger(__name__)
+
+# ============================================
+# Конфигурация
+# ============================================
+# API отдаёт не больше 100 заказов за запрос
+EXPORT_PAGE_SIZE = min(int(os.getenv('EXPORT_PAGE_SIZE', '100')), 100)
+EXPORT_SPOOL_MB = float(os.getenv('EXPORT_SPOOL_MB', '5'))
+EXPORT_DEFAULT_DAYS = int(os.getenv('EXPORT_DEFAULT_DAYS', '30'))
+
+CSV_DELIMITER = ';'
+
+DATE_FORMATS = ('%d.%m.%Y', '%Y-%m-%d')
+
+# Ячейка с таким началом открывается в Excel / LibreOffice как формула
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+PHONE_RE = re.compile(r'^\+?[\d\s()\-]+$')
+
+PAYMENT_LABELS = {
+    'PAID': 'Оплачен',
+    'PENDING': 'Не оплачен',
+}
+
+HEADER = [
+    'Номер', 'Дата', 'Статус', 'Оплата', 'Клиент', 'Телефон',
+    'Email', 'Адрес', 'Товары', 'Сумма', 'Комментарий',
+]
+
+
+@dataclass
+class ExportRequest:
+    date_from: date
+    date_to: date
+    # Статус в терминах API (PENDING, SHIPPED, ...), None - все
+    status: Optional[str] = None
+
+    @property
+    def filename(self) -> str:
+        suffix = f"_{self.status.lower()}" if self.status else ''
+        return f"orders_{self.date_from:%Y-%m-%d}_{self.date_to:%Y-%m-%d}{suffix}.csv"
+
+    def describe(self) -> str:
+        period = f"{self.date_from:%d.%m.%Y} - {self.date_to:%d.%m.%Y}"
+        return f"{period}, {self.status or 'все статусы'}"
+
+
+def _parse_date(raw: str) -> date:
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(raw, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Неверная дата: {raw} (ожидается ДД.ММ.ГГГГ)")
+
+
+def parse_export_args(args: List[str], statuses: Dict[str, str], today: Optional[date] = None) -> ExportRequest:
+    """
+    /export [с] [по] [статус]
+    statuses - допустимые статусы: ввод пользователя (в верхнем регистре) -> статус API
+    """
+    today = today or date.today()
+    dates: List[date] = []
+    status = None
+    for arg in args:
+        key = arg.upper()
+        if key in statuses:
+            status = statuses[key]
+        elif key in ('ALL', 'ВСЕ'):
+            status = None
+        else:
+            dates.append(_parse_date(arg))
+
+    if len(dates) > 2:
+        raise ValueError("Укажите не больше двух дат")
+    if not dates:
+        date_from, date_to = today - timedelta(days=EXPORT_DEFAULT_DAYS - 1), today
+    elif len(dates) == 1:
+        date_from, date_to = dates[0], today
+    else:
+        date_from, date_to = dates
+    if date_from > date_to:
+        raise ValueError("Начальная дата позже конечной")
+    return ExportRequest(date_from=date_from, date_to=date_to, status=status)
+
+
+async def iter_orders(
+    client: ApiClient,
+    request: ExportRequest,
+    page_size: int = EXPORT_PAGE_SIZE,
+) -> AsyncIterator[List[dict]]:
+    """Страницы заказов диапазона (новые сверху)"""
+    created_from = datetime.combine(request.date_from, time.min).astimezone()
+    # Верхняя граница не позже момента запуска: новые заказы не сдвигают offset между страницами
+    created_to = min(datetime.combine(request.date_to, time.max).astimezone(), datetime.now().astimezone())
+    params: Dict[str, Any] = {
+        'createdFrom': created_from.isoformat(),
+        'createdTo': created_to.isoformat(),
+        'limit': page_size,
+    }
+    if request.status:
+        params['status'] = request.status
+
+    offset = 0
+    while True:
+        resp = await client.get("/bots/orders", params={**params, 'offset': offset})
+        if not resp.ok:
+            raise ApiStatusError(resp.status, resp.text)
+        orders = [o for o in (resp.json() or []) if isinstance(o, dict)]
+        if orders:
+            yield orders
+        if len(orders) < page_size:
+            return
+        offset += len(orders)
+
+
+def _format_created(raw: Optional[str]) -> str:
+    if not raw:
+        return ''
+    try:
+        created = datetime.fromisoformat(raw.replace('Z', '+00:00'))
+    except ValueError:
+        return raw
+    if created.tzinfo is not None:
+        created = created.astimezone()
+    return f"{created:%d.%m.%Y %H:%M}"
+
+
+def _format_money(value: Any) -> str:
+    try:
+        return f"{float(value):.2f}".replace('.', ',')
+    except (ValueError, TypeError):
+        return ''
+
+
+def _format_items(items: Optional[list]) -> str:
+    parts = []
+    for item in items or []:
+        variant = item.get('variantName') or ''
+        name = f"{item.get('productName', 'N/A')}{f' ({variant})' if variant else ''}"
+        parts.append(f"{name} × {item.get('quantity', 0)}")
+    return '; '.join(parts)
+
+
+def _text(value: Any) -> str:
+    """Произвольный текст в ячейку: формула превращается в строку (префикс ')"""
+    text = str(value) if value is not None else ''
+    return f"'{text}" if text.startswith(FORMULA_PREFIXES) else text
+
+
+def _phone(value: Any) -> str:
+    """Телефон (+7...) оставляем как есть, всё остальное - как текст"""
+    text = str(value) if value is not None else ''
+    return text if PHONE_RE.match(text) else _text(text)
+
+
+def order_row(order: dict, status_labels: Dict[str, str]) -> List[str]:
+    status = order.get('status') or ''
+    payment = order.get('paymentStatus') or ''
+    return [
+        _text(order.get('orderNumber')),
+        _format_created(order.get('createdAt')),
+        status_labels.get(status, status),
+        PAYMENT_LABELS.get(payment, payment),
+        _text(order.get('customerName')),
+        _phone(order.get('customerPhone')),
+        _text(order.get('customerEmail')),
+        _text(order.get('customerAddress')),
+        _text(_format_items(order.get('items'))),
+        _format_money(order.get('total')),
+        _text(order.get('comment')),
+    ]
+
+
+async def export_orders_csv(
+    client: ApiClient,
+    request: ExportRequest,
+    status_labels: Dict[str, str],
+    progress: Optional[Callable[[int], Awaitable[None]]] = None,
+) -> Tuple[IO[bytes], int]:
+    """
+    Выгрузить заказы в CSV. Возвращает (файл, открытый на начале; число заказов).
+    Файл закрывает вызывающий
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=int(EXPORT_SPOOL_MB * 1024 * 1024), mode='w+b')
+    text = io.TextIOWrapper(spool, encoding='utf-8-sig', newline='')
+    try:
+        writer = csv.writer(text, delimiter=CSV_DELIMITER)
+        writer.writerow(HEADER)
+        count = 0
+        async for orders in iter_orders(client, request):
+            writer.writerows(order_row(order, status_labels) for order in orders)
+            count += len(orders)
+            if progress:
+                await progress(count)
+        text.flush()
+    except BaseException:
+        text.close()
+        raise
+    # Отвязываем текстовую обёртку, чтобы она не закрыла файл
+    text.detach()
+    spool.seek(0)
+    logger.info(f"📤 Orders export ({request.describe()}): {count} orders")
+    return spool, count
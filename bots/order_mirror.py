@@ -0,0 +1,257 @@
+"""
+Order Mirror - локальная копия заказов для Admin Bot (SQLite)
+Функции:
+- Инкрементальная синхронизация по составному курсору (updatedAt, id)
+  (GET /bots/orders?updatedSince=&afterId=)
+- События /notify/* применяются сразу, не дожидаясь синхронизации
+- Индексированные выборки: страница по статусу, заказ по номеру, статистика
+"""
+
+import os
+import json
+import logging
+import sqlite3
+import asyncio
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from api_client import ApiClient, ApiStatusError
+from order_stats import OrderStats
+
+logger = logging.getLogger(__name__)
+
+# ============================================
+# Конфигурация
+# ============================================
+ORDER_MIRROR_SYNC_BATCH = int(os.getenv('ORDER_MIRROR_SYNC_BATCH', '500'))
+
+# Курсор первой синхронизации (все заказы)
+EPOCH = '1970-01-01T00:00:00.000Z'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS orders (
+    order_number TEXT PRIMARY KEY,
+    status TEXT,
+    payment_status TEXT,
+    total REAL,
+    created_at TEXT,
+    updated_at TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_orders_status_created ON orders (status, created_at DESC);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def _row(order: dict) -> tuple:
+    total = order.get('total')
+    try:
+        total = float(total)
+    except (ValueError, TypeError):
+        total = None
+    return (
+        order['orderNumber'],
+        order.get('status'),
+        order.get('paymentStatus'),
+        total,
+        order.get('createdAt'),
+        order.get('updatedAt'),
+        json.dumps(order, ensure_ascii=False),
+    )
+
+
+class OrderMirror:
+    """Зеркало заказов: SQLite + курсор синхронизации"""
+
+    def __init__(self, path: str, sync_batch: int = ORDER_MIRROR_SYNC_BATCH):
+        self.path = path
+        self.sync_batch = sync_batch
+        self.cursor: Optional[str] = None
+        # id последнего заказа с updatedAt == cursor (заказов с одним updatedAt может быть больше sync_batch)
+        self.cursor_id: Optional[int] = None
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._sync_lock = asyncio.Lock()
+
+    # ----------------------------------------
+    # Lifecycle
+    # ----------------------------------------
+    def open(self) -> None:
+        if self._conn:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+        meta = dict(self._conn.execute("SELECT key, value FROM meta WHERE key IN ('cursor', 'cursor_id')").fetchall())
+        self.cursor = meta.get('cursor')
+        self.cursor_id = int(meta['cursor_id']) if meta.get('cursor_id') else None
+        logger.info(f"🪞 Order mirror opened: {self.path} (cursor: {self.cursor or 'none'})")
+
+    def close(self) -> None:
+        if self._conn:
+            self._conn.close()
+            self._conn = None
+
+    @property
+    def ready(self) -> bool:
+        """Первая полная синхронизация выполнена - из зеркала можно читать"""
+        return self._conn is not None and self.cursor is not None
+
+    # ----------------------------------------
+    # Синхронизация
+    # ----------------------------------------
+    async def sync(self, client: ApiClient) -> int:
+        """Догрузить заказы, изменённые после курсора. Возвращает число полученных записей
+
+        API отдаёт заказы по (updatedAt, id): курсор - пара последнего заказа страницы,
+        следующая страница начинается строго после неё, даже если updatedAt у всех одинаковый.
+        """
+        async with self._sync_lock:
+            received = 0
+            while True:
+                cursor = (self.cursor or EPOCH, self.cursor_id)
+                params = {"updatedSince": cursor[0], "limit": self.sync_batch}
+                if cursor[1] is not None:
+                    params["afterId"] = cursor[1]
+                resp = await client.get("/bots/orders", params=params)
+                if not resp.ok:
+                    raise ApiStatusError(resp.status, resp.text)
+                page = [o for o in (resp.json() or []) if isinstance(o, dict)]
+                orders = [o for o in page if o.get('orderNumber')]
+                received += len(orders)
+                new_cursor = cursor
+                if page:
+                    last = page[-1]
+                    last_id = last.get('id')
+                    new_cursor = (last.get('updatedAt') or cursor[0], last_id if isinstance(last_id, int) else None)
+                await asyncio.to_thread(self._upsert, orders, new_cursor)
+                self.cursor, self.cursor_id = new_cursor
+                if len(page) < self.sync_batch:
+                    break
+                if new_cursor == cursor:
+                    # Страница не сдвинула курсор (API без afterId) - не зацикливаемся
+                    logger.warning(f"Order mirror: cursor did not advance at {cursor}")
+                    break
+            if received:
+                logger.info(f"🪞 Order mirror synced: {received} orders (cursor: {self.cursor})")
+            return received
+
+    # ----------------------------------------
+    # События
+    # ----------------------------------------
+    async def upsert(self, order: dict) -> None:
+        """Заказ целиком (ответ API)"""
+        if self._conn and order.get('orderNumber'):
+            await asyncio.to_thread(self._upsert, [order], None)
+
+    async def add_new(self, order: dict) -> None:
+        """Новый заказ из /notify/admin (неполные данные - синхронизация их заменит)"""
+        if not self._conn:
+            return
+        await asyncio.to_thread(self._execute, 'INSERT OR IGNORE INTO orders VALUES (?, ?, ?, ?, ?, ?, ?)', _row(order))
+
+    async def apply_change(self, order_number: str, field_name: str, value: str) -> None:
+        """Смена статуса / статуса оплаты из /notify/status"""
+        if not self._conn or field_name not in ('status', 'paymentStatus'):
+            return
+
+        def _apply():
+            with self._lock:
+                row = self._conn.execute('SELECT data FROM orders WHERE order_number = ?', (order_number,)).fetchone()
+                if not row:
+                    return
+                order = json.loads(row[0])
+                order[field_name] = value
+                self._conn.execute('INSERT OR REPLACE INTO orders VALUES (?, ?, ?, ?, ?, ?, ?)', _row(order))
+
+        await asyncio.to_thread(_apply)
+
+    # ----------------------------------------
+    # Чтение
+    # ----------------------------------------
+    async def get(self, order_number: str) -> Optional[dict]:
+        if not self._conn:
+            return None
+        row = await asyncio.to_thread(
+            self._execute, 'SELECT data FROM orders WHERE order_number = ?', (order_number,), True
+        )
+        return json.loads(row[0]) if row else None
+
+    async def page(self, status: str, offset: int, limit: int) -> Tuple[List[dict], bool]:
+        """Страница заказов статуса (новые сверху) и признак следующей страницы"""
+        def _select() -> list:
+            with self._lock:
+                return self._conn.execute(
+                    'SELECT data FROM orders WHERE status = ? ORDER BY created_at DESC, order_number DESC LIMIT ? OFFSET ?',
+                    (status, limit + 1, offset)
+                ).fetchall()
+
+        rows = await asyncio.to_thread(_select)
+        return [json.loads(r[0]) for r in rows[:limit]], len(rows) > limit
+
+    async def build_stats(self) -> OrderStats:
+        """Статистика по зеркалу (только нужные колонки, без разбора JSON)"""
+        def _build() -> OrderStats:
+            order_stats = OrderStats()
+            with self._lock:
+                rows = self._conn.execute(
+                    'SELECT order_number, status, payment_status, total, created_at FROM orders'
+                ).fetchall()
+            for order_number, status, payment_status, total, created_at in rows:
+                order_stats.add({
+                    'orderNumber': order_number,
+                    'status': status,
+                    'paymentStatus': payment_status,
+                    'total': total,
+                    'createdAt': created_at,
+                })
+            return order_stats
+
+        return await asyncio.to_thread(_build)
+
+    async def search_rows(self) -> List[dict]:
+        """Поля для поискового индекса по всем заказам"""
+        def _select() -> list:
+            with self._lock:
+                return self._conn.execute(
+                    "SELECT order_number, json_extract(data, '$.customerName'), json_extract(data, '$.customerPhone'), "
+                    "status, total, created_at FROM orders"
+                ).fetchall()
+
+        return [
+            {'orderNumber': r[0], 'customerName': r[1], 'customerPhone': r[2], 'status': r[3], 'total': r[4], 'createdAt': r[5]}
+            for r in await asyncio.to_thread(_select)
+        ]
+
+    # ----------------------------------------
+    # Internals
+    # ----------------------------------------
+    def _execute(self, sql: str, params: tuple, fetch: bool = False) -> Any:
+        with self._lock:
+            cur = self._conn.execute(sql, params)
+            return cur.fetchone() if fetch else None
+
+    def _upsert(self, orders: List[Dict], cursor: Optional[Tuple[str, Optional[int]]]) -> None:
+        with self._lock:
+            self._conn.execute('BEGIN')
+            try:
+                self._conn.executemany(
+                    'INSERT OR REPLACE INTO orders VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    [_row(o) for o in orders]
+                )
+                if cursor is not None:
+                    self._conn.executemany(
+                        'INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                        [('cursor', cursor[0]), ('cursor_id', str(cursor[1]) if cursor[1] is not None else None)]
+                    )
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
@@ -0,0 +1,136 @@
+"""
+Order Search - поиск заказов в памяти для inline-запросов Admin Bot
+Функции:
+- Поиск по номеру заказа, фрагменту телефона, имени клиента
+- Префиксный индекс по словам (короткие запросы) + триграммы (подстроки)
+- Обновление записей из событий без перестроения индекса
+"""
+
+import re
+import heapq
+import bisect
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set
+
+_TOKEN_RE = re.compile(r'[0-9a-zа-яё]+')
+
+
+@dataclass
+class OrderDoc:
+    orderNumber: str
+    customerName: str = ''
+    customerPhone: str = ''
+    status: str = 'PENDING'
+    total: float = 0.0
+    createdAt: Optional[str] = None
+
+
+def normalize(text: str) -> str:
+    return ' '.join(_TOKEN_RE.findall((text or '').lower().replace('ё', 'е')))
+
+
+def _trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class OrderSearchIndex:
+    """Индекс: слова (отсортированный список для префиксов) + триграммы"""
+
+    def __init__(self):
+        self.docs: Dict[str, OrderDoc] = {}
+        self._text: Dict[str, str] = {}
+        self._trigrams: Dict[str, Set[str]] = {}
+        self._tokens: Dict[str, Set[str]] = {}
+        self._sorted_tokens: Optional[List[str]] = None
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    # ----------------------------------------
+    # Наполнение
+    # ----------------------------------------
+    def add(self, order: dict) -> None:
+        """Добавить / заменить заказ (dict из API или /notify/admin)"""
+        number = order.get('orderNumber')
+        if not number:
+            return
+        try:
+            total = float(order.get('total') or 0)
+        except (ValueError, TypeError):
+            total = 0.0
+        doc = OrderDoc(
+            orderNumber=number,
+            customerName=order.get('customerName') or '',
+            customerPhone=order.get('customerPhone') or '',
+            status=order.get('status') or 'PENDING',
+            total=total,
+            createdAt=order.get('createdAt'),
+        )
+        if number in self.docs:
+            self._unindex(number)
+        self.docs[number] = doc
+
+        phone_digits = re.sub(r'\D', '', doc.customerPhone)
+        text = normalize(f"{number} {doc.customerName}") + (f" {phone_digits}" if phone_digits else '')
+        self._text[number] = text
+        for gram in _trigrams(text):
+            self._trigrams.setdefault(gram, set()).add(number)
+        for token in set(text.split()):
+            self._tokens.setdefault(token, set()).add(number)
+        self._sorted_tokens = None
+
+    def update_status(self, order_number: str, status: str) -> None:
+        doc = self.docs.get(order_number)
+        if doc is not None:
+            doc.status = status
+
+    # ----------------------------------------
+    # Поиск
+    # ----------------------------------------
+    def search(self, query: str, limit: int = 20) -> List[OrderDoc]:
+        """Заказы, подходящие под запрос (новые сверху)"""
+        query = normalize(query)
+        if not query:
+            return []
+        # Телефон вводят с пробелами/дефисами: "+7 999 12" -> "799912"
+        if re.fullmatch(r'[\d ]+', query):
+            query = query.replace(' ', '')
+
+        if len(query) < 3:
+            numbers = self._prefix(query)
+        else:
+            grams = sorted((self._trigrams.get(g, set()) for g in _trigrams(query)), key=len)
+            numbers = set.intersection(*grams) if grams and grams[0] else set()
+            # Триграммы дают кандидатов - проверяем подстроку целиком
+            numbers = {n for n in numbers if query in self._text[n]}
+
+        return heapq.nlargest(limit, (self.docs[n] for n in numbers), key=lambda d: d.createdAt or '')
+
+    # ----------------------------------------
+    # Internals
+    # ----------------------------------------
+    def _prefix(self, prefix: str) -> Set[str]:
+        if self._sorted_tokens is None:
+            self._sorted_tokens = sorted(self._tokens)
+        tokens = self._sorted_tokens
+        numbers: Set[str] = set()
+        i = bisect.bisect_left(tokens, prefix)
+        while i < len(tokens) and tokens[i].startswith(prefix):
+            numbers |= self._tokens[tokens[i]]
+            i += 1
+        return numbers
+
+    def _unindex(self, number: str) -> None:
+        text = self._text.pop(number, '')
+        for gram in _trigrams(text):
+            bucket = self._trigrams.get(gram)
+            if bucket is not None:
+                bucket.discard(number)
+                if not bucket:
+                    del self._trigrams[gram]
+        for token in set(text.split()):
+            bucket = self._tokens.get(token)
+            if bucket is not None:
+                bucket.discard(number)
+                if not bucket:
+                    del self._tokens[token]
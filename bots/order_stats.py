@@ -0,0 +1,264 @@
+"""
+Order Stats - однопроходная статистика заказов для Admin Bot
+Функции:
+- Все счётчики (по статусам, выручка, оплаченные, по дням) за один проход
+- Дата createdAt парсится один раз на заказ
+- Заказы можно подавать потоком (не держим весь список в памяти)
+- Инкрементальное обновление из событий (новый заказ, смена статуса, смена оплаты)
+- Снапшот в JSON файл (переживает рестарт)
+"""
+
+import os
+import json
+import logging
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Статусы, которые показываем в статистике (порядок вывода)
+STATS_STATUSES = ['PENDING', 'CONFIRMED', 'PROCESSING', 'SHIPPED', 'DELIVERED', 'CANCELLED']
+
+# Смена статуса оплаты приходит в /notify/status как "Оплата: PENDING → Оплата: PAID"
+PAYMENT_STATUS_PREFIX = 'Оплата: '
+
+
+def parse_created_at(value) -> Optional[datetime]:
+    """ISO дата из API (2025-11-28T19:52:00.222Z) -> naive datetime, иначе None"""
+    if not value or not isinstance(value, str) or 'T' not in value:
+        return None
+    if value.endswith('Z'):
+        value = value[:-1] + '+00:00'
+    try:
+        return datetime.fromisoformat(value).replace(tzinfo=None)
+    except ValueError:
+        return None
+
+
+def normalize_status(status: str) -> str:
+    """NEW (UI) -> PENDING (API)"""
+    status = (status or '').upper()
+    return 'PENDING' if status == 'NEW' else status
+
+
+def parse_status_change(status: str, old_status: Optional[str] = None) -> Tuple[str, Optional[str], str]:
+    """
+    Разобрать событие /notify/status -> (поле, старое значение, новое значение).
+    API присылает status="OLD → NEW" без oldStatus; поле - 'status' или 'paymentStatus'
+    """
+    status = status or ''
+    if '→' in status:
+        old_part, status = (part.strip() for part in status.split('→', 1))
+        old_status = old_status or old_part
+    if status.startswith(PAYMENT_STATUS_PREFIX):
+        if old_status and old_status.startswith(PAYMENT_STATUS_PREFIX):
+            old_status = old_status[len(PAYMENT_STATUS_PREFIX):]
+        return 'paymentStatus', old_status or None, status[len(PAYMENT_STATUS_PREFIX):]
+    return 'status', normalize_status(old_status) if old_status else None, normalize_status(status)
+
+
+def to_float(value) -> Optional[float]:
+    """total может прийти строкой (Decimal) - None если не число"""
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return None
+
+
+@dataclass
+class DayBucket:
+    orders: int = 0
+    paid_orders: int = 0
+    revenue: float = 0.0
+
+
+@dataclass
+class OrderEntry:
+    """Что нужно знать о заказе, чтобы событие оплаты сдвинуло выручку без сверки"""
+    total: float = 0.0
+    day: Optional[date] = None
+    paid: bool = False
+
+
+@dataclass
+class OrderStats:
+    """Агрегатор статистики: add() на каждый заказ, затем format_message()"""
+    total_orders: int = 0
+    total_revenue: float = 0.0
+    paid_orders: int = 0
+    by_status: Dict[str, int] = field(default_factory=lambda: {s: 0 for s in STATS_STATUSES})
+    by_day: Dict[date, DayBucket] = field(default_factory=dict)
+    # Текущий статус каждого заказа: для переходов без oldStatus и защиты от дублей событий
+    statuses: Dict[str, str] = field(default_factory=dict)
+    # Сумма, день и оплата каждого заказа: для событий оплаты
+    orders: Dict[str, OrderEntry] = field(default_factory=dict)
+
+    def add(self, order: dict) -> None:
+        """Учесть один заказ"""
+        self.total_orders += 1
+
+        status = order.get('status')
+        if status in self.by_status:
+            self.by_status[status] += 1
+        if order.get('orderNumber'):
+            self.statuses[order['orderNumber']] = status
+
+        amount = to_float(order.get('total', 0))
+        paid = order.get('paymentStatus') == 'PAID' and amount is not None
+        if paid:
+            self.total_revenue += amount
+            self.paid_orders += 1
+
+        created = parse_created_at(order.get('createdAt'))
+        if created is not None:
+            bucket = self._bucket(created.date())
+            bucket.orders += 1
+            if paid:
+                bucket.paid_orders += 1
+                bucket.revenue += amount
+
+        if order.get('orderNumber'):
+            self.orders[order['orderNumber']] = OrderEntry(
+                total=amount or 0.0, day=created.date() if created else None, paid=paid
+            )
+
+    def apply_new_order(self, order_number: str, total: float = 0, created_at: Optional[str] = None) -> bool:
+        """Событие "новый заказ" (/notify/admin). False - заказ уже учтён"""
+        if order_number in self.statuses:
+            return False
+        self.total_orders += 1
+        self.by_status['PENDING'] += 1
+        self.statuses[order_number] = 'PENDING'
+        created = parse_created_at(created_at) or datetime.now()
+        self._bucket(created.date()).orders += 1
+        # Новый заказ не оплачен - в выручку попадёт с событием оплаты
+        self.orders[order_number] = OrderEntry(total=to_float(total) or 0.0, day=created.date())
+        return True
+
+    def apply_status_change(self, order_number: str, status: str, old_status: Optional[str] = None) -> bool:
+        """Событие "смена статуса" (/notify/status). False - переход не применён"""
+        field_name, old_status, status = parse_status_change(status, old_status)
+        if field_name == 'paymentStatus':
+            return self.apply_payment_change(order_number, status)
+        old_status = self.statuses.get(order_number) or old_status
+        if old_status == status:
+            return False
+        if old_status in self.by_status and self.by_status[old_status] > 0:
+            self.by_status[old_status] -= 1
+        if status in self.by_status:
+            self.by_status[status] += 1
+        self.statuses[order_number] = status
+        return True
+
+    def apply_payment_change(self, order_number: str, payment_status: str) -> bool:
+        """Смена оплаты: PAID добавляет сумму заказа в выручку, уход из PAID - вычитает"""
+        entry = self.orders.get(order_number)
+        paid = payment_status == 'PAID'
+        if entry is None or entry.paid == paid:
+            # Заказ неизвестен (сумма тоже) или событие-дубль
+            return False
+        sign = 1 if paid else -1
+        entry.paid = paid
+        self.total_revenue += sign * entry.total
+        self.paid_orders += sign
+        if entry.day is not None:
+            bucket = self._bucket(entry.day)
+            bucket.revenue += sign * entry.total
+            bucket.paid_orders += sign
+        return True
+
+    def _bucket(self, day: date) -> DayBucket:
+        bucket = self.by_day.get(day)
+        if bucket is None:
+            bucket = self.by_day[day] = DayBucket()
+        return bucket
+
+    def add_many(self, orders: List[dict]) -> 'OrderStats':
+        for order in orders:
+            self.add(order)
+        return self
+
+    def day(self, day: Optional[date] = None) -> DayBucket:
+        """Показатели за день (по умолчанию - сегодня)"""
+        return self.by_day.get(day or datetime.now().date(), DayBucket())
+
+    def format_message(self) -> str:
+        """Текст экрана "📊 Статистика" (HTML)"""
+        today = self.day()
+        s = self.by_status
+        return f"""📊 <b>Статистика</b>
+
+📦 <b>Всего заказов:</b> {self.total_orders}
+💰 <b>Выручка (оплачено):</b> {self.total_revenue:,.0f} ₽
+💳 <b>Оплачено заказов:</b> {self.paid_orders}
+
+📅 <b>Сегодня:</b>
+  • Заказов: {today.orders}
+  • Выручка: {today.revenue:,.0f} ₽
+
+📊 <b>По статусам:</b>
+  🆕 Новые: {s['PENDING']}
+  ✅ Подтверждённые: {s['CONFIRMED']}
+  🔄 В работе: {s['PROCESSING']}
+  📦 Готов к выдаче: {s['SHIPPED']}
+  🎉 Выдан: {s['DELIVERED']}
+  ❌ Отменён: {s['CANCELLED']}"""
+
+
+# ============================================
+# Снапшот
+# ============================================
+def save_snapshot(stats: OrderStats, path: str, fetched_at: datetime) -> None:
+    """Атомарно записать счётчики в JSON (tmp + rename)"""
+    payload = {
+        'fetched_at': fetched_at.isoformat(),
+        'total_orders': stats.total_orders,
+        'total_revenue': stats.total_revenue,
+        'paid_orders': stats.paid_orders,
+        'by_status': stats.by_status,
+        'by_day': {d.isoformat(): [b.orders, b.paid_orders, b.revenue] for d, b in stats.by_day.items()},
+        'statuses': stats.statuses,
+        'orders': {
+            number: [e.total, e.day.isoformat() if e.day else None, e.paid]
+            for number, e in stats.orders.items()
+        },
+    }
+    try:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(payload, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.error(f"Failed to save stats snapshot {path}: {e}")
+
+
+def load_snapshot(path: str) -> Optional[tuple]:
+    """Прочитать снапшот: (OrderStats, fetched_at) или None"""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, encoding='utf-8') as f:
+            payload = json.load(f)
+        stats = OrderStats(
+            total_orders=payload['total_orders'],
+            total_revenue=payload['total_revenue'],
+            paid_orders=payload['paid_orders'],
+            by_status={**{s: 0 for s in STATS_STATUSES}, **payload['by_status']},
+            by_day={
+                date.fromisoformat(d): DayBucket(orders=v[0], paid_orders=v[1], revenue=v[2])
+                for d, v in payload['by_day'].items()
+            },
+            statuses=payload.get('statuses', {}),
+            orders={
+                number: OrderEntry(total=v[0], day=date.fromisoformat(v[1]) if v[1] else None, paid=v[2])
+                for number, v in payload.get('orders', {}).items()
+            },
+        )
+        return stats, datetime.fromisoformat(payload['fetched_at'])
+    except Exception as e:
+        logger.error(f"Failed to load stats snapshot {path}: {e}")
+        return None
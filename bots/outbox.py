@@ -0,0 +1,283 @@
+"""
+Outbox - персистентная очередь уведомлений (SQLite, WAL)
+Функции:
+- Каждое уведомление сохраняется до отправки и хранится до подтверждения Telegram
+- Групповые коммиты: записи копятся и коммитятся пачкой одним writer'ом
+- Незавершённые записи переотправляются при старте и периодически (at-least-once)
+- Сетевые ошибки / таймауты оставляют запись pending (attempts + 1), failed - только
+  постоянные ошибки (Forbidden, неверный чат) или после OUTBOX_MAX_ATTEMPTS попыток
+- Периодическая компактация: удаление обработанных записей
+"""
+
+import os
+import json
+import time
+import logging
+import sqlite3
+import asyncio
+import threading
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, List, Optional, Set, Tuple
+
+from telegram.error import BadRequest, NetworkError, RetryAfter
+
+logger = logging.getLogger(__name__)
+
+# ============================================
+# Конфигурация
+# ============================================
+OUTBOX_FLUSH_MS = int(os.getenv('OUTBOX_FLUSH_MS', '20'))
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', '200'))
+OUTBOX_RETENTION_HOURS = float(os.getenv('OUTBOX_RETENTION_HOURS', '24'))
+OUTBOX_COMPACT_INTERVAL_MINUTES = float(os.getenv('OUTBOX_COMPACT_INTERVAL_MINUTES', '30'))
+# Повтор записей, не отправленных из-за сети: раз в N секунд, не больше M попыток
+OUTBOX_RETRY_SECONDS = float(os.getenv('OUTBOX_RETRY_SECONDS', '60'))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', '20'))
+
+STATUS_PENDING = 'pending'
+STATUS_SENT = 'sent'
+STATUS_FAILED = 'failed'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_status ON outbox (status, updated_at);
+"""
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """Сеть / таймаут - стоит повторить (BadRequest в PTB тоже NetworkError, но постоянная)"""
+    return isinstance(error, NetworkError) and not isinstance(error, BadRequest)
+
+
+@dataclass
+class OutboxEntry:
+    id: int
+    kind: str
+    payload: dict
+    attempts: int
+
+
+class Outbox:
+    """SQLite outbox с единственным writer'ом и групповыми коммитами"""
+
+    def __init__(
+        self,
+        path: str,
+        flush_ms: int = OUTBOX_FLUSH_MS,
+        batch_size: int = OUTBOX_BATCH_SIZE,
+        retention_hours: float = OUTBOX_RETENTION_HOURS,
+        compact_interval_minutes: float = OUTBOX_COMPACT_INTERVAL_MINUTES,
+        max_attempts: int = OUTBOX_MAX_ATTEMPTS,
+    ):
+        self.path = path
+        self.flush_delay = flush_ms / 1000
+        self.batch_size = batch_size
+        self.retention_seconds = retention_hours * 3600
+        self.compact_interval = compact_interval_minutes * 60
+        self.max_attempts = max_attempts
+
+        self._conn: Optional[sqlite3.Connection] = None
+        # Соединение одно на процесс, обращения из потоков сериализуем
+        self._lock = threading.Lock()
+        self._ops: Optional[asyncio.Queue] = None
+        self._writer: Optional[asyncio.Task] = None
+        self._compactor: Optional[asyncio.Task] = None
+        # Записи, уже стоящие в очереди отправки: pending() их не отдаёт (без дублей при повторе)
+        self._claimed: Set[int] = set()
+
+    # ----------------------------------------
+    # Lifecycle
+    # ----------------------------------------
+    async def open(self) -> None:
+        """Открыть БД и запустить writer/компактор"""
+        if self._conn:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+        self._ops = asyncio.Queue()
+        self._writer = asyncio.create_task(self._write_loop(), name='outbox-writer')
+        self._compactor = asyncio.create_task(self._compact_loop(), name='outbox-compactor')
+        logger.info(f"🗄️ Outbox opened: {self.path}")
+
+    async def close(self) -> None:
+        """Дописать буфер и закрыть БД"""
+        if not self._conn:
+            return
+        if self._compactor:
+            self._compactor.cancel()
+        await self._ops.join()
+        self._writer.cancel()
+        await asyncio.gather(self._writer, self._compactor, return_exceptions=True)
+        self._conn.close()
+        self._conn = None
+        self._ops = None
+        logger.info("Outbox closed")
+
+    # ----------------------------------------
+    # Public API
+    # ----------------------------------------
+    async def add(self, kind: str, payload: dict) -> Optional[int]:
+        """Сохранить уведомление. Возвращает id после коммита (None если outbox не открыт)"""
+        return (await self.add_many([(kind, payload)]))[0]
+
+    async def add_many(self, items: List[Tuple[str, dict]]) -> List[Optional[int]]:
+        """Сохранить несколько уведомлений одним коммитом"""
+        if not self._ops:
+            return [None] * len(items)
+        loop = asyncio.get_running_loop()
+        futures = []
+        for kind, payload in items:
+            future = loop.create_future()
+            self._ops.put_nowait(('insert', kind, json.dumps(payload, ensure_ascii=False), future))
+            futures.append(future)
+        ids = []
+        for result in await asyncio.gather(*futures, return_exceptions=True):
+            if isinstance(result, Exception):
+                # Не теряем уведомление из-за проблем с диском - отправляем без гарантий
+                logger.error(f"Outbox insert failed, sending without persistence: {result}")
+                result = None
+            ids.append(result)
+        self._claimed.update(entry_id for entry_id in ids if entry_id is not None)
+        return ids
+
+    def mark(self, entry_id: Optional[int], status: str) -> None:
+        """
+        Отметить результат отправки (коммитится следующей пачкой).
+        STATUS_PENDING - неудачная попытка, запись будет повторена
+        """
+        if entry_id is None or not self._ops:
+            return
+        self._claimed.discard(entry_id)
+        self._ops.put_nowait(('update', entry_id, status, None))
+
+    async def pending(self) -> List[OutboxEntry]:
+        """Незавершённые записи, которых нет в очереди отправки (переотправка при старте и по таймеру)"""
+        if not self._conn:
+            return []
+
+        def _select() -> list:
+            with self._lock:
+                return self._conn.execute(
+                    'SELECT id, kind, payload, attempts FROM outbox WHERE status = ? ORDER BY id',
+                    (STATUS_PENDING,)
+                ).fetchall()
+
+        rows = await asyncio.to_thread(_select)
+        entries = [
+            OutboxEntry(id=r[0], kind=r[1], payload=json.loads(r[2]), attempts=r[3])
+            for r in rows if r[0] not in self._claimed
+        ]
+        self._claimed.update(entry.id for entry in entries)
+        return entries
+
+    async def deliver(self, entry_id: Optional[int], send: Callable[..., Awaitable[Any]], *args) -> Any:
+        """
+        Выполнить отправку и зафиксировать результат.
+        RetryAfter пробрасывается без отметки (запись остаётся за очередью отправки, она повторит),
+        сетевые ошибки - с отметкой попытки: запись остаётся pending и будет повторена по таймеру
+        """
+        try:
+            result = await send(*args)
+        except RetryAfter:
+            raise
+        except Exception as e:
+            self.mark(entry_id, STATUS_PENDING if is_transient_error(e) else STATUS_FAILED)
+            raise
+        self.mark(entry_id, STATUS_SENT if result else STATUS_FAILED)
+        return result
+
+    async def compact(self) -> int:
+        """Удалить обработанные записи старше retention"""
+        if not self._conn:
+            return 0
+        cutoff = time.time() - self.retention_seconds
+
+        def _compact() -> int:
+            with self._lock:
+                cur = self._conn.execute(
+                    'DELETE FROM outbox WHERE status != ? AND updated_at < ?',
+                    (STATUS_PENDING, cutoff)
+                )
+                self._conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+                return cur.rowcount
+
+        removed = await asyncio.to_thread(_compact)
+        if removed:
+            logger.info(f"🗄️ Outbox compacted: {removed} rows removed")
+        return removed
+
+    # ----------------------------------------
+    # Internals
+    # ----------------------------------------
+    def _apply(self, ops: list) -> List[Optional[int]]:
+        """Применить пачку операций одной транзакцией"""
+        now = time.time()
+        ids: List[Optional[int]] = []
+        with self._lock:
+            self._conn.execute('BEGIN')
+            try:
+                for op in ops:
+                    if op[0] == 'insert':
+                        cur = self._conn.execute(
+                            'INSERT INTO outbox (kind, payload, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?)',
+                            (op[1], op[2], STATUS_PENDING, now, now)
+                        )
+                        ids.append(cur.lastrowid)
+                    else:
+                        # Неудачная попытка (pending) после max_attempts - failed
+                        self._conn.execute(
+                            'UPDATE outbox SET status = CASE WHEN ? = ? AND attempts + 1 >= ? THEN ? ELSE ? END, '
+                            'attempts = attempts + 1, updated_at = ? WHERE id = ?',
+                            (op[2], STATUS_PENDING, self.max_attempts, STATUS_FAILED, op[2], now, op[1])
+                        )
+                        ids.append(None)
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+        return ids
+
+    async def _write_loop(self) -> None:
+        while True:
+            ops = [await self._ops.get()]
+            # Даём накопиться пачке
+            if self.flush_delay > 0:
+                await asyncio.sleep(self.flush_delay)
+            while len(ops) < self.batch_size and not self._ops.empty():
+                ops.append(self._ops.get_nowait())
+            try:
+                ids = await asyncio.to_thread(self._apply, ops)
+                for op, entry_id in zip(ops, ids):
+                    future = op[3]
+                    if future and not future.done():
+                        future.set_result(entry_id)
+            except Exception as e:
+                logger.exception(f"Outbox write failed ({len(ops)} ops): {e}")
+                for op in ops:
+                    future = op[3]
+                    if future and not future.done():
+                        future.set_exception(e)
+            finally:
+                for _ in ops:
+                    self._ops.task_done()
+
+    async def _compact_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.compact_interval)
+            try:
+                await self.compact()
+            except Exception as e:
+                logger.error(f"Outbox compaction failed: {e}")
@@ -0,0 +1,221 @@
+"""
+Reminder Schedule - расписание напоминаний о брошенных корзинах
+Функции:
+- Для каждой корзины считается время следующего напоминания (initialDelayHours / reminderIntervals)
+- Min-heap по времени: планировщик спит ровно до ближайшего напоминания
+- Сверка с API заменяет набор корзин целиком (новые добавляются, восстановленные исчезают),
+  локально отправленные напоминания не откатываются устаревшими данными API
+- Хранятся компактные записи корзин: только поля, нужные для напоминаний
+"""
+
+import time
+import heapq
+import asyncio
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+
+# Поля корзины, которые нужны расписанию и тексту напоминания
+CART_FIELDS = (
+    'id', 'telegramId', 'itemsCount', 'totalAmount', 'reminderSent',
+    'lastReminderAt', 'createdAt', 'abandonedAt', 'updatedAt', 'recovered',
+)
+
+
+def compact_cart(cart: Dict) -> Dict:
+    """Компактная запись корзины (ответ API / событие без лишних полей)"""
+    return {key: cart[key] for key in CART_FIELDS if cart.get(key) is not None}
+
+
+def _parse_dt(value: Optional[str]) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')) if value else None
+    except ValueError:
+        return None
+
+
+def days_since_abandoned(cart: Dict, now: Optional[datetime] = None) -> int:
+    """Дней с момента abandon (на момент отправки, а не получения корзины)"""
+    abandoned_dt = _parse_dt(cart.get('abandonedAt') or cart.get('createdAt'))
+    if abandoned_dt is None:
+        return 0
+    now = now or datetime.now(abandoned_dt.tzinfo)
+    return max(0, (now - abandoned_dt).days)
+
+
+def next_reminder_at(cart: Dict, max_reminders: int, reminder_intervals: List[int], initial_delay: float) -> Optional[float]:
+    """Когда (unix time) отправлять следующее напоминание; None - больше не напоминаем"""
+    # Пропускаем восстановленные и корзины без telegram_id
+    if cart.get('recovered') or not cart.get('telegramId'):
+        return None
+
+    reminder_sent = cart.get('reminderSent', 0)
+
+    # Не превышаем общее число напоминаний
+    if reminder_sent >= max_reminders:
+        return None
+
+    # Проверяем интервалы:
+    #  - первое напоминание — через initial_delay часов с момента abandon
+    #  - последующие — по reminder_intervals[reminder_sent - 1] (если есть)
+    abandoned_dt = _parse_dt(cart.get('abandonedAt') or cart.get('createdAt'))
+
+    # Если нет даты брошенной корзины — пропускаем
+    if abandoned_dt is None:
+        return None
+
+    # Определяем требуемый интервал для текущего напоминания
+    if reminder_sent == 0:
+        required_hours = initial_delay
+        reference_dt = abandoned_dt
+    else:
+        # Если интервала нет в списке — прекращаем
+        if reminder_sent - 1 >= len(reminder_intervals):
+            return None
+        required_hours = reminder_intervals[reminder_sent - 1]
+        last_reminder = cart.get('lastReminderAt')
+        reference_dt = _parse_dt(last_reminder) if last_reminder else abandoned_dt
+        if reference_dt is None:
+            return None
+
+    # Даты без часового пояса - локальное время (как datetime.now() раньше)
+    return reference_dt.timestamp() + required_hours * 3600
+
+
+class ReminderSchedule:
+    """Корзины + min-heap (время, id); устаревшие записи кучи отбрасываются при извлечении"""
+
+    def __init__(self):
+        self.carts: Dict[int, Dict] = {}
+        self.settings: Dict = {'maxReminders': 3, 'reminderIntervals': [2, 24, 72], 'initialDelayHours': 2}
+        self._due: Dict[int, float] = {}
+        self._heap: List[Tuple[float, int]] = []
+        self._in_flight: set = set()
+        # Расписание изменилось - планировщик пересчитывает время сна
+        self.changed = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._due)
+
+    # ----------------------------------------
+    # Наполнение
+    # ----------------------------------------
+    def replace_all(self, carts: List[Dict], settings: Dict) -> None:
+        """Сверка: полный список незавершённых корзин из API"""
+        self.settings = settings
+        merged = {}
+        for cart in carts:
+            cart_id = cart.get('id')
+            if cart_id is None:
+                continue
+            merged[cart_id] = self._merge(compact_cart(cart))
+        self.carts = merged
+        self._due = {}
+        for cart_id, cart in merged.items():
+            due = self._next(cart)
+            if due is not None and cart_id not in self._in_flight:
+                self._due[cart_id] = due
+        self._heap = [(due, cart_id) for cart_id, due in self._due.items()]
+        heapq.heapify(self._heap)
+        self.changed.set()
+
+    def upsert(self, cart: Dict) -> None:
+        """Добавить / обновить одну корзину"""
+        cart_id = cart.get('id')
+        if cart_id is None:
+            return
+        cart = self.carts[cart_id] = self._merge(compact_cart(cart))
+        if cart_id not in self._in_flight:
+            self._schedule(cart_id, self._next(cart))
+
+    def update_settings(self, settings: Dict) -> None:
+        """Новые настройки напоминаний - пересчитать время для всех корзин"""
+        if settings != self.settings:
+            self.replace_all(list(self.carts.values()), settings)
+
+    def remove(self, cart_id: int) -> Optional[Dict]:
+        """Корзина восстановлена / удалена - напоминаний больше нет"""
+        self._due.pop(cart_id, None)
+        self.changed.set()
+        return self.carts.pop(cart_id, None)
+
+    # ----------------------------------------
+    # Планировщик
+    # ----------------------------------------
+    def seconds_until_next(self, now: Optional[float] = None) -> Optional[float]:
+        """Сколько спать до ближайшего напоминания (None - напоминаний нет)"""
+        self._drop_stale()
+        if not self._heap:
+            return None
+        return max(0.0, self._heap[0][0] - (now or time.time()))
+
+    def pop_due(self, now: Optional[float] = None, limit: Optional[int] = None) -> List[Dict]:
+        """Извлечь корзины, которым пора напомнить (до вызова sent()/retry() они "в работе")"""
+        now = now or time.time()
+        due = []
+        while self._heap and (limit is None or len(due) < limit):
+            self._drop_stale()
+            if not self._heap or self._heap[0][0] > now:
+                break
+            _, cart_id = heapq.heappop(self._heap)
+            del self._due[cart_id]
+            self._in_flight.add(cart_id)
+            due.append(self.carts[cart_id])
+        return due
+
+    def sent(self, cart_id: int, now: Optional[float] = None) -> None:
+        """Напоминание отправлено: считаем следующее"""
+        self._in_flight.discard(cart_id)
+        cart = self.carts.get(cart_id)
+        if cart is None:
+            return
+        cart['reminderSent'] = cart.get('reminderSent', 0) + 1
+        cart['lastReminderAt'] = datetime.fromtimestamp(now or time.time()).astimezone().isoformat()
+        self._schedule(cart_id, self._next(cart))
+
+    def retry(self, cart_id: int, at: float) -> None:
+        """Не отправилось / не успели в этот проход - повторить в момент at"""
+        self._in_flight.discard(cart_id)
+        if cart_id in self.carts:
+            self._schedule(cart_id, at)
+
+    def snapshot(self) -> dict:
+        """Состояние для /health"""
+        wait = self.seconds_until_next()
+        return {
+            'carts': len(self.carts),
+            'scheduled': len(self._due),
+            'inFlight': len(self._in_flight),
+            'nextInSeconds': round(wait) if wait is not None else None,
+        }
+
+    # ----------------------------------------
+    # Internals
+    # ----------------------------------------
+    def _next(self, cart: Dict) -> Optional[float]:
+        return next_reminder_at(
+            cart,
+            self.settings.get('maxReminders', 3),
+            self.settings.get('reminderIntervals') or [],
+            self.settings.get('initialDelayHours', 2),
+        )
+
+    def _merge(self, cart: Dict) -> Dict:
+        """Данные API могут отставать от уже отправленных (ещё не отмеченных) напоминаний"""
+        local = self.carts.get(cart.get('id'))
+        if local is not None and local.get('reminderSent', 0) > cart.get('reminderSent', 0):
+            cart = {**cart, 'reminderSent': local['reminderSent'], 'lastReminderAt': local.get('lastReminderAt')}
+        return cart
+
+    def _schedule(self, cart_id: int, due: Optional[float]) -> None:
+        if due is None:
+            self._due.pop(cart_id, None)
+        else:
+            self._due[cart_id] = due
+            heapq.heappush(self._heap, (due, cart_id))
+        self.changed.set()
+
+    def _drop_stale(self) -> None:
+        """Верхушка кучи - только актуальные записи (после переноса/удаления старые остаются в куче)"""
+        while self._heap and self._due.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
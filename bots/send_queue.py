@@ -0,0 +1,317 @@
+"""
+Send Queue - очередь исходящих сообщений с ограничением скорости
+Функции:
+- asyncio очередь + пул воркеров
+- Token bucket лимитер: глобальный (~30 msg/s) и на каждый чат (~1 msg/s)
+- Повтор при RetryAfter (429) от Telegram
+- Сообщения одного чата уходят строго по порядку (FIFO на чат, не больше одной отправки
+  в чат одновременно): отложенное сообщение задерживает и следующие за ним
+"""
+
+import os
+import time
+import logging
+import asyncio
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Union
+
+from telegram.error import RetryAfter
+
+logger = logging.getLogger(__name__)
+
+# ============================================
+# Конфигурация (переопределяется через env)
+# ============================================
+SEND_RATE_GLOBAL = float(os.getenv('SEND_RATE_GLOBAL', '25'))
+SEND_RATE_PER_CHAT = float(os.getenv('SEND_RATE_PER_CHAT', '1'))
+SEND_BURST_PER_CHAT = int(os.getenv('SEND_BURST_PER_CHAT', '3'))
+SEND_WORKERS = int(os.getenv('SEND_WORKERS', '8'))
+SEND_QUEUE_SIZE = int(os.getenv('SEND_QUEUE_SIZE', '10000'))
+SEND_MAX_RETRIES = int(os.getenv('SEND_MAX_RETRIES', '3'))
+
+# Сколько бакетов чатов держим в памяти (старые вытесняются)
+MAX_CHAT_BUCKETS = 10000
+
+ChatId = Union[int, str]
+
+
+class TokenBucket:
+    """Классический token bucket: rate токенов в секунду, не больше capacity"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self) -> float:
+        """Забрать токен. Возвращает 0 при успехе или сколько секунд ждать"""
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    async def acquire(self) -> None:
+        """Дождаться токена"""
+        while True:
+            wait = self.try_acquire()
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+
+@dataclass
+class SendJob:
+    """Задача отправки: корутина-функция + аргументы, привязанные к чату"""
+    chat_id: ChatId
+    func: Callable[..., Awaitable[Any]]
+    args: tuple = ()
+    kwargs: dict = field(default_factory=dict)
+    attempts: int = 0
+    future: Optional[asyncio.Future] = None
+
+
+class SendQueue:
+    """Очередь отправки с пулом воркеров и лимитами Telegram"""
+
+    def __init__(
+        self,
+        workers: int = SEND_WORKERS,
+        global_rate: float = SEND_RATE_GLOBAL,
+        per_chat_rate: float = SEND_RATE_PER_CHAT,
+        per_chat_burst: int = SEND_BURST_PER_CHAT,
+        maxsize: int = SEND_QUEUE_SIZE,
+        max_retries: int = SEND_MAX_RETRIES,
+        name: str = 'send',
+    ):
+        self.workers = workers
+        self.per_chat_rate = per_chat_rate
+        self.per_chat_burst = per_chat_burst
+        self.maxsize = maxsize
+        self.max_retries = max_retries
+        self.name = name
+
+        self.global_bucket = TokenBucket(global_rate, max(1.0, global_rate))
+        self._chat_buckets: 'OrderedDict[str, TokenBucket]' = OrderedDict()
+        # Очереди задач по чатам; в _queue - ключи чатов, готовых к отправке.
+        # Ключ чата всегда в одном месте: в _queue, в отложенных (_delayed) или у воркера
+        self._chats: Dict[str, Deque[SendJob]] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._tasks: list = []
+        self._delayed: set = set()
+
+        self.stats = {
+            'queued': 0,
+            'sent': 0,
+            'failed': 0,
+            'retried': 0,
+            'rate_limited': 0,
+        }
+
+    # ----------------------------------------
+    # Lifecycle
+    # ----------------------------------------
+    async def start(self) -> None:
+        """Запустить воркеров (вызывается из lifespan)"""
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.maxsize)
+        self._tasks = [
+            asyncio.create_task(self._worker(i), name=f"{self.name}-worker-{i}")
+            for i in range(self.workers)
+        ]
+        logger.info(
+            f"📤 Send queue '{self.name}' started: {self.workers} workers, "
+            f"{self.global_bucket.rate:g} msg/s global, {self.per_chat_rate:g} msg/s per chat"
+        )
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Дождаться опустошения очереди (с таймаутом) и остановить воркеров.
+        future задач, не отправленных за timeout, отменяются"""
+        if not self._queue:
+            return
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ Send queue '{self.name}' stopped with {self.pending} pending jobs")
+        for handle in self._delayed:
+            handle.cancel()
+        self._delayed.clear()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+        self._slots = None
+        # Не отправленные к остановке задачи: ждущие их future не должны висеть вечно
+        for jobs in self._chats.values():
+            for job in jobs:
+                if job.future and not job.future.done():
+                    job.future.cancel()
+        self._chats.clear()
+        self._idle.set()
+        logger.info(f"Send queue '{self.name}' stopped")
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    @property
+    def pending(self) -> int:
+        return sum(len(jobs) for jobs in self._chats.values())
+
+    # ----------------------------------------
+    # Public API
+    # ----------------------------------------
+    async def submit(self, chat_id: ChatId, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> asyncio.Future:
+        """
+        Поставить отправку в очередь.
+        Возвращает future с результатом func (можно не ждать).
+        Если очередь не запущена - выполняет func сразу.
+        """
+        future = asyncio.get_running_loop().create_future()
+        job = SendJob(chat_id=chat_id, func=func, args=args, kwargs=kwargs, future=future)
+
+        if not self._queue:
+            await self._run(job)
+            return future
+
+        # Ограничение очереди - по числу задач (ключей чатов в _queue не больше, чем чатов)
+        await self._slots.acquire()
+        key = str(chat_id)
+        jobs = self._chats.get(key)
+        if jobs is None:
+            jobs = self._chats[key] = deque()
+            self._idle.clear()
+            self._queue.put_nowait(key)
+        # Иначе чат уже в работе: задача дождётся предыдущих
+        jobs.append(job)
+        self.stats['queued'] += 1
+        return future
+
+    def snapshot(self) -> dict:
+        """Состояние очереди для /health"""
+        return {
+            **self.stats,
+            'running': self.running,
+            'workers': self.workers,
+            'pending': self.pending,
+            'chats': len(self._chats),
+            'delayed': len(self._delayed),
+            'global_rate': self.global_bucket.rate,
+            'per_chat_rate': self.per_chat_rate,
+        }
+
+    # ----------------------------------------
+    # Internals
+    # ----------------------------------------
+    def _chat_bucket(self, chat_id: ChatId) -> TokenBucket:
+        key = str(chat_id)
+        bucket = self._chat_buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(self.per_chat_rate, self.per_chat_burst)
+            self._chat_buckets[key] = bucket
+            if len(self._chat_buckets) > MAX_CHAT_BUCKETS:
+                self._chat_buckets.popitem(last=False)
+        else:
+            self._chat_buckets.move_to_end(key)
+        return bucket
+
+    def _requeue_later(self, key: str, delay: float) -> None:
+        """Вернуть чат в очередь через delay секунд, не блокируя воркера (его задачи ждут)"""
+        loop = asyncio.get_running_loop()
+
+        def _put() -> None:
+            self._delayed.discard(handle)
+            if self._queue is not None:
+                self._queue.put_nowait(key)
+
+        handle = loop.call_later(delay, _put)
+        self._delayed.add(handle)
+
+    def _job_done(self, key: str) -> None:
+        """Первая задача чата завершена: следующая - в конец общей очереди (чаты чередуются)"""
+        jobs = self._chats[key]
+        jobs.popleft()
+        self._slots.release()
+        if jobs:
+            self._queue.put_nowait(key)
+        else:
+            del self._chats[key]
+            if not self._chats:
+                self._idle.set()
+
+    async def _run(self, job: SendJob) -> Optional[float]:
+        """Выполнить задачу. Возвращает через сколько секунд повторить (None - задача завершена)"""
+        try:
+            result = await job.func(*job.args, **job.kwargs)
+        except RetryAfter as e:
+            self.stats['rate_limited'] += 1
+            retry_after = e.retry_after
+            if not isinstance(retry_after, (int, float)):
+                retry_after = retry_after.total_seconds()
+            job.attempts += 1
+            if self._queue and job.attempts <= self.max_retries:
+                logger.warning(f"⏳ Flood control for chat {job.chat_id}, retry in {retry_after}s")
+                self.stats['retried'] += 1
+                return float(retry_after)
+            logger.error(f"❌ Flood control for chat {job.chat_id}, giving up after {job.attempts} attempts")
+            self.stats['failed'] += 1
+            self._resolve(job, False)
+            return None
+        except Exception as e:
+            logger.exception(f"❌ Send job for chat {job.chat_id} failed: {e}")
+            self.stats['failed'] += 1
+            self._resolve(job, False)
+            return None
+
+        if result is False:
+            self.stats['failed'] += 1
+        else:
+            self.stats['sent'] += 1
+        self._resolve(job, result)
+        return None
+
+    @staticmethod
+    def _resolve(job: SendJob, result: Any) -> None:
+        if job.future and not job.future.done():
+            job.future.set_result(result)
+
+    async def _worker(self, index: int) -> None:
+        queue = self._queue
+        while True:
+            key = await queue.get()
+            jobs = self._chats.get(key)
+            if not jobs:
+                continue
+            job = jobs[0]
+            retry_in: Optional[float] = None
+            try:
+                # Лимит на чат: если чат "горячий" - откладываем весь чат, воркер свободен
+                wait = self._chat_bucket(key).try_acquire()
+                if wait > 0:
+                    self._requeue_later(key, wait)
+                    continue
+                await self.global_bucket.acquire()
+                retry_in = await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception(f"Send worker {index} error: {e}")
+                self._resolve(job, False)
+            if retry_in is not None:
+                # RetryAfter: задача остаётся первой, остальные сообщения чата ждут её
+                self._requeue_later(key, retry_in)
+            else:
+                self._job_done(key)
@@ -0,0 +1,137 @@
+"""
+Status Queue - фоновая отправка смены статусов заказов (PATCH) для Admin Bot
+Функции:
+- Кнопка сразу показывает новый статус, запрос к API уходит в фоне
+- Повторные нажатия по одному заказу, пока запрос не ушёл, схлопываются в одно изменение
+- По одному заказу запросы идут строго по очереди, по разным - параллельно (с лимитом)
+- Результат (успех / ошибка + что откатить) отдаётся в on_done, а также в change.done
+"""
+
+import os
+import logging
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# ============================================
+# Конфигурация
+# ============================================
+STATUS_PATCH_CONCURRENCY = int(os.getenv('STATUS_PATCH_CONCURRENCY', '5'))
+
+
+@dataclass
+class StatusChange:
+    order_number: str
+    status: str
+    # Кто ждёт результата (callback query и т.п.) - по одному на нажатие
+    waiters: List[Any] = field(default_factory=list)
+    # Состояние до первого нажатия (клавиатура) - для отката при ошибке
+    rollback: Any = None
+    # Завершается после on_done: None - успех, иначе ошибка
+    done: Optional[asyncio.Future] = None
+
+
+class StatusPatchQueue:
+    """Очередь PATCH-запросов смены статуса со схлопыванием по заказу"""
+
+    def __init__(
+        self,
+        send: Callable[[str, str], Awaitable[Any]],
+        on_done: Callable[[StatusChange, Any, Optional[Exception]], Awaitable[None]],
+        concurrency: int = STATUS_PATCH_CONCURRENCY,
+        name: str = 'status-patch',
+    ):
+        self.send = send
+        self.on_done = on_done
+        self.name = name
+        self._semaphore = asyncio.Semaphore(max(1, concurrency))
+        self._pending: Dict[str, StatusChange] = {}
+        self._workers: Dict[str, asyncio.Task] = {}
+
+        self.stats = {
+            'submitted': 0,
+            'coalesced': 0,
+            'sent': 0,
+            'failed': 0,
+        }
+
+    def submit(self, order_number: str, status: str, waiter: Any = None, rollback: Any = None) -> StatusChange:
+        """Поставить изменение в очередь (если по заказу уже ждёт изменение - схлопнуть с ним)"""
+        self.stats['submitted'] += 1
+        change = self._pending.get(order_number)
+        if change is not None:
+            # Отправится последнее выбранное значение, откат - к состоянию до первого нажатия
+            change.status = status
+            self.stats['coalesced'] += 1
+        else:
+            change = self._pending[order_number] = StatusChange(
+                order_number, status, rollback=rollback, done=asyncio.get_running_loop().create_future()
+            )
+        if waiter is not None:
+            change.waiters.append(waiter)
+
+        worker = self._workers.get(order_number)
+        if worker is None or worker.done():
+            self._workers[order_number] = asyncio.create_task(
+                self._worker(order_number), name=f"{self.name}-{order_number}"
+            )
+        return change
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending) + len(self._workers)
+
+    def snapshot(self) -> dict:
+        """Состояние для /health"""
+        return {**self.stats, 'pending': len(self._pending), 'inFlight': len(self._workers)}
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Дождаться отправки поставленных изменений (с таймаутом)"""
+        if not self._workers:
+            return
+        done, not_done = await asyncio.wait(list(self._workers.values()), timeout=timeout)
+        if not_done:
+            logger.warning(f"⚠️ {self.name}: stopped with {len(not_done)} unsent status changes")
+            for task in not_done:
+                task.cancel()
+            await asyncio.gather(*not_done, return_exceptions=True)
+
+    # ----------------------------------------
+    # Internals
+    # ----------------------------------------
+    async def _worker(self, order_number: str) -> None:
+        try:
+            await self._drain(order_number)
+        finally:
+            # Снимаемся сразу (не done-callback'ом на следующем тике): submit() в этот момент
+            # должен запустить новый worker, иначе изменение останется в _pending навсегда
+            if self._workers.get(order_number) is asyncio.current_task():
+                del self._workers[order_number]
+
+    async def _drain(self, order_number: str) -> None:
+        failed_rollback: Any = None
+        failed = False
+        while True:
+            change = self._pending.pop(order_number, None)
+            if change is None:
+                return
+            if failed:
+                # Предыдущее изменение не прошло - откатывать нужно к состоянию до него
+                change.rollback = failed_rollback
+            result, error = None, None
+            async with self._semaphore:
+                try:
+                    result = await self.send(change.order_number, change.status)
+                    self.stats['sent'] += 1
+                except Exception as e:
+                    error = e
+                    self.stats['failed'] += 1
+            failed, failed_rollback = error is not None, change.rollback
+            try:
+                await self.on_done(change, result, error)
+            except Exception as e:
+                logger.exception(f"{self.name}: on_done failed for {order_number}: {e}")
+            if not change.done.done():
+                change.done.set_result(error)
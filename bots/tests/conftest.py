@@ -0,0 +1,6 @@
+"""Модули ботов лежат в bots/ и импортируются по имени (как при запуске python bots/<bot>.py)"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
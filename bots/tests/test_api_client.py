@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+from api_client import JsonArrayDecoder, NotJsonArrayError
+
+
+def feed_chunks(text: str, size: int) -> list:
+    decoder = JsonArrayDecoder()
+    items = []
+    for i in range(0, len(text), size):
+        items.extend(decoder.feed(text[i:i + size]))
+    items.extend(decoder.feed('', final=True))
+    return items
+
+
+@pytest.mark.parametrize('size', [1, 3, 7, 1000])
+def test_items_split_across_chunks(size):
+    data = [{'orderNumber': 'ORD-1', 'total': 1.5}, 12.25, 'строка', None, [1, 2], {'nested': {'a': [True]}}]
+    assert feed_chunks(json.dumps(data, ensure_ascii=False), size) == data
+
+
+def test_empty_array():
+    assert feed_chunks(' [ ] \n', 1) == []
+
+
+def test_number_at_chunk_boundary_is_not_cut():
+    decoder = JsonArrayDecoder()
+    assert decoder.feed('[1') == []
+    assert decoder.feed('.5, 2') == [1.5]
+    assert decoder.feed(']', final=True) == [2]
+
+
+def test_not_an_array():
+    with pytest.raises(NotJsonArrayError, match='Expected JSON array'):
+        JsonArrayDecoder().feed('{"carts": []}')
+
+
+def test_malformed_item_is_not_reported_as_not_an_array():
+    with pytest.raises(ValueError) as info:
+        JsonArrayDecoder().feed('[{"id": 1,', final=True)
+    assert not isinstance(info.value, NotJsonArrayError)
+
+
+def test_truncated_between_items():
+    decoder = JsonArrayDecoder()
+    assert decoder.feed('[{"a": 1},') == [{'a': 1}]
+    with pytest.raises(ValueError, match='Truncated'):
+        decoder.feed('', final=True)
+
+
+def test_truncated_inside_item():
+    decoder = JsonArrayDecoder()
+    assert decoder.feed('[{"a": 1}, {"b"') == [{'a': 1}]
+    with pytest.raises(ValueError):
+        decoder.feed('', final=True)
+
+
+@pytest.mark.parametrize('body', ['', '  \n'])
+def test_empty_body(body):
+    with pytest.raises(ValueError, match='empty response'):
+        JsonArrayDecoder().feed(body, final=True)
+
+
+def test_data_after_array():
+    with pytest.raises(ValueError, match='after JSON array'):
+        JsonArrayDecoder().feed('[1] [2]', final=True)
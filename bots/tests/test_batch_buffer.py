@@ -0,0 +1,63 @@
+import asyncio
+
+from batch_buffer import BatchBuffer
+
+
+class SlowSink:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.batches = []
+
+    async def __call__(self, items):
+        await asyncio.sleep(self.delay)
+        self.batches.append(list(items))
+
+
+def test_flush_by_size():
+    async def scenario():
+        sink = SlowSink()
+        buffer = BatchBuffer(sink, max_size=3, max_delay=60)
+        for i in range(7):
+            buffer.add(i)
+        await buffer.flush()
+        return sink.batches
+
+    # Полные пачки уходят фоном, остаток - в flush(): порядок пачек не гарантирован
+    assert sorted(asyncio.run(scenario())) == [[0, 1, 2], [3, 4, 5], [6]]
+
+
+def test_flush_by_time():
+    async def scenario():
+        sink = SlowSink()
+        buffer = BatchBuffer(sink, max_size=100, max_delay=0.01)
+        buffer.add('a')
+        buffer.add('b')
+        await asyncio.sleep(0.05)
+        return sink.batches, buffer.pending
+
+    assert asyncio.run(scenario()) == ([['a', 'b']], 0)
+
+
+def test_stop_waits_for_timer_flush_in_progress():
+    async def scenario():
+        sink = SlowSink(delay=0.05)
+        buffer = BatchBuffer(sink, max_size=100, max_delay=0.01)
+        buffer.add('ack-1')
+        await asyncio.sleep(0.02)  # таймер сработал, отправка идёт
+        await buffer.stop()
+        return sink.batches
+
+    assert asyncio.run(scenario()) == [['ack-1']]
+
+
+def test_failed_flush_is_logged_not_raised():
+    async def scenario():
+        async def broken(items):
+            raise RuntimeError('API down')
+
+        buffer = BatchBuffer(broken, max_size=1, max_delay=1)
+        buffer.add(1)
+        await buffer.stop()
+        return buffer.pending
+
+    assert asyncio.run(scenario()) == 0
@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+from cache import SWRCache, TTLCache
+
+
+def test_ttl_cache_expiry_and_lru(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('cache.time.monotonic', lambda: now[0])
+    cache = TTLCache(maxsize=2, ttl=10)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1  # 'a' - самая свежая по использованию
+    cache.set('c', 3)
+    assert 'b' not in cache and cache.get('a') == 1
+    now[0] += 11
+    assert cache.get('a') is None
+    assert cache.invalidate_where(lambda key: key == 'c') == 1
+
+
+def test_swr_cache_single_flight_and_stale_on_error():
+    async def scenario():
+        calls = {'n': 0}
+
+        async def loader():
+            calls['n'] += 1
+            await asyncio.sleep(0.01)
+            if calls['n'] > 1:
+                raise RuntimeError('API down')
+            return 'v1'
+
+        cache = SWRCache(loader, ttl=60)
+        first, second = await asyncio.gather(cache.get(), cache.get())
+        cache.invalidate()
+        stale = await cache.get()
+        await cache.refresh()
+        after_error = await cache.get()
+        return calls['n'], first, second, stale, after_error
+
+    calls, first, second, stale, after_error = asyncio.run(scenario())
+    assert calls == 2
+    assert first.value == second.value == 'v1'
+    assert stale.stale and stale.value == 'v1'
+    assert after_error.value == 'v1' and after_error.error == 'API down'
+
+
+def test_swr_cache_first_load_error_is_raised():
+    async def scenario():
+        async def loader():
+            raise RuntimeError('no data')
+
+        await SWRCache(loader, ttl=60).get()
+
+    with pytest.raises(RuntimeError, match='no data'):
+        asyncio.run(scenario())
@@ -0,0 +1,53 @@
+import asyncio
+
+from digest import DigestBuffer
+
+
+def test_below_threshold_sends_individually():
+    async def scenario():
+        batches = []
+
+        async def flush(items):
+            batches.append(items)
+
+        digest = DigestBuffer(flush, threshold_per_minute=3, window_seconds=60)
+        offered = [digest.offer(i) for i in range(3)]
+        await digest.stop()
+        return offered, batches
+
+    assert asyncio.run(scenario()) == ([False, False, False], [])
+
+
+def test_burst_switches_to_digest_and_stop_flushes():
+    async def scenario():
+        batches = []
+
+        async def flush(items):
+            batches.append(items)
+
+        digest = DigestBuffer(flush, threshold_per_minute=2, window_seconds=60, max_items=3)
+        offered = [digest.offer(i) for i in range(7)]
+        await digest.stop()
+        return offered, sorted(batches)
+
+    offered, batches = asyncio.run(scenario())
+    assert offered == [False, False, True, True, True, True, True]
+    assert batches == [[2, 3, 4], [5, 6]]
+
+
+def test_stop_waits_for_window_flush_in_progress():
+    async def scenario():
+        batches = []
+
+        async def flush(items):
+            await asyncio.sleep(0.05)
+            batches.append(items)
+
+        digest = DigestBuffer(flush, threshold_per_minute=1, window_seconds=0.01)
+        assert not digest.offer('order-1')
+        assert digest.offer('order-2')
+        await asyncio.sleep(0.02)  # окно закрылось, сводка отправляется
+        await digest.stop()
+        return batches
+
+    assert asyncio.run(scenario()) == [['order-2']]
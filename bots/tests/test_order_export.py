@@ -0,0 +1,34 @@
+from order_export import order_row
+
+LABELS = {'PENDING': 'Новый'}
+
+
+def row(**fields):
+    order = {'orderNumber': 'ORD-1', 'status': 'PENDING', 'paymentStatus': 'PAID', 'total': 1500.5}
+    order.update(fields)
+    return order_row(order, LABELS)
+
+
+def test_plain_values():
+    cells = row(customerName='Иван', customerPhone='+7 (999) 123-45-67', comment=None)
+    assert cells[0] == 'ORD-1'
+    assert cells[2:7] == ['Новый', 'Оплачен', 'Иван', '+7 (999) 123-45-67', '']
+    assert cells[9] == '1500,50'
+    assert cells[10] == ''
+
+
+def test_formula_cells_are_escaped():
+    cells = row(
+        customerName='=HYPERLINK("http://evil","x")',
+        customerPhone='+cmd|"/c calc"!A1',
+        customerEmail='@SUM(1)',
+        customerAddress='-2+3',
+        comment='+1',
+        items=[{'productName': '=1+1', 'quantity': 1}],
+    )
+    assert cells[4] == '\'=HYPERLINK("http://evil","x")'
+    assert cells[5] == '\'+cmd|"/c calc"!A1'
+    assert cells[6] == "'@SUM(1)"
+    assert cells[7] == "'-2+3"
+    assert cells[8] == "'=1+1 × 1"
+    assert cells[10] == "'+1"
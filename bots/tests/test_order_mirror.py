@@ -0,0 +1,80 @@
+import asyncio
+
+from order_mirror import EPOCH, OrderMirror
+
+STAMP = '2024-05-01T10:00:00.000Z'
+
+
+class FakeResponse:
+    status = 200
+    ok = True
+    text = ''
+
+    def __init__(self, payload):
+        self._payload = payload
+
+    def json(self):
+        return self._payload
+
+
+class FakeOrdersApi:
+    """GET /bots/orders как в API: фильтр по (updatedAt, id), порядок по (updatedAt, id)"""
+
+    def __init__(self, orders):
+        self.orders = sorted(orders, key=lambda o: (o['updatedAt'], o['id']))
+        self.calls = []
+
+    async def get(self, path, params=None):
+        self.calls.append(dict(params))
+        since, after_id = params['updatedSince'], params.get('afterId')
+        if after_id is None:
+            matched = [o for o in self.orders if o['updatedAt'] >= since]
+        else:
+            matched = [o for o in self.orders if (o['updatedAt'], o['id']) > (since, after_id)]
+        return FakeResponse(matched[:params['limit']])
+
+
+def order(order_id, updated_at=STAMP):
+    return {'id': order_id, 'orderNumber': f'ORD-{order_id}', 'status': 'NEW', 'total': 100, 'updatedAt': updated_at}
+
+
+def test_sync_pages_through_orders_with_equal_updated_at(tmp_path):
+    path = str(tmp_path / 'mirror.sqlite3')
+    api = FakeOrdersApi([order(i) for i in range(1, 8)] + [order(8, '2024-05-01T11:00:00.000Z')])
+
+    async def scenario():
+        mirror = OrderMirror(path, sync_batch=3)
+        mirror.open()
+        try:
+            received = await mirror.sync(api)
+            return received, [(await mirror.get(f'ORD-{i}')) is not None for i in range(1, 9)]
+        finally:
+            mirror.close()
+
+    received, present = asyncio.run(scenario())
+    assert received == 8 and all(present)
+    assert api.calls[0] == {'updatedSince': EPOCH, 'limit': 3}
+    assert api.calls[1] == {'updatedSince': STAMP, 'limit': 3, 'afterId': 3}
+
+
+def test_cursor_survives_reopen(tmp_path):
+    path = str(tmp_path / 'mirror.sqlite3')
+    api = FakeOrdersApi([order(i) for i in range(1, 5)])
+
+    async def scenario():
+        mirror = OrderMirror(path, sync_batch=10)
+        mirror.open()
+        await mirror.sync(api)
+        mirror.close()
+
+        api.orders.append(order(5))
+        reopened = OrderMirror(path, sync_batch=10)
+        reopened.open()
+        try:
+            assert (reopened.cursor, reopened.cursor_id) == (STAMP, 4)
+            return await reopened.sync(api)
+        finally:
+            reopened.close()
+
+    assert asyncio.run(scenario()) == 1
+    assert api.calls[-1] == {'updatedSince': STAMP, 'limit': 10, 'afterId': 4}
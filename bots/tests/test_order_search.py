@@ -0,0 +1,38 @@
+from order_search import OrderSearchIndex
+
+
+def make_index() -> OrderSearchIndex:
+    index = OrderSearchIndex()
+    index.add({'orderNumber': 'ORD-101', 'customerName': 'Анна Петрова', 'customerPhone': '+7 (999) 123-45-67',
+               'status': 'PENDING', 'total': '1500.50', 'createdAt': '2026-10-01T10:00:00Z'})
+    index.add({'orderNumber': 'ORD-102', 'customerName': 'Пётр Иванов', 'customerPhone': '+7 912 000-11-22',
+               'status': 'SHIPPED', 'total': 900, 'createdAt': '2026-10-02T10:00:00Z'})
+    return index
+
+
+def numbers(docs) -> list:
+    return [d.orderNumber for d in docs]
+
+
+def test_search_by_number_phone_and_name():
+    index = make_index()
+    assert numbers(index.search('ord-101')) == ['ORD-101']
+    assert numbers(index.search('999 123')) == ['ORD-101']
+    assert numbers(index.search('петр')) == ['ORD-102', 'ORD-101']  # "Петрова" тоже, новые сверху
+    assert numbers(index.search('Пётр')) == ['ORD-102', 'ORD-101']
+
+
+def test_short_query_uses_word_prefix():
+    index = make_index()
+    assert numbers(index.search('ан')) == ['ORD-101']
+    assert index.search('') == []
+
+
+def test_replace_and_update_status():
+    index = make_index()
+    index.add({'orderNumber': 'ORD-101', 'customerName': 'Мария', 'createdAt': '2026-10-01T10:00:00Z'})
+    assert index.search('анна') == []
+    assert numbers(index.search('мария')) == ['ORD-101']
+    index.update_status('ORD-102', 'DELIVERED')
+    assert index.docs['ORD-102'].status == 'DELIVERED'
+    assert len(index) == 2
@@ -0,0 +1,78 @@
+from datetime import date, datetime
+
+from order_stats import OrderStats, load_snapshot, parse_status_change, save_snapshot
+
+TODAY = datetime.now().date()
+CREATED = f"{TODAY.isoformat()}T10:00:00.000Z"
+
+
+def make_stats() -> OrderStats:
+    stats = OrderStats()
+    stats.add({'orderNumber': 'ORD-1', 'status': 'DELIVERED', 'paymentStatus': 'PAID',
+               'total': '1000.00', 'createdAt': '2026-01-05T10:00:00.000Z'})
+    stats.add({'orderNumber': 'ORD-2', 'status': 'PENDING', 'paymentStatus': 'PENDING',
+               'total': 500, 'createdAt': CREATED})
+    return stats
+
+
+def test_parse_status_change():
+    assert parse_status_change('PENDING → CONFIRMED') == ('status', 'PENDING', 'CONFIRMED')
+    assert parse_status_change('Оплата: PENDING → Оплата: PAID') == ('paymentStatus', 'PENDING', 'PAID')
+    assert parse_status_change('NEW') == ('status', None, 'PENDING')
+
+
+def test_single_pass_counters():
+    stats = make_stats()
+    assert stats.total_orders == 2
+    assert stats.total_revenue == 1000
+    assert stats.paid_orders == 1
+    assert stats.by_status['DELIVERED'] == 1 and stats.by_status['PENDING'] == 1
+    assert stats.day(date(2026, 1, 5)).revenue == 1000
+    assert stats.day().orders == 1 and stats.day().revenue == 0
+
+
+def test_payment_event_moves_revenue_without_reconcile():
+    stats = make_stats()
+    assert stats.apply_status_change('ORD-2', 'Оплата: PENDING → Оплата: PAID')
+    assert stats.total_revenue == 1500
+    assert stats.paid_orders == 2
+    assert stats.day().revenue == 500 and stats.day().paid_orders == 1
+    # Повтор того же события ничего не меняет
+    assert not stats.apply_status_change('ORD-2', 'Оплата: PENDING → Оплата: PAID')
+    assert stats.total_revenue == 1500
+
+    # Возврат оплаты
+    assert stats.apply_status_change('ORD-1', 'Оплата: PAID → Оплата: REFUNDED')
+    assert stats.total_revenue == 500
+    assert stats.paid_orders == 1
+    assert stats.day(date(2026, 1, 5)).revenue == 0
+
+
+def test_new_order_event_then_payment():
+    stats = make_stats()
+    assert stats.apply_new_order('ORD-3', 250.5, CREATED)
+    assert not stats.apply_new_order('ORD-3', 250.5, CREATED)
+    assert stats.day().orders == 2
+    assert stats.apply_status_change('ORD-3', 'Оплата: PENDING → Оплата: PAID')
+    assert stats.day().revenue == 250.5
+    assert stats.total_revenue == 1250.5
+    # Неизвестный заказ: суммы нет - выручку уточнит сверка
+    assert not stats.apply_status_change('ORD-404', 'Оплата: PENDING → Оплата: PAID')
+
+
+def test_status_change_event():
+    stats = make_stats()
+    assert stats.apply_status_change('ORD-2', 'PENDING → CONFIRMED')
+    assert stats.by_status['PENDING'] == 0 and stats.by_status['CONFIRMED'] == 1
+    assert not stats.apply_status_change('ORD-2', 'PENDING → CONFIRMED')
+
+
+def test_snapshot_roundtrip_keeps_payment_state(tmp_path):
+    stats = make_stats()
+    path = str(tmp_path / 'stats.json')
+    save_snapshot(stats, path, datetime(2026, 10, 1, 12, 0))
+    loaded, fetched_at = load_snapshot(path)
+    assert fetched_at == datetime(2026, 10, 1, 12, 0)
+    assert loaded.total_revenue == 1000 and loaded.orders == stats.orders
+    assert loaded.apply_status_change('ORD-2', 'Оплата: PENDING → Оплата: PAID')
+    assert loaded.total_revenue == 1500
@@ -0,0 +1,141 @@
+import asyncio
+import sqlite3
+
+from telegram.error import BadRequest, Forbidden, NetworkError, TimedOut
+
+from outbox import Outbox, is_transient_error
+
+
+def rows(path: str) -> dict:
+    conn = sqlite3.connect(path)
+    try:
+        return {r[0]: (r[1], r[2]) for r in conn.execute('SELECT id, status, attempts FROM outbox')}
+    finally:
+        conn.close()
+
+
+def run(path: str, scenario, **kwargs):
+    async def wrapper():
+        outbox = Outbox(path, flush_ms=0, **kwargs)
+        await outbox.open()
+        try:
+            return await scenario(outbox)
+        finally:
+            await outbox.close()
+
+    return asyncio.run(wrapper())
+
+
+def test_is_transient_error():
+    assert is_transient_error(TimedOut())
+    assert is_transient_error(NetworkError('connection reset'))
+    assert not is_transient_error(BadRequest('Chat not found'))
+    assert not is_transient_error(Forbidden('bot was blocked by the user'))
+    assert not is_transient_error(ValueError())
+
+
+def test_transient_error_keeps_entry_pending(tmp_path):
+    path = str(tmp_path / 'outbox.sqlite3')
+
+    async def scenario(outbox):
+        entry_id = await outbox.add('customer', {'telegramId': '1'})
+
+        async def send():
+            raise TimedOut()
+
+        try:
+            await outbox.deliver(entry_id, send)
+        except TimedOut:
+            pass
+        await outbox.close()
+        await outbox.open()
+        return entry_id, await outbox.pending()
+
+    entry_id, pending = run(path, scenario)
+    assert [e.id for e in pending] == [entry_id]
+    assert rows(path)[entry_id] == ('pending', 1)
+
+
+def test_permanent_errors_mark_failed(tmp_path):
+    path = str(tmp_path / 'outbox.sqlite3')
+
+    async def scenario(outbox):
+        blocked, rejected = await outbox.add_many([('customer', {}), ('customer', {})])
+
+        async def forbidden():
+            raise Forbidden('bot was blocked by the user')
+
+        async def falsy():
+            return False
+
+        try:
+            await outbox.deliver(blocked, forbidden)
+        except Forbidden:
+            pass
+        await outbox.deliver(rejected, falsy)
+        return blocked, rejected
+
+    blocked, rejected = run(path, scenario)
+    assert rows(path) == {blocked: ('failed', 1), rejected: ('failed', 1)}
+
+
+def test_max_attempts_then_failed(tmp_path):
+    path = str(tmp_path / 'outbox.sqlite3')
+
+    async def scenario(outbox):
+        entry_id = await outbox.add('status', {})
+
+        async def send():
+            raise NetworkError('down')
+
+        for _ in range(3):
+            try:
+                await outbox.deliver(entry_id, send)
+            except NetworkError:
+                pass
+            await outbox._ops.join()
+        return entry_id
+
+    entry_id = run(path, scenario, max_attempts=3)
+    assert rows(path)[entry_id] == ('failed', 3)
+
+
+def test_pending_skips_entries_already_queued(tmp_path):
+    path = str(tmp_path / 'outbox.sqlite3')
+
+    async def scenario(outbox):
+        queued = await outbox.add('customer', {})
+        # Только что добавленная запись стоит в очереди отправки - повтор её не берёт
+        before = await outbox.pending()
+
+        async def send():
+            raise TimedOut()
+
+        try:
+            await outbox.deliver(queued, send)
+        except TimedOut:
+            pass
+        await outbox._ops.join()
+        first = await outbox.pending()
+        # Уже отдана на повтор - второй раз не отдаётся, пока не будет результата
+        second = await outbox.pending()
+        return before, [e.id for e in first], second, queued
+
+    before, first, second, queued = run(path, scenario)
+    assert before == [] and first == [queued] and second == []
+
+
+def test_sent_entry_is_not_replayed(tmp_path):
+    path = str(tmp_path / 'outbox.sqlite3')
+
+    async def scenario(outbox):
+        entry_id = await outbox.add('customer', {})
+
+        async def send():
+            return True
+
+        assert await outbox.deliver(entry_id, send) is True
+        await outbox._ops.join()
+        return await outbox.pending()
+
+    assert run(path, scenario) == []
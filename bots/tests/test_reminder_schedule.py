@@ -0,0 +1,137 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from reminder_schedule import ReminderSchedule, compact_cart, days_since_abandoned, next_reminder_at
+
+SETTINGS = {'maxReminders': 3, 'reminderIntervals': [2, 24, 72], 'initialDelayHours': 2}
+BASE = datetime(2026, 10, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def iso(dt: datetime) -> str:
+    return dt.isoformat().replace('+00:00', 'Z')
+
+
+def cart(cart_id: int, hours_ago: float = 0, **fields) -> dict:
+    data = {
+        'id': cart_id,
+        'telegramId': str(1000 + cart_id),
+        'createdAt': iso(BASE - timedelta(hours=hours_ago)),
+        'reminderSent': 0,
+    }
+    data.update(fields)
+    return data
+
+
+def make_schedule(carts) -> ReminderSchedule:
+    schedule = ReminderSchedule()
+    schedule.replace_all(carts, dict(SETTINGS))
+    return schedule
+
+
+def at(hours: float) -> float:
+    return (BASE + timedelta(hours=hours)).timestamp()
+
+
+# ----------------------------------------
+# next_reminder_at
+# ----------------------------------------
+def test_first_reminder_after_initial_delay():
+    assert next_reminder_at(cart(1), 3, [2, 24, 72], 2) == at(2)
+
+
+def test_next_reminder_from_last_reminder():
+    data = cart(1, lastReminderAt=iso(BASE + timedelta(hours=3)), reminderSent=2)
+    assert next_reminder_at(data, 3, [2, 24, 72], 2) == at(3 + 24)
+
+
+def test_no_reminder_when_done_recovered_or_without_telegram():
+    assert next_reminder_at(cart(1, reminderSent=3), 3, [2, 24, 72], 2) is None
+    assert next_reminder_at(cart(1, recovered=True), 3, [2, 24, 72], 2) is None
+    assert next_reminder_at(cart(1, telegramId=None), 3, [2, 24, 72], 2) is None
+    assert next_reminder_at(cart(1, createdAt=None), 3, [2, 24, 72], 2) is None
+    # Интервалов меньше, чем напоминаний
+    assert next_reminder_at(cart(1, reminderSent=2), 5, [2], 2) is None
+
+
+def test_compact_cart_and_days_since_abandoned():
+    raw = cart(1, customerName='Ann', items=[{'product': {'name': 'big'}}], cartId=5, lastReminderAt=None)
+    assert compact_cart(raw) == {
+        'id': 1, 'telegramId': '1001', 'createdAt': raw['createdAt'], 'reminderSent': 0,
+    }
+    assert days_since_abandoned(cart(1, hours_ago=24 * 3 + 1), now=BASE) == 3
+    assert days_since_abandoned({}, now=BASE) == 0
+
+
+# ----------------------------------------
+# ReminderSchedule
+# ----------------------------------------
+def test_pop_due_in_time_order():
+    schedule = make_schedule([cart(1, hours_ago=1), cart(2, hours_ago=5), cart(3)])
+    assert schedule.seconds_until_next(now=at(0)) == 0
+    assert [c['id'] for c in schedule.pop_due(now=at(1.5))] == [2, 1]
+    # Ещё не время для третьей
+    assert schedule.pop_due(now=at(1.5)) == []
+    assert schedule.seconds_until_next(now=at(1.5)) == 1800
+
+
+def test_pop_due_limit_and_in_flight_not_rescheduled():
+    schedule = make_schedule([cart(1, hours_ago=5), cart(2, hours_ago=4)])
+    assert [c['id'] for c in schedule.pop_due(now=at(0), limit=1)] == [1]
+    # Пока напоминание "в работе", сверка не ставит корзину повторно
+    schedule.replace_all([cart(1, hours_ago=5), cart(2, hours_ago=4)], dict(SETTINGS))
+    assert [c['id'] for c in schedule.pop_due(now=at(0))] == [2]
+    assert schedule.snapshot()['inFlight'] == 2
+
+
+def test_sent_schedules_next_interval():
+    schedule = make_schedule([cart(1, hours_ago=5)])
+    [due] = schedule.pop_due(now=at(0))
+    schedule.sent(due['id'], now=at(0))
+    assert schedule.carts[1]['reminderSent'] == 1
+    assert schedule.seconds_until_next(now=at(0)) == 2 * 3600
+    for hours in (2, 2 + 24):
+        [due] = schedule.pop_due(now=at(hours))
+        schedule.sent(due['id'], now=at(hours))
+    # Все три напоминания отправлены
+    assert schedule.seconds_until_next(now=at(100)) is None
+    assert len(schedule) == 0
+
+
+def test_retry_reschedules_at_given_time():
+    schedule = make_schedule([cart(1, hours_ago=5)])
+    schedule.pop_due(now=at(0))
+    schedule.retry(1, at(0.25))
+    assert schedule.pop_due(now=at(0.2)) == []
+    assert [c['id'] for c in schedule.pop_due(now=at(0.25))] == [1]
+
+
+def test_stale_api_data_does_not_undo_local_reminders():
+    schedule = make_schedule([cart(1, hours_ago=5)])
+    schedule.pop_due(now=at(0))
+    schedule.sent(1, now=at(0))
+    # API ещё не получил отметку
+    schedule.replace_all([cart(1, hours_ago=5, reminderSent=0)], dict(SETTINGS))
+    assert schedule.carts[1]['reminderSent'] == 1
+    assert schedule.pop_due(now=at(1)) == []
+
+
+def test_upsert_remove_and_settings_change():
+    schedule = make_schedule([])
+    schedule.upsert(cart(1, hours_ago=1, customerName='dropped'))
+    assert 'customerName' not in schedule.carts[1]
+    assert schedule.seconds_until_next(now=at(0)) == 3600
+    schedule.update_settings({**SETTINGS, 'initialDelayHours': 4})
+    assert schedule.seconds_until_next(now=at(0)) == 3 * 3600
+    assert schedule.remove(1)['id'] == 1
+    assert schedule.seconds_until_next(now=at(0)) is None
+    assert schedule.pop_due(now=at(100)) == []
+
+
+def test_changed_event_is_set_on_updates():
+    async def scenario():
+        schedule = ReminderSchedule()
+        schedule.changed.clear()
+        schedule.upsert(cart(1))
+        return schedule.changed.is_set()
+
+    assert asyncio.run(scenario())
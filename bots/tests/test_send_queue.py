@@ -0,0 +1,110 @@
+import asyncio
+
+from telegram.error import RetryAfter
+
+from send_queue import SendQueue, TokenBucket
+
+
+def make_queue(**kwargs) -> SendQueue:
+    options = dict(workers=4, global_rate=1000, per_chat_rate=1000, per_chat_burst=1000)
+    options.update(kwargs)
+    return SendQueue(**options)
+
+
+def test_token_bucket_burst_then_wait():
+    bucket = TokenBucket(rate=10, capacity=2)
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() == 0
+    wait = bucket.try_acquire()
+    assert 0 < wait <= 0.1
+
+
+def test_retry_after_keeps_chat_order():
+    async def scenario():
+        queue = make_queue()
+        await queue.start()
+        delivered = []
+        flood = {'left': 1}
+
+        async def send(text):
+            if text == 'created' and flood['left']:
+                flood['left'] -= 1
+                raise RetryAfter(0.05)
+            delivered.append(text)
+
+        futures = [await queue.submit(1, send, text) for text in ('created', 'paid', 'shipped')]
+        other = await queue.submit(2, send, 'other chat')
+        await asyncio.gather(*futures, other)
+        await queue.stop()
+        return delivered, queue
+
+    delivered, queue = asyncio.run(scenario())
+    assert [t for t in delivered if t != 'other chat'] == ['created', 'paid', 'shipped']
+    # Другой чат не ждёт отложенный
+    assert delivered[0] == 'other chat'
+    assert queue.stats['retried'] == 1
+
+
+def test_hot_chat_keeps_order_and_one_send_at_a_time():
+    async def scenario():
+        queue = make_queue(per_chat_rate=50, per_chat_burst=1)
+        await queue.start()
+        delivered = []
+        active = {'now': 0, 'peak': 0}
+
+        async def send(i):
+            active['now'] += 1
+            active['peak'] = max(active['peak'], active['now'])
+            await asyncio.sleep(0.005)
+            active['now'] -= 1
+            delivered.append(i)
+
+        futures = [await queue.submit(7, send, i) for i in range(6)]
+        await asyncio.gather(*futures)
+        snapshot = queue.snapshot()
+        await queue.stop()
+        return delivered, active['peak'], snapshot
+
+    delivered, peak, snapshot = asyncio.run(scenario())
+    assert delivered == list(range(6))
+    assert peak == 1
+    assert snapshot['pending'] == 0 and snapshot['chats'] == 0
+
+
+def test_failed_job_does_not_block_chat():
+    async def scenario():
+        queue = make_queue()
+        await queue.start()
+
+        async def send(ok):
+            if not ok:
+                raise RuntimeError('boom')
+            return 'sent'
+
+        first = await queue.submit(1, send, False)
+        second = await queue.submit(1, send, True)
+        results = await asyncio.gather(first, second)
+        await queue.stop()
+        return results
+
+    assert asyncio.run(scenario()) == [False, 'sent']
+
+
+def test_stop_timeout_cancels_unsent_futures():
+    async def scenario():
+        queue = make_queue(workers=1)
+        await queue.start()
+        release = asyncio.Event()
+
+        async def send(text):
+            await release.wait()
+            return text
+
+        futures = [await queue.submit(1, send, text) for text in ('first', 'second')]
+        await asyncio.sleep(0)
+        await queue.stop(timeout=0.05)
+        return futures, queue
+
+    futures, queue = asyncio.run(scenario())
+    assert all(f.cancelled() for f in futures)
+    assert queue.pending == 0
@@ -0,0 +1,114 @@
+import asyncio
+
+from status_queue import StatusPatchQueue
+
+
+class Recorder:
+    def __init__(self, fail=()):
+        self.sent = []
+        self.done = []
+        self.fail = set(fail)
+        self.gate = None
+
+    async def send(self, order_number, status):
+        if self.gate is not None:
+            await self.gate.wait()
+        self.sent.append((order_number, status))
+        if status in self.fail:
+            raise RuntimeError(f"PATCH {status} failed")
+        return {'orderNumber': order_number, 'status': status}
+
+    async def on_done(self, change, result, error):
+        self.done.append((change.order_number, change.status, change.rollback, error is not None))
+
+
+def test_submit_sends_and_resolves_done():
+    async def scenario():
+        rec = Recorder()
+        queue = StatusPatchQueue(rec.send, rec.on_done)
+        change = queue.submit('A', 'SHIPPED', rollback='kb0')
+        assert await change.done is None
+        return rec, queue
+
+    rec, queue = asyncio.run(scenario())
+    assert rec.sent == [('A', 'SHIPPED')]
+    assert rec.done == [('A', 'SHIPPED', 'kb0', False)]
+    assert queue.snapshot()['inFlight'] == 0
+
+
+def test_submit_right_after_worker_finished():
+    async def scenario():
+        rec = Recorder()
+        queue = StatusPatchQueue(rec.send, rec.on_done)
+        first = queue.submit('A', 'X')
+        await first.done
+        # Worker уже вернулся, но ещё мог числиться в _workers - новое изменение не должно потеряться
+        second = queue.submit('A', 'Y')
+        assert await asyncio.wait_for(second.done, timeout=1) is None
+        return rec, queue
+
+    rec, queue = asyncio.run(scenario())
+    assert rec.sent == [('A', 'X'), ('A', 'Y')]
+    assert queue.snapshot()['pending'] == 0
+    assert queue.snapshot()['inFlight'] == 0
+
+
+def test_pending_taps_coalesce():
+    async def scenario():
+        rec = Recorder()
+        rec.gate = asyncio.Event()
+        queue = StatusPatchQueue(rec.send, rec.on_done)
+        first = queue.submit('A', 'PROCESSING', waiter=1, rollback='kb0')
+        await asyncio.sleep(0)  # первый запрос ушёл и ждёт ответа
+        second = queue.submit('A', 'SHIPPED', waiter=2, rollback='kb1')
+        third = queue.submit('A', 'DELIVERED', waiter=3, rollback='kb2')
+        rec.gate.set()
+        await asyncio.gather(first.done, second.done)
+        return rec, queue, first, second, third
+
+    rec, queue, first, second, third = asyncio.run(scenario())
+    assert second is third
+    assert second.waiters == [2, 3]
+    assert rec.sent == [('A', 'PROCESSING'), ('A', 'DELIVERED')]
+    assert queue.stats['coalesced'] == 1
+
+
+def test_failed_change_passes_rollback_to_next():
+    async def scenario():
+        rec = Recorder(fail={'PROCESSING'})
+        rec.gate = asyncio.Event()
+        queue = StatusPatchQueue(rec.send, rec.on_done)
+        first = queue.submit('A', 'PROCESSING', rollback='kb0')
+        await asyncio.sleep(0)
+        second = queue.submit('A', 'SHIPPED', rollback='kb1')
+        rec.gate.set()
+        return rec, await first.done, await second.done
+
+    rec, first_error, second_error = asyncio.run(scenario())
+    assert isinstance(first_error, RuntimeError)
+    assert second_error is None
+    # kb1 показывал неудавшийся PROCESSING - откатывать второе изменение нужно к kb0
+    assert rec.done == [('A', 'PROCESSING', 'kb0', True), ('A', 'SHIPPED', 'kb0', False)]
+
+
+def test_orders_run_in_parallel_up_to_concurrency():
+    async def scenario():
+        active = 0
+        peak = 0
+
+        async def send(order_number, status):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+
+        async def on_done(change, result, error):
+            pass
+
+        queue = StatusPatchQueue(send, on_done, concurrency=2)
+        changes = [queue.submit(f"ORD-{i}", 'SHIPPED') for i in range(5)]
+        await asyncio.gather(*(c.done for c in changes))
+        return peak
+
+    assert asyncio.run(scenario()) == 2
@@ -0,0 +1,149 @@
+"""
+Update Queue - асинхронная обработка webhook апдейтов
+Функции:
+- Webhook только кладёт апдейт в очередь и сразу отвечает 200
+- Пул воркеров: апдейты одного чата обрабатываются по порядку,
+  разные чаты - параллельно (шардирование по chat_id)
+- Дедупликация повторов Telegram по update_id (ограниченный кэш)
+"""
+
+import os
+import logging
+import asyncio
+from collections import OrderedDict
+from typing import List, Optional
+
+from telegram import Update
+from telegram.ext import Application
+
+logger = logging.getLogger(__name__)
+
+# ============================================
+# Конфигурация
+# ============================================
+UPDATE_WORKERS = int(os.getenv('UPDATE_WORKERS', '8'))
+UPDATE_QUEUE_SIZE = int(os.getenv('UPDATE_QUEUE_SIZE', '1000'))
+UPDATE_DEDUP_SIZE = int(os.getenv('UPDATE_DEDUP_SIZE', '10000'))
+
+
+class UpdateQueue:
+    """Очереди апдейтов по шардам чатов + пул воркеров"""
+
+    def __init__(
+        self,
+        workers: int = UPDATE_WORKERS,
+        maxsize: int = UPDATE_QUEUE_SIZE,
+        dedup_size: int = UPDATE_DEDUP_SIZE,
+    ):
+        self.workers = max(1, workers)
+        self.maxsize = maxsize
+        self.dedup_size = dedup_size
+        self.application: Optional[Application] = None
+
+        self._recent_ids: 'OrderedDict[int, None]' = OrderedDict()
+        self._queues: List[asyncio.Queue] = []
+        self._tasks: List[asyncio.Task] = []
+
+        self.stats = {
+            'received': 0,
+            'duplicates': 0,
+            'processed': 0,
+            'errors': 0,
+        }
+
+    # ----------------------------------------
+    # Lifecycle
+    # ----------------------------------------
+    async def start(self, application: Application) -> None:
+        """Запустить воркеров (вызывается из lifespan после application.start())"""
+        if self._tasks:
+            return
+        self.application = application
+        self._queues = [asyncio.Queue(maxsize=self.maxsize) for _ in range(self.workers)]
+        self._tasks = [
+            asyncio.create_task(self._worker(queue), name=f"update-worker-{i}")
+            for i, queue in enumerate(self._queues)
+        ]
+        logger.info(f"📥 Update queue started: {self.workers} workers")
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Дообработать очередь (с таймаутом) и остановить воркеров"""
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(queue.join() for queue in self._queues)),
+                timeout=timeout
+            )
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ Update queue stopped with {self.pending} unprocessed updates")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queues = []
+
+    # ----------------------------------------
+    # Public API
+    # ----------------------------------------
+    async def submit(self, update: Update) -> bool:
+        """Поставить апдейт в очередь. False - дубликат (уже обрабатывался)"""
+        self.stats['received'] += 1
+        if self._seen(update.update_id):
+            self.stats['duplicates'] += 1
+            logger.debug(f"Duplicate update {update.update_id} dropped")
+            return False
+
+        if not self._queues:
+            # Очередь не запущена - обрабатываем синхронно
+            await self._process(update)
+            return True
+
+        queue = self._queues[self._shard(update)]
+        await queue.put(update)
+        return True
+
+    @property
+    def pending(self) -> int:
+        return sum(queue.qsize() for queue in self._queues)
+
+    def snapshot(self) -> dict:
+        """Состояние для /health"""
+        return {**self.stats, 'workers': self.workers, 'pending': self.pending}
+
+    # ----------------------------------------
+    # Internals
+    # ----------------------------------------
+    def _seen(self, update_id: int) -> bool:
+        if update_id in self._recent_ids:
+            return True
+        self._recent_ids[update_id] = None
+        if len(self._recent_ids) > self.dedup_size:
+            self._recent_ids.popitem(last=False)
+        return False
+
+    def _shard(self, update: Update) -> int:
+        """Один чат - всегда один воркер (сохраняем порядок внутри чата)"""
+        if update.effective_chat:
+            key = update.effective_chat.id
+        elif update.effective_user:
+            key = update.effective_user.id
+        else:
+            key = update.update_id
+        return hash(key) % len(self._queues)
+
+    async def _process(self, update: Update) -> None:
+        try:
+            await self.application.process_update(update)
+            self.stats['processed'] += 1
+        except Exception as e:
+            self.stats['errors'] += 1
+            logger.exception(f"Error processing update {update.update_id}: {e}")
+
+    async def _worker(self, queue: asyncio.Queue) -> None:
+        while True:
+            update = await queue.get()
+            try:
+                await self._process(update)
+            finally:
+                queue.task_done()